@@ -1,141 +1,22 @@
-import requests
+import os
 import re
 import pandas as pd
 import streamlit as st
 from io import BytesIO
-import time
+from sentinel.contributors import DEFAULT_MAX_IN_FLIGHT
+from sentinel.response_cache import default_cache
+from sentinel.scheduler import MAX_IN_FLIGHT
+from sentinel.snapshots import DEFAULT_MAX_AGE
+from sentinel.exports import SESSION_PARQUET_KEY, SESSION_SCOPE_KEY, to_parquet
+from sentinel.repo_health import STALE_AFTER
+from sentinel.jobs import FINISHED_STATES, POLL_SECONDS, default_job_store, ensure_workers, job_folder
+from sentinel.scan_jobs import (CONTRIBUTORS_ROWS_FILE, METRICS_JSON_FILE, METRICS_PROMETHEUS_FILE,
+                                read_streamed_rows)
 
-# Set your Personal Access Token here
-token = ""
+# URL query parameter holding the id of the running contributor scan
+JOB_QUERY_KEY = "job"
 
-# Helper function to fetch data
-
-
-def fetch_data(url):
-    headers = {
-        "Authorization": f"token {token}"
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json()
-    return None
-
-# Function to calculate the percentage of pull requests that were ultimately merged
-
-
-def calculate_merged_pr_percentage(owner, repo_name):
-    pulls_url = f"https://api.github.com/repos/{owner}/{repo_name}/pulls"
-    pulls_data = fetch_data(pulls_url)
-    if not pulls_data:
-        return None
-
-    merged_pr_count = 0
-    total_pr_count = len(pulls_data)
-
-    for pull in pulls_data:
-        if 'merged' in pull and pull['merged']:
-            merged_pr_count += 1
-
-    if total_pr_count > 0:
-        return (merged_pr_count / total_pr_count) * 100
-    else:
-        return 0
-
-# Function to calculate the frequency of commits in all repos by the user
-
-
-def calculate_commit_frequency(username):
-    events_url = f"https://api.github.com/users/{username}/events"
-    events_data = fetch_data(events_url)
-    if not events_data:
-        return None
-
-    commit_count = 0
-
-    for event in events_data:
-        if event['type'] == 'PushEvent':
-            commit_count += len(event['payload']['commits'])
-
-    return commit_count
-
-# Function to calculate the sum of forks and stars of the repos the user has contributed to
-
-
-def calculate_forks_and_stars(username):
-    user_contributions_url = f"https://api.github.com/users/{username}/events"
-    user_contributions_data = fetch_data(user_contributions_url)
-    if not user_contributions_data:
-        return None
-
-    forks_count = 0
-    stars_count = 0
-
-    for contribution in user_contributions_data:
-        repo_url = contribution['repo']['url']
-        repo_data = fetch_data(repo_url)
-        if repo_data:
-            forks_count += repo_data['forks']
-            stars_count += repo_data['stargazers_count']
-
-    return forks_count, stars_count
-
-# Function to calculate the number of organizations the user is part of
-
-
-def calculate_organization_count(username):
-    orgs_url = f"https://api.github.com/users/{username}/orgs"
-    orgs_data = fetch_data(orgs_url)
-    if orgs_data:
-        return len(orgs_data)
-    return 0
-
-# Function to collect contributor data
-
-
-def collect_contributors_data(owner, repo_name):
-    contributors_url = f"https://api.github.com/repos/{owner}/{repo_name}/contributors"
-    contributors = fetch_data(contributors_url)
-    if not contributors:
-        st.error("Error: Unable to fetch contributors data.")
-        return []
-
-    contributor_data_list = []
-
-    for contributor in contributors:
-        contributor_login = contributor['login']
-        contributor_url = f"https://api.github.com/users/{contributor_login}"
-        contributor_data = fetch_data(contributor_url)
-        if contributor_data:
-            contributor_info = {
-                "Contributor": contributor_data['login'],
-                "Name": contributor_data['name'],
-                "Followers": contributor_data['followers'],
-                "Following": contributor_data['following'],
-                "Public Repositories": contributor_data['public_repos'],
-                "Contributions to Repository": contributor['contributions']
-            }
-
-            commit_frequency = calculate_commit_frequency(contributor_login)
-            if commit_frequency is not None:
-                contributor_info["Commit Frequency (All Repos)"] = commit_frequency
-
-            forks_and_stars = calculate_forks_and_stars(contributor_login)
-            if forks_and_stars is not None:
-                forks_count, stars_count = forks_and_stars
-                contributor_info["Total Forks of Repos Contributed To"] = forks_count
-                contributor_info["Total Stars of Repos Contributed To"] = stars_count
-
-            organization_count = calculate_organization_count(
-                contributor_login)
-            if organization_count is not None:
-                contributor_info["Number of Organizations"] = organization_count
-
-            contributor_data_list.append(contributor_info)
-        else:
-            st.warning(
-                f"Error: Unable to fetch data for contributor {contributor_login}")
-
-    return contributor_data_list
+SCAN_MODES = {"repository": "Single repository", "organization": "Whole organization"}
 
 
 def to_excel(df):
@@ -150,6 +31,148 @@ def to_excel(df):
     processed_data = output.getvalue()
     return processed_data
 
+# Function to show the status and results of a contributor scan job. While
+# the job runs only this part of the page is re-run, every POLL_SECONDS.
+
+
+def show_contributors_job(job_id):
+    job = default_job_store().get(job_id)
+    if job is None:
+        st.error("Unknown scan. Please search again.")
+        return
+    polling = job["status"] not in FINISHED_STATES
+    st.fragment(render_contributors_job, run_every=POLL_SECONDS if polling else None)(
+        job_id, polling)
+    if job["status"] == "done":
+        show_scan_diagnostics(job_id, job["result"])
+
+# Function to show where the time and API requests of a finished scan went
+
+
+def show_scan_diagnostics(job_id, result):
+    summary = result.get("metrics")
+    if not summary:
+        return
+    totals = summary["totals"]
+    with st.sidebar.expander("Scan diagnostics"):
+        hit_ratio = totals["cache_hit_ratio"]
+        st.metric("API requests", totals["requests"])
+        st.metric("Cache hit ratio", "n/a" if hit_ratio is None else f"{hit_ratio:.0%}")
+        st.caption(f"{totals['network_seconds']:.1f}s waiting on the network (summed over requests), "
+                   f"{totals['wait_seconds']:.1f}s waiting for rate limits, "
+                   f"{totals['retries']} rate limited retries, {totals['megabytes']:.1f} MB received.")
+
+        endpoints = pd.DataFrame(summary["endpoints"])
+        if not endpoints.empty:
+            endpoints["statuses"] = endpoints["statuses"].map(
+                lambda statuses: ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+            st.dataframe(endpoints, hide_index=True)
+        st.write("Time per stage (summed over worker threads):")
+        st.dataframe(pd.DataFrame(summary["stages"]), hide_index=True)
+
+        folder = job_folder(job_id)
+        for file_name, label in [(METRICS_JSON_FILE, "📥 Metrics (JSON)"),
+                                 (METRICS_PROMETHEUS_FILE, "📥 Metrics (Prometheus)")]:
+            with open(os.path.join(folder, file_name), "rb") as metrics_file:
+                st.download_button(label=label, data=metrics_file.read(), file_name=file_name,
+                                   key=f"metrics_{file_name}")
+
+
+def render_contributors_job(job_id, polling):
+    job = default_job_store().get(job_id)
+    # Re-run the whole page once so polling stops
+    if polling and job["status"] in FINISHED_STATES:
+        st.rerun()
+
+    is_org = job["kind"] == "organization"
+    repo_name = job["params"]["org"] if is_org else job["params"]["repo_name"]
+    if job["status"] == "queued":
+        st.progress(0, text=f"Waiting for a free worker ({job['position']} scans ahead).")
+    elif job["status"] == "running":
+        st.progress(job["done"] / job["total"] if job["total"] else 0,
+                    text=job["message"] or "Fetching contributors data. Please wait.")
+
+    for warning in job["warnings"]:
+        st.warning(warning)
+    if job["status"] == "failed":
+        st.error(job["error"])
+        return
+
+    if job["status"] == "running":
+        contributors_data = read_streamed_rows(os.path.join(job_folder(job_id), CONTRIBUTORS_ROWS_FILE))
+        if contributors_data:
+            st.write("Contributors Information:")
+            st.dataframe(pd.DataFrame(contributors_data))
+    elif job["status"] == "done" and job["result"]["rows"]:
+        df = pd.read_parquet(os.path.join(job_folder(job_id), job["result"]["parquet"]))
+        if is_org:
+            st.write(f"Contributors of {repo_name} ({len(df)} unique contributors in "
+                     f"{len(job['result']['repositories'])} repositories):")
+        else:
+            show_repo_health(job["result"].get("health"))
+            st.write("Contributors Information:")
+        st.dataframe(df)
+        if is_org:
+            show_repository_tables(job_id, job["result"], repo_name)
+
+        # Provide a download button for the Excel file
+        excel_file_name = f'downloads/{repo_name}_contributors_data.xlsx'
+        excel_data = to_excel(df)
+        st.download_button(label='📥 Download Excel File', data=excel_data,
+                           key=excel_file_name, file_name=excel_file_name)
+
+        # Columnar copy for large scans, also handed to the analysis pages
+        parquet_file_name = f'downloads/{repo_name}_contributors_data.parquet'
+        parquet_data = to_parquet(df)
+        st.session_state[SESSION_PARQUET_KEY] = parquet_data
+        st.session_state[SESSION_SCOPE_KEY] = (
+            repo_name if is_org else f"{job['params']['owner']}/{repo_name}")
+        st.download_button(label='📥 Download Parquet File', data=parquet_data,
+                           key=parquet_file_name, file_name=parquet_file_name)
+
+# Function to format a ratio of the repository health as a percentage
+
+
+def format_ratio(ratio):
+    return "n/a" if ratio is None else f"{ratio:.0%}"
+
+# Function to show the pull request health of the scanned repository above
+# its contributor table
+
+
+def show_repo_health(health):
+    if not health:
+        return
+    hours = health["median_hours_to_merge"]
+    if hours is None:
+        time_to_merge = "n/a"
+    elif hours < 48:
+        time_to_merge = f"{hours:.1f} h"
+    else:
+        time_to_merge = f"{hours / 24:.1f} days"
+    st.write("Repository Health:")
+    columns = st.columns(4)
+    columns[0].metric("Pull Requests", health["pull_requests"], help=f"{health['open']} open")
+    columns[1].metric("Merged", format_ratio(health["merged_ratio"]), help="Share of the closed pull requests")
+    columns[2].metric("Median Time to Merge", time_to_merge)
+    columns[3].metric("Stale Open", format_ratio(health["stale_open_ratio"]),
+                      help=f"Open pull requests without an update for {STALE_AFTER // 86400} days")
+    if "fetched" in health:
+        st.caption(f"{health['fetched']} pull requests changed since the last refresh.")
+
+# Function to show the per-repository tables of an organization scan
+
+
+def show_repository_tables(job_id, result, org):
+    repositories_path = os.path.join(job_folder(job_id), result["repositories_parquet"])
+    repositories = pd.read_parquet(repositories_path)
+    repository = st.selectbox("Contributors of repository", result["repositories"])
+    st.dataframe(repositories[repositories["Repository"] == repository].drop(columns="Repository"),
+                 hide_index=True)
+    with open(repositories_path, "rb") as repositories_file:
+        st.download_button(label='📥 Download Repository Tables (Parquet)', data=repositories_file.read(),
+                           key="repositories_parquet", file_name=f'downloads/{org}_repositories_data.parquet')
+
 # Streamlit app
 
 
@@ -186,9 +209,56 @@ def main():
     st.sidebar.write(
         "This is Repo Sentinel, our guardian in the OSS environment")
 
-    # Prompt the user to input the GitHub repository URL
-    repository_url = st.text_input(
-        "Enter the GitHub repository URL (e.g., https://github.com/owner/repo):")
+    # Scans run in background worker processes shared by all sessions
+    ensure_workers()
+
+    scan_mode = st.radio("Scan", list(SCAN_MODES), format_func=SCAN_MODES.get, horizontal=True)
+    if scan_mode == "organization":
+        organization_url = st.text_input(
+            "Enter the GitHub organization URL (e.g., https://github.com/org):")
+        max_repos = st.number_input(
+            "Maximum repositories to scan (0 = all)", min_value=0, value=0, step=10)
+        include_forks = st.checkbox("Include forks", value=False)
+        include_archived = st.checkbox("Include archived repositories", value=False)
+    else:
+        # Prompt the user to input the GitHub repository URL
+        repository_url = st.text_input(
+            "Enter the GitHub repository URL (e.g., https://github.com/owner/repo):")
+
+    max_in_flight = st.sidebar.slider(
+        "Maximum concurrent API requests", min_value=1, max_value=MAX_IN_FLIGHT, value=DEFAULT_MAX_IN_FLIGHT)
+
+    backend = st.sidebar.radio(
+        "Enrichment backend", ["rest", "graphql"],
+        format_func=lambda name: {"rest": "REST (one contributor at a time)",
+                                  "graphql": "GraphQL (batches of 50, needs a token)"}[name])
+
+    max_items = st.sidebar.number_input(
+        "Maximum contributors to scan (0 = all)", min_value=0, value=0, step=100,
+        help="Sample only the first contributors of very large repositories.")
+
+    distinct_repos = st.sidebar.checkbox(
+        "Count each repository once per contributor", value=False,
+        help="Forks and stars of a repository are added once per contributor instead of once per event.")
+
+    incremental = st.sidebar.checkbox(
+        "Incremental re-scan", value=True,
+        help="Reuse stored results and enrich only new, changed or stale contributors.")
+    max_age_days = st.sidebar.number_input(
+        "Refresh contributors older than (days)", min_value=0.0,
+        value=DEFAULT_MAX_AGE / 86400, step=1.0, disabled=not incremental)
+
+    pool_tokens = st.sidebar.text_input(
+        "GitHub tokens (comma separated)", type="password",
+        help="Requests are spread across all tokens; leave empty to use GITHUB_TOKENS.")
+    pool_token_list = [token.strip() for token in pool_tokens.split(",") if token.strip()]
+
+    use_response_cache = st.sidebar.checkbox(
+        "Use cached API responses", value=True,
+        help="Reuse stored GitHub responses and revalidate them with conditional requests.")
+    if st.sidebar.button("Clear response cache"):
+        default_cache().clear()
+        st.sidebar.info("Response cache cleared.")
 
     # if st.button("Search"):
     #     # Extract the owner's username and repository name from the URL
@@ -213,7 +283,24 @@ def main():
     #         st.download_button(label='📥 Download Excel File', data=excel_data,
     #                            key=excel_file_name, file_name=excel_file_name)
 
-    if st.button("Search"):
+    search = st.button("Search")
+    if search and scan_mode == "organization":
+        match = re.match(r'^(?:https://github.com/)?([^/\s]+)/?$', organization_url.strip())
+        if not match:
+            st.error("Invalid GitHub organization URL. Please provide a valid URL.")
+            return
+
+        # Every contributor of the organization is enriched once, however many
+        # of its repositories they contributed to
+        job_id = default_job_store().submit("organization", {
+            "org": match.group(1), "max_in_flight": max_in_flight, "distinct_repos": distinct_repos,
+            "max_repos": max_repos or None, "include_forks": include_forks,
+            "include_archived": include_archived, "backend": backend, "incremental": incremental,
+            "max_age": max_age_days * 86400, "use_response_cache": use_response_cache,
+        }, secrets={"tokens": pool_token_list})
+        st.query_params[JOB_QUERY_KEY] = job_id
+
+    elif search:
         # Extract the owner's username and repository name from the URL
         match = re.match(r'https://github.com/([^/]+)/([^/]+)', repository_url)
         if not match:
@@ -223,32 +310,18 @@ def main():
         owner = match.group(1)
         repo_name = match.group(2)
 
-    # Add progress bar
-        progress_text = "Fetching contributors data. Please wait."
-        my_bar = st.progress(0, text=progress_text)
-
-        contributors_data = collect_contributors_data(owner, repo_name)
-        
-        if contributors_data:
-            # Update progress bar after data is fetched
-            my_bar.text("Processing data...")
-            my_bar.progress(50)
-
-            st.write("Contributors Information:")
-            df = pd.DataFrame(contributors_data)
-            st.dataframe(df)
-
-        # Provide a download button for the Excel file
-        excel_file_name = f'downloads/{repo_name}_contributors_data.xlsx'
-        excel_data = to_excel(df)
-        st.download_button(label='📥 Download Excel File', data=excel_data,
-                           key=excel_file_name, file_name=excel_file_name)
-
-    # Complete progress bar
-        my_bar.text("Operation complete.")
-        my_bar.progress(100)
-        time.sleep(1)
-        my_bar.empty()
+        # The scan runs in the worker pool; the job id in the URL survives a browser refresh
+        job_id = default_job_store().submit("contributors", {
+            "owner": owner, "repo_name": repo_name, "max_in_flight": max_in_flight,
+            "distinct_repos": distinct_repos, "max_items": max_items or None, "backend": backend,
+            "incremental": incremental, "max_age": max_age_days * 86400,
+            "use_response_cache": use_response_cache,
+        }, secrets={"tokens": pool_token_list})
+        st.query_params[JOB_QUERY_KEY] = job_id
+
+    job_id = st.query_params.get(JOB_QUERY_KEY)
+    if job_id:
+        show_contributors_job(job_id)
 
     st.divider()
     st.markdown('#####')
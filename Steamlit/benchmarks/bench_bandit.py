@@ -0,0 +1,87 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold vs warm Bandit scan of a synthetic git repository:
+#   full     - a single `bandit -r` over the checkout (the old Code_Analysis path)
+#   cold     - BanditScanner with an empty per-file cache
+#   warm     - the same commit again (everything cached)
+#   changed  - after a commit touching --changed files
+#   python benchmarks/bench_bandit.py --files 400 --changed 10
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sentinel.bandit_scan import BanditCache, BanditScanner  # noqa: E402
+
+SNIPPETS = [
+    "import subprocess\n\n\ndef run(cmd):\n    return subprocess.call(cmd, shell=True)\n",
+    "import pickle\n\n\ndef load(data):\n    return pickle.loads(data)\n",
+    "PASSWORD = 'hunter2'\n",
+    "def add(a, b):\n    return a + b\n",
+    "import hashlib\n\n\ndef digest(data):\n    return hashlib.md5(data).hexdigest()\n",
+]
+
+
+def git(root, *args):
+    subprocess.run(["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+                   cwd=root, check=True, capture_output=True)
+
+
+def write_module(path, rng, lines):
+    with open(path, "w") as module:
+        for _ in range(lines):
+            module.write(rng.choice(SNIPPETS) + "\n\n")
+
+
+def make_repo(root, files, rng):
+    git(root, "init", "-q")
+    for index in range(files):
+        package = os.path.join(root, f"pkg{index % 20}")
+        os.makedirs(package, exist_ok=True)
+        write_module(os.path.join(package, f"module_{index}.py"), rng, 30)
+    git(root, "add", ".")
+    git(root, "commit", "-q", "-m", "initial")
+
+
+def timed(label, action):
+    started = time.perf_counter()
+    result = action()
+    print(f"{label:<10} {time.perf_counter() - started:8.2f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        root = os.path.join(workdir, "repo")
+        os.makedirs(root)
+        make_repo(root, args.files, rng)
+        cache = BanditCache(os.path.join(workdir, "cache.sqlite"))
+        scanner = BanditScanner(workers=args.workers, cache=cache)
+        print(f"{args.files} files, {scanner.workers} workers")
+
+        timed("full", lambda: subprocess.run(
+            ["bandit", "-r", root, "-f", "json", "-q", "-o", os.path.join(workdir, "full.json")]))
+        cold = timed("cold", lambda: scanner.scan(root))
+        warm = timed("warm", lambda: scanner.scan(root))
+        assert warm["results"] == cold["results"]
+
+        for index in rng.sample(range(args.files), args.changed):
+            write_module(os.path.join(root, f"pkg{index % 20}", f"module_{index}.py"), rng, 30)
+        git(root, "commit", "-q", "-am", "change")
+        timed("changed", lambda: scanner.scan(root))
+        print(f"scanned after change: {scanner.last_stats}")
+        print(f"issues: {len(cold['results'])}")
+
+
+if __name__ == "__main__":
+    main()
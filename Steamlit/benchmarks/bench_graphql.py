@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+# Compares the GraphQL backend against the recorded fixtures of the local
+# stand-in server: requests per contributor and the produced columns.
+#   python benchmarks/bench_graphql.py
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.mock_github import load_users, start_mock_server  # noqa: E402
+
+REST_COLUMNS = [
+    "Contributor", "Name", "Followers", "Following", "Public Repositories",
+    "Contributions to Repository", "Commit Frequency (All Repos)",
+    "Total Forks of Repos Contributed To", "Total Stars of Repos Contributed To",
+    "Number of Organizations",
+]
+
+
+def main():
+    users = load_users()
+    server = start_mock_server(users)
+    os.environ["GITHUB_GRAPHQL_URL"] = f"{server.base_url}/graphql"
+
+    from sentinel.contributors import post_graphql
+    from sentinel.graphql_backend import GRAPHQL_BATCH_SIZE, enrich_contributors_graphql
+
+    # Repeat the fixture logins to fill several batches, plus one unknown login
+    logins = list(users) * 20 + ["no-such-user"]
+    contributors = [{"login": login, "contributions": index} for index, login in enumerate(logins)]
+
+    started = time.perf_counter()
+    rows = []
+    for start in range(0, len(contributors), GRAPHQL_BATCH_SIZE):
+        rows.extend(enrich_contributors_graphql(
+            contributors[start:start + GRAPHQL_BATCH_SIZE], post_graphql))
+    elapsed = time.perf_counter() - started
+
+    resolved = [row for row in rows if row]
+    assert len(rows) == len(contributors)
+    assert rows[-1] is None
+    assert all(list(row) == REST_COLUMNS for row in resolved)
+    print(f"contributors:             {len(contributors)}")
+    print(f"resolved:                 {len(resolved)}")
+    print(f"GraphQL requests:         {server.total_requests()}")
+    print(f"requests per contributor: {server.total_requests() / len(contributors):.3f}")
+    print(f"wall time:                {elapsed:.3f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Memory of the contributor table: the old path (a dict per row collected in
+# a list, then pd.DataFrame and the dtype cast of the exporters) against
+# ContributorStore (rows appended column by column, then to_frame). Each runs
+# in a fresh process on the same synthetic rows, which arrive one at a time
+# like enriched contributors, and ends with the Parquet export:
+#   python benchmarks/bench_store.py --rows 100000
+# Peak RSS is measured above the process's RSS after the imports, once the
+# frame is built and again after the export.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+METHODS = ["list", "store"]
+
+# Generator of synthetic enriched contributor rows (same keys and value ranges
+# as a real scan, a few metrics missing)
+
+
+def synthetic_rows(count):
+    import random
+    rng = random.Random(0)
+    for index in range(count):
+        row = {
+            "Contributor": f"user{index}",
+            "Name": f"User {index}",
+            "Followers": rng.randint(0, 5000),
+            "Following": rng.randint(0, 300),
+            "Public Repositories": rng.randint(0, 200),
+            "Contributions to Repository": rng.randint(1, 10000),
+            "Commit Frequency (All Repos)": rng.randint(0, 100),
+            "Total Forks of Repos Contributed To": rng.randint(0, 10 ** 6),
+            "Total Stars of Repos Contributed To": rng.randint(0, 10 ** 7),
+            "Number of Organizations": rng.randint(0, 10),
+        }
+        if index % 10 == 0:
+            del row["Commit Frequency (All Repos)"]
+        yield row
+
+# Function to read the peak resident set size of this process in MB
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# Function to build the table with one method inside the child process
+
+
+def run_child(method, count):
+    import pandas as pd
+    from sentinel.contributor_store import ContributorStore
+    from sentinel.exports import to_parquet
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if method == "list":
+        rows = []
+        for row in synthetic_rows(count):
+            rows.append(row)
+        df = pd.DataFrame(rows)
+    else:
+        store = ContributorStore()
+        for row in synthetic_rows(count):
+            store.append(row)
+        df = store.to_frame()
+    build_seconds = time.perf_counter() - started
+    frame_peak_mb = peak_rss_mb() - baseline
+    frame_mb = sum(df[column].array.nbytes for column in df) / 1e6
+    parquet_mb = len(to_parquet(df)) / 1e6
+    return {"method": method, "rows": len(df), "build_seconds": build_seconds,
+            "seconds": time.perf_counter() - started, "frame_mb": frame_mb, "parquet_mb": parquet_mb,
+            "frame_peak_mb": frame_peak_mb, "peak_mb": peak_rss_mb() - baseline}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--child", choices=METHODS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.rows)))
+        return
+
+    print(f"{args.rows} rows")
+    print(f"{'':>6} {'build s':>8} {'total s':>8} {'frame MB':>9} "
+          f"{'peak MB (frame)':>16} {'peak MB (+export)':>18}")
+    for method in METHODS:
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--rows", str(args.rows),
+                                "--child", method], capture_output=True, text=True, check=True)
+        result = json.loads(child.stdout.splitlines()[-1])
+        print(f"{method:>6} {result['build_seconds']:>8.2f} {result['seconds']:>8.2f} "
+              f"{result['frame_mb']:>9.1f} {result['frame_peak_mb']:>16.1f} {result['peak_mb']:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Request latency of the old fetch path (a new requests.get, i.e. a new
+# connection, per request) against the pooled keep-alive transport, with the
+# same number of threads against the local stand-in server:
+#   python benchmarks/bench_transport.py --requests 2000 --threads 8 --latency 0.01 --tls
+# --tls serves HTTPS with a throwaway self-signed certificate (needs the
+# openssl command), which is where connection setup costs the most.
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+from benchmarks.mock_github import start_mock_server  # noqa: E402
+from sentinel.transport import CONNECT_TIMEOUT, READ_TIMEOUT, Transport  # noqa: E402
+
+# Function to create a self-signed certificate for 127.0.0.1, returns (cert, key)
+
+
+def make_certificate(folder):
+    certfile = os.path.join(folder, "cert.pem")
+    keyfile = os.path.join(folder, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", keyfile, "-out", certfile], check=True, capture_output=True)
+    return certfile, keyfile
+
+# Function to send the requests from a thread pool, returns (latencies, seconds)
+
+
+def run(get, urls, threads):
+    def timed(url):
+        started = time.perf_counter()
+        response = get(url)
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(timed, urls))
+    return latencies, time.perf_counter() - started
+
+
+def report(name, latencies, seconds):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{name:>10} {1000 * mean:>8.2f} {1000 * p50:>8.2f} {1000 * p95:>8.2f} "
+          f"{len(latencies) / seconds:>10.0f}")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        verify = True
+        options = {}
+        if args.tls:
+            certfile, keyfile = make_certificate(folder)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            options["ssl_context"] = context
+            verify = certfile
+        server = start_mock_server(latency=args.latency, rate_limit=10 ** 9, **options)
+        # Same answer sizes as a scan: user profiles and event pages
+        urls = [f"{server.base_url}/users/user{index % 500}" + ("/events?per_page=100" if index % 2 else "")
+                for index in range(args.requests)]
+
+        def plain_get(url):
+            return requests.get(url, verify=verify, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+
+        transport = Transport(pool_size=args.threads)
+
+        def pooled_get(url):
+            return transport.get(url, verify=verify)
+
+        print(f"{args.requests} requests, {args.threads} threads, "
+              f"{'HTTPS' if args.tls else 'HTTP'}, {1000 * args.latency:.0f} ms server latency")
+        print(f"{'':>10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>10}")
+        before = report("per-call", *run(plain_get, urls, args.threads))
+        after = report("pooled", *run(pooled_get, urls, args.threads))
+        print(f"mean latency {100 * (1 - after / before):.0f}% lower")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+# Local stand-in for the GitHub API, serving recorded fixtures or synthetic
+# data so the fetch path can be exercised offline. Run it with
+#   python benchmarks/mock_github.py --port 8765 --latency 0.05
+# and point the app at it with GITHUB_API_URL=http://127.0.0.1:8765
+#
+# REST routes: /repos/{o}/{r}/contributors, /repos/{o}/{r}, /repos/{o}/{r}/pulls,
+# /orgs/{o}/repos, /users/{u}, /users/{u}/events, /users/{u}/orgs and the PR
+# counts of /search/issues. A JSON file under
+# fixtures/rest/ with the same path (e.g. fixtures/rest/users/octocat.json)
+# is served as recorded; everything else is generated from the names, so the
+# same URL always gets the same answer. A repository named like "repo-1000"
+# has 1000 contributors (and 1000 pull requests); an organization named like "org-20" has 20
+# repositories repo-10, repo-20, ..., repo-200, so most of their contributors
+# are shared. Answers carry ETags, Link pagination and
+# X-RateLimit-* headers; every request waits the configured latency first.
+# Larger bodies are gzip compressed for clients that accept it.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+REST_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "rest")
+
+USER_ALIAS = re.compile(r'(\w+): user\(login: ("(?:[^"\\]|\\.)*")\)')
+
+DEFAULT_CONTRIBUTORS = 100
+DEFAULT_ORG_REPOS = 10
+EVENTS_PER_USER = 40
+REPOSITORY_POOL = 500
+DEFAULT_RATE_LIMIT = 5000
+RATE_LIMIT_WINDOW = 60 * 60
+
+# Bodies from this size on are compressed (GitHub compresses all JSON answers)
+GZIP_MIN_SIZE = 1024
+
+# Same page sizes as GitHub
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+# Pull request timestamps are spread over days
+DAY = 24 * 60 * 60
+
+REST_ROUTES = [
+    ("contributors", re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/contributors/?$")),
+    ("pulls", re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/?$")),
+    ("search_issues", re.compile(r"^/search/issues/?$")),
+    ("repo", re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/?$")),
+    ("org_repos", re.compile(r"^/orgs/(?P<org>[^/]+)/repos/?$")),
+    ("events", re.compile(r"^/users/(?P<login>[^/]+)/events/?$")),
+    ("orgs", re.compile(r"^/users/(?P<login>[^/]+)/orgs/?$")),
+    ("user", re.compile(r"^/users/(?P<login>[^/]+)/?$")),
+]
+
+# Function to format a Unix time the way GitHub does ("2024-05-01T12:00:00Z")
+
+
+def iso_time(timestamp):
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, like api.github.com
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle's algorithm the
+    # body would wait for the client's delayed ACK on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.count_request(self.path)
+        self.server.wait()
+        resource = "search" if urlsplit(self.path).path.rstrip("/") == "/search/issues" else "core"
+        rate_limit = self.server.take_rate_limit(self.headers.get("Authorization"), resource)
+        if rate_limit["X-RateLimit-Remaining"] < 0:
+            rate_limit["X-RateLimit-Remaining"] = 0
+            return self.send_json({"message": "API rate limit exceeded"}, status=403, headers=rate_limit)
+
+        answer = self.server.answer_rest(self.path)
+        if answer is None:
+            return self.send_json({"message": "Not Found"}, status=404, headers=rate_limit)
+        payload, headers = answer
+        headers.update(rate_limit)
+        self.send_json(payload, headers=headers)
+
+    def do_POST(self):
+        self.server.count_request(self.path)
+        self.server.wait()
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path.rstrip("/") != "/graphql":
+            return self.send_json({"message": "Not Found"}, status=404)
+        rate_limit = self.server.take_rate_limit(self.headers.get("Authorization"), "graphql")
+        if rate_limit["X-RateLimit-Remaining"] < 0:
+            rate_limit["X-RateLimit-Remaining"] = 0
+            return self.send_json({"message": "API rate limit exceeded"}, status=403, headers=rate_limit)
+        query = json.loads(body)["query"]
+        self.send_json(self.server.answer_graphql(query), headers=rate_limit)
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        headers = dict(headers or {})
+        if status == 200:
+            headers["ETag"] = '"' + hashlib.sha1(body).hexdigest() + '"'
+            # Conditional requests that match do not need the body
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status, body = 304, b""
+        if len(body) >= GZIP_MIN_SIZE and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, users, latency=0.0, rate_limit=DEFAULT_RATE_LIMIT,
+                 default_contributors=DEFAULT_CONTRIBUTORS, events_per_user=EVENTS_PER_USER, ssl_context=None,
+                 graphql_rate_limit=None):
+        super().__init__(address, MockGitHubHandler)
+        # Serve HTTPS (like api.github.com) when given a server side SSLContext
+        self.ssl_context = ssl_context
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+        self.users = users
+        self.latency = latency
+        self.rate_limit = rate_limit
+        # Like GitHub, REST, search and GraphQL requests have separate limits
+        self.rate_limits = {"core": rate_limit, "search": rate_limit,
+                            "graphql": rate_limit if graphql_rate_limit is None else graphql_rate_limit}
+        self.default_contributors = default_contributors
+        self.events_per_user = events_per_user
+        self.request_counts = {}
+        # Pull request timestamps are relative to the server start
+        self.started_at = time.time()
+        self.pull_updates = {}
+        self._rate_limits = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        scheme = "https" if self.ssl_context is not None else "http"
+        return f"{scheme}://{host}:{port}"
+
+    def count_request(self, path):
+        route = path.split("?")[0]
+        with self._lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+            self._rate_limits.clear()
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # Count the request against the rate limit of its token (or of anonymous
+    # use) for the resource ("core", "search" or "graphql")
+    def take_rate_limit(self, authorization, resource="core"):
+        now = time.time()
+        limit = self.rate_limits[resource]
+        with self._lock:
+            remaining, reset_at = self._rate_limits.get(
+                (resource, authorization), (limit, now + RATE_LIMIT_WINDOW))
+            if now >= reset_at:
+                remaining, reset_at = limit, now + RATE_LIMIT_WINDOW
+            remaining -= 1
+            self._rate_limits[(resource, authorization)] = (max(remaining, 0), reset_at)
+        return {"X-RateLimit-Limit": limit, "X-RateLimit-Remaining": remaining,
+                "X-RateLimit-Reset": int(reset_at), "X-RateLimit-Resource": resource}
+
+    # Return (payload, headers) for a REST path, or None if it is unknown
+    def answer_rest(self, path):
+        parts = urlsplit(path)
+        query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        recorded = os.path.join(REST_FIXTURES_DIR, parts.path.strip("/") + ".json")
+        if os.path.isfile(recorded):
+            with open(recorded) as fixture:
+                return json.load(fixture), {}
+
+        for name, pattern in REST_ROUTES:
+            match = pattern.match(parts.path)
+            if match:
+                return getattr(self, f"rest_{name}")(query, **match.groupdict())
+        return None
+
+    def rest_contributors(self, query, owner, repo):
+        size = re.search(r"(\d+)$", repo)
+        count = int(size.group(1)) if size else self.default_contributors
+        contributors = [{"login": f"user{index}", "contributions": max(1, 10000 // (index + 1))}
+                        for index in range(count)]
+        return self.paginate(f"/repos/{owner}/{repo}/contributors", contributors, query)
+
+    # Pull requests of a repository in every state: about 60% merged, 20%
+    # closed without merging and 20% open, created over the last two years
+    def pull_requests(self, owner, repo):
+        rng = random.Random(f"{owner}/{repo}/pulls")
+        size = re.search(r"(\d+)$", repo)
+        count = int(size.group(1)) if size else rng.randint(1, 40)
+        pulls = []
+        for number in range(1, count + 1):
+            created = self.started_at - rng.uniform(0, 730) * DAY
+            updated = min(self.started_at - rng.uniform(0, DAY), created + rng.expovariate(1 / 20) * DAY)
+            outcome = rng.random()
+            closed = updated if outcome < 0.8 else None
+            merged = updated if outcome < 0.6 else None
+            updated = self.pull_updates.get((owner, repo, number), updated)
+            pulls.append({"number": number, "state": "open" if closed is None else "closed",
+                          "created_at": iso_time(created), "updated_at": iso_time(updated),
+                          "closed_at": iso_time(closed), "merged_at": iso_time(merged)})
+        return pulls
+
+    # Mark a pull request as updated now, as a comment or push would
+    def touch_pull(self, owner, repo, number):
+        with self._lock:
+            self.pull_updates[(owner, repo, number)] = time.time()
+
+    def rest_pulls(self, query, owner, repo):
+        state = query.get("state", "open")
+        pulls = [pull for pull in self.pull_requests(owner, repo) if state == "all" or pull["state"] == state]
+        key = "updated_at" if query.get("sort") == "updated" else "created_at"
+        pulls.sort(key=lambda pull: pull[key], reverse=query.get("direction", "desc") == "desc")
+        return self.paginate(f"/repos/{owner}/{repo}/pulls", pulls, query)
+
+    # Only the total_count of pull request searches like
+    # "repo:o/r is:pr is:open updated:<2024-01-01"
+    def rest_search_issues(self, query):
+        terms = dict(term.split(":", 1) for term in query.get("q", "").split() if ":" in term)
+        owner, _, repo = terms.get("repo", "/").partition("/")
+        pulls = self.pull_requests(owner, repo)
+        for term in query.get("q", "").split():
+            if term == "is:open":
+                pulls = [pull for pull in pulls if pull["state"] == "open"]
+            elif term == "is:closed":
+                pulls = [pull for pull in pulls if pull["state"] == "closed"]
+            elif term == "is:merged":
+                pulls = [pull for pull in pulls if pull["merged_at"]]
+            elif term.startswith("updated:<"):
+                pulls = [pull for pull in pulls if pull["updated_at"][:10] < term[len("updated:<"):]]
+        return {"total_count": len(pulls), "incomplete_results": False, "items": []}, {}
+
+    def rest_repo(self, query, owner, repo):
+        rng = random.Random(f"{owner}/{repo}")
+        return {"full_name": f"{owner}/{repo}", "forks": rng.randint(0, 5000),
+                "stargazers_count": rng.randint(0, 50000), "default_branch": "main",
+                "clone_url": f"https://github.com/{owner}/{repo}.git"}, {}
+
+    def rest_org_repos(self, query, org):
+        size = re.search(r"(\d+)$", org)
+        count = int(size.group(1)) if size else DEFAULT_ORG_REPOS
+        repos = [{"name": f"repo-{10 * (index + 1)}", "full_name": f"{org}/repo-{10 * (index + 1)}",
+                  "fork": False, "archived": False} for index in range(count)]
+        return self.paginate(f"/orgs/{org}/repos", repos, query)
+
+    def rest_user(self, query, login):
+        rng = random.Random(login)
+        return {"login": login, "name": login.title(), "followers": rng.randint(0, 2000),
+                "following": rng.randint(0, 300), "public_repos": rng.randint(0, 150)}, {}
+
+    def rest_events(self, query, login):
+        rng = random.Random(f"{login}/events")
+        events = []
+        for _ in range(self.events_per_user):
+            project = rng.randrange(REPOSITORY_POOL)
+            name = f"org{project % 50}/project{project}"
+            push = rng.random() < 0.6
+            events.append({
+                "type": "PushEvent" if push else "WatchEvent",
+                "repo": {"name": name, "url": f"{self.base_url}/repos/{name}"},
+                "payload": {"commits": [{"sha": f"{n:040x}"} for n in range(rng.randint(1, 5))]}
+                if push else {},
+            })
+        return self.paginate(f"/users/{login}/events", events, query)
+
+    def rest_orgs(self, query, login):
+        rng = random.Random(f"{login}/orgs")
+        return [{"login": f"org{rng.randrange(50)}"} for _ in range(rng.randint(0, 5))], {}
+
+    # Slice a list into the requested page and add the Link header
+    def paginate(self, path, items, query):
+        per_page = min(int(query.get("per_page", DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page = max(1, int(query.get("page", 1)))
+        last = max(1, -(-len(items) // per_page))
+        links = []
+        if page < last:
+            # Like GitHub, the links keep the other query parameters (state, sort, ...)
+            for number, rel in ((page + 1, "next"), (last, "last")):
+                link_query = urlencode({**query, "per_page": per_page, "page": number})
+                links.append(f'<{self.base_url}{path}?{link_query}>; rel="{rel}"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        return items[(page - 1) * per_page:page * per_page], headers
+
+    # Resolve every aliased user(login: ...) field of the query from the fixtures
+    def answer_graphql(self, query):
+        data = {}
+        errors = []
+        for alias, login in USER_ALIAS.findall(query):
+            login = json.loads(login)
+            data[alias] = self.users.get(login)
+            if data[alias] is None:
+                errors.append({"type": "NOT_FOUND", "path": [alias],
+                               "message": f"Could not resolve to a User with the login of '{login}'."})
+        answer = {"data": data}
+        if errors:
+            answer["errors"] = errors
+        return answer
+
+# Function to load the recorded GraphQL user nodes
+
+
+def load_users(path=os.path.join(FIXTURES_DIR, "graphql_users.json")):
+    with open(path) as fixture:
+        return json.load(fixture)["users"]
+
+# Function to start the stand-in server on a background thread
+
+
+def start_mock_server(users=None, host="127.0.0.1", port=0, **options):
+    server = MockGitHubServer((host, port), load_users() if users is None else users, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded GitHub API fixtures locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--rate-limit", type=int, default=DEFAULT_RATE_LIMIT,
+                        help="requests per hour and token")
+    args = parser.parse_args()
+    server = MockGitHubServer((args.host, args.port), load_users(),
+                              latency=args.latency, rate_limit=args.rate_limit)
+    print(f"Mock GitHub API listening on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Offline scan benchmarks against the local stand-in server (mock_github.py).
+# Every size runs collect_contributors_data and the analysis pages' core
+# functions (outlier scoring and clustering) in a fresh process with empty
+# caches, and reports wall time, HTTP requests, requests per contributor and
+# peak RSS.
+#   python benchmarks/run_benchmarks.py --sizes 10 100 1000 10000 --latency 0.02
+# --json writes the numbers; --compare fails (exit code 1) when a run is slower
+# or needs more requests per contributor than a saved one beyond --tolerance.
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, APP_DIR)
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+# Metrics compared by --compare (larger is worse)
+COMPARED_METRICS = ["wall_seconds", "requests_per_contributor", "peak_rss_mb"]
+
+# Function to run one scan inside the child process and return its numbers
+
+
+def run_scan(size, max_in_flight, backend):
+    from sentinel import contributors
+    from sentinel.clustering import cluster_contributors
+    from sentinel.exports import numeric_columns
+    from sentinel.outliers import score_outliers
+    from sentinel.scheduler import default_scheduler
+
+    default_scheduler().configure(contributors.tokens)
+    started = time.perf_counter()
+    rows = contributors.collect_contributors_data(
+        "bench", f"repo-{size}", max_in_flight=max_in_flight, backend=backend)
+    fetch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    df = rows.to_frame()
+    score_outliers(df, numeric_columns(df))
+    if len(df) > 2:
+        cluster_contributors(df, mode="scalable")
+    analysis_seconds = time.perf_counter() - started
+
+    return {"rows": len(rows), "fetch_seconds": fetch_seconds,
+            "analysis_seconds": analysis_seconds, "peak_rss_mb": peak_rss_mb()}
+
+# Function to read the peak resident set size of this process in MB
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# Function to run one size in a fresh process against the server
+
+
+def run_size(server, size, args):
+    server.reset_counts()
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, GITHUB_API_URL=server.base_url, GITHUB_GRAPHQL_URL=f"{server.base_url}/graphql",
+                   GITHUB_TOKENS="benchmark-token", REPO_SENTINEL_HOME=home)
+        started = time.perf_counter()
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(size),
+             "--max-in-flight", str(args.max_in_flight), "--backend", args.backend],
+            env=env, cwd=APP_DIR, capture_output=True, text=True, check=True)
+        wall_seconds = time.perf_counter() - started
+    result = json.loads(child.stdout.splitlines()[-1])
+    requests = server.total_requests()
+    result.update(size=size, wall_seconds=wall_seconds, requests=requests,
+                  requests_per_contributor=requests / size)
+    return result
+
+# Function to compare results with a saved run, returns the regressions
+
+
+def compare(results, baseline, tolerance):
+    saved = {entry["size"]: entry for entry in baseline}
+    regressions = []
+    for result in results:
+        before = saved.get(result["size"])
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if before.get(metric) and result.get(metric) is not None \
+                    and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{result['size']} contributors: {metric} "
+                                   f"{before[metric]:.2f} -> {result[metric]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--backend", choices=["rest", "graphql"], default="rest")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_scan(args.child, args.max_in_flight, args.backend)))
+        return 0
+
+    from benchmarks.mock_github import start_mock_server
+    server = start_mock_server(latency=args.latency, rate_limit=10 ** 9)
+    print(f"{'contributors':>12} {'wall s':>8} {'fetch s':>8} {'analysis s':>10} "
+          f"{'requests':>9} {'req/contrib':>11} {'peak RSS MB':>11}")
+    results = []
+    for size in args.sizes:
+        result = run_size(server, size, args)
+        results.append(result)
+        print(f"{size:>12} {result['wall_seconds']:>8.2f} {result['fetch_seconds']:>8.2f} "
+              f"{result['analysis_seconds']:>10.2f} {result['requests']:>9} "
+              f"{result['requests_per_contributor']:>11.2f} {result['peak_rss_mb'] or 0:>11.1f}")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as saved:
+            regressions = compare(results, json.load(saved), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,72 @@
 import os
-import subprocess
-import requests
-import json
 import streamlit as st
-import shutil
+import uuid
+from sentinel.clones import CloneManager
+from sentinel.jobs import FINISHED_STATES, POLL_SECONDS, default_job_store, ensure_workers, job_folder
+
+# URL query parameter holding the id of the running Bandit scan
+JOB_QUERY_KEY = "bandit_job"
+
+# Function to show the status and results of a Bandit scan job. While the job
+# runs only this part of the page is re-run, every POLL_SECONDS.
+
+
+def show_bandit_job(job_id):
+    job = default_job_store().get(job_id)
+    if job is None:
+        st.error("Unknown analysis. Please run it again.")
+        return
+    polling = job["status"] not in FINISHED_STATES
+    st.fragment(render_bandit_job, run_every=POLL_SECONDS if polling else None)(job_id, polling)
+
+
+def render_bandit_job(job_id, polling):
+    job = default_job_store().get(job_id)
+    # Re-run the whole page once so polling stops
+    if polling and job["status"] in FINISHED_STATES:
+        st.rerun()
+
+    if job["status"] == "queued":
+        st.progress(0, text=f"Waiting for a free worker ({job['position']} scans ahead).")
+    elif job["status"] == "running":
+        st.progress(job["done"] / job["total"] if job["total"] else 0, text=job["message"])
+    elif job["status"] == "failed":
+        st.error(job["error"])
+    else:
+        st.success("Repository cloned successfully.")
+        st.success("Bandit analysis completed.")
+        stats = job["result"]["stats"]
+        st.caption(f"{stats['files']} Python files: {stats['cached']} from cache, "
+                   f"{stats['scanned']} scanned in {stats['shards']} shards.")
+
+        # Provide a download link for the Bandit results
+        with open(os.path.join(job_folder(job_id), job["result"]["results_file"]), 'rb') as file:
+            bandit_results_data = file.read()
+
+        st.download_button(
+            label="Download Bandit Results",
+            data=bandit_results_data,
+            file_name='bandit_results.json',
+            key='bandit_results_download',
+        )
+
 
 # Streamlit App
 st.title("GitHub Repo Analysis with Bandit")
 
+# Scans run in background worker processes shared by all sessions
+ensure_workers()
+
 # Input for GitHub repository URL
 github_repo_url = st.text_input("Enter GitHub repository URL:")
 
+# Every browser session gets its own working folder
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+filter_blobs = st.sidebar.checkbox(
+    "Partial clone (download file contents only when checked out)", value=True)
+python_only = st.sidebar.checkbox("Check out Python files only", value=True)
+
 # Button to initiate analysis
 if st.button("Run Analysis"):
     # Parse GitHub repository information
@@ -20,43 +76,18 @@ if st.button("Run Analysis"):
         st.error("Invalid GitHub repository URL. Please provide a valid URL.")
         st.stop()
 
-    # Fetch GitHub repository information
-    api_url = f'https://api.github.com/repos/{username}/{repo_name}'
-    response = requests.get(api_url)
-
-    if response.status_code == 200:
-        repo_info = response.json()
-
-        # Clone the repository
-        local_repo_folder = 'cloned_repo'
-        clone_url = repo_info['clone_url']
-        subprocess.run(["git", "clone", clone_url, local_repo_folder], check=True)
+    # Fetching, cloning and scanning run in the worker pool; the job id in the
+    # URL survives a browser refresh
+    st.query_params[JOB_QUERY_KEY] = default_job_store().submit("bandit", {
+        "username": username, "repo_name": repo_name, "session_id": session_id,
+        "filter_blobs": filter_blobs, "python_only": python_only,
+    })
 
-        # Perform Bandit analysis
-        bandit_output_file = 'bandit_results.json'
-        bandit_process = subprocess.run(["bandit", "-r", local_repo_folder, "-f", "json", "-o", bandit_output_file])
+job_id = st.query_params.get(JOB_QUERY_KEY)
+if job_id:
+    show_bandit_job(job_id)
 
-        if bandit_process.returncode != 0:
-            st.success("Repository cloned successfully.")
-            st.success("Bandit analysis completed.")
-
-            # Provide a download link for the Bandit results
-            with open(bandit_output_file, 'rb') as file:
-                bandit_results_data = file.read()
-
-            st.download_button(
-                label="Download Bandit Results",
-                data=bandit_results_data,
-                file_name=bandit_output_file,
-                key='bandit_results_download',
-            )
-
-            # Button to remove the cloned repository
-            if st.button("Remove Cloned Repository"):
-                shutil.rmtree(local_repo_folder)
-                st.info("Cloned repository removed.")
-        else:
-            st.error(f"Error during Bandit analysis. Bandit returned non-zero exit status {bandit_process.returncode}")
-
-    else:
-        st.error(f"Failed to fetch repository information. Status code: {response.status_code}")
+# Button to remove the cloned repository of this session
+if st.button("Remove Cloned Repository"):
+    CloneManager().release(session_id)
+    st.info("Cloned repository removed.")
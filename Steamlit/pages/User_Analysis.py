@@ -1,9 +1,15 @@
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.ensemble import IsolationForest
 import seaborn as sns
 from collections import Counter
+from io import BytesIO
+import numpy as np
+from sentinel.exports import SESSION_PARQUET_KEY, SESSION_SCOPE_KEY, NUMERIC_COLUMNS, load_contributors
+from sentinel.outliers import score_outliers
+from sentinel.anomaly_model import ModelError, fit_anomaly_model, list_versions, load_model, save_model
+from sentinel.analysis_cache import default_analysis_cache, fingerprint
+from sentinel.clustering import MIN_CONTRIBUTORS
+from sentinel.charts import MAX_ANNOTATIONS, MAX_PLOTTED_INLIERS, draw_inliers, figure_to_png, top_indices
 
 
 st.set_page_config(
@@ -19,58 +25,71 @@ st.write(
 style = "<style>h2 {text-align:;}</style>"
 st.markdown(style, unsafe_allow_html=True)
 
-# Function to detect outliers and display a graph for a parameter
+# Function to draw the graph of a parameter with its detected outliers, as PNG bytes
+# Large inlier sets are drawn as a density layer and only the max_labels most
+# extreme outliers are named.
 
 
-def detect_outliers(df, parameter, contamination=0.05, custom_cmap='coolwarm'):
-    df_numeric = df[[parameter]]
-    df_numeric.fillna(0, inplace=True)
-
-    model = IsolationForest(contamination=contamination)
-    model.fit(df_numeric)
-
-    outliers = model.predict(df_numeric)
-    outliers = outliers == -1
+def plot_outliers(df, parameter, outliers, custom_cmap='coolwarm', max_points=MAX_PLOTTED_INLIERS,
+                  max_labels=MAX_ANNOTATIONS):
+    values = df[parameter].astype(float).fillna(0).to_numpy()
+    positions = df.index.to_numpy()
+    parameter_outliers = outliers[outliers['Parameter'] == parameter]
+    is_outlier = np.zeros(len(df), dtype=bool)
+    is_outlier[parameter_outliers['Index'].to_numpy()] = True
 
     # Visualize the results
     fig, ax = plt.subplots(figsize=(8, 6))
 
     # Set a different colormap for the graph
-    scatter = ax.scatter(df.index, df_numeric[parameter], s=100,
-                         label=parameter, alpha=0.5, c=outliers, cmap=custom_cmap)
+    cmap = plt.get_cmap(custom_cmap)
+    draw_inliers(ax, positions[~is_outlier], values[~is_outlier], cmap(0.0), 'Inlier',
+                 max_points=max_points, s=100, alpha=0.5)
+    ax.scatter(positions[is_outlier], values[is_outlier], s=100,
+               alpha=0.5, color=cmap(1.0), label='Outlier')
 
     ax.set_xlabel('Data Point Index')
     ax.set_ylabel(parameter)
     ax.set_title(f'Isolation Forest for {parameter}')
 
-    # Annotate the points with names for outliers
-    outlier_names = [name if is_outlier else '' for name,
-                     is_outlier in zip(df['Contributor'], outliers)]
-    for i, name in enumerate(outlier_names):
-        if name:
-            ax.annotate(
-                name, (df.index[i], df_numeric[parameter][i]), color='red')
+    # Annotate the most extreme outliers with their names
+    outlier_values = parameter_outliers['Value'].to_numpy()
+    labelled = top_indices(np.abs(outlier_values - np.mean(values)), max_labels)
+    for name, i, value in zip(parameter_outliers['Outlier'].to_numpy()[labelled],
+                              parameter_outliers['Index'].to_numpy()[labelled],
+                              outlier_values[labelled]):
+        ax.annotate(name, (positions[i], value), color='red')
 
-    # Create a colorbar for the outlier points
-    cbar = fig.colorbar(scatter, ax=ax)
-    cbar.set_label('Outlier', rotation=270)
+    ax.legend()
 
-    st.pyplot(fig)
-
-    return outlier_names
+    return figure_to_png(fig)
 
 
 # Main Streamlit app
 st.title("Vulnerable User Detection")
 st.sidebar.title("Upload Data")
-# Add a sidebar for uploading the Excel file
-uploaded_file = st.sidebar.file_uploader("Upload an Excel file", type=["xlsx"])
+# Add a sidebar for uploading the Excel or Parquet file
+uploaded_file = st.sidebar.file_uploader(
+    "Upload an Excel or Parquet file", type=["xlsx", "parquet"])
+
+# Fall back to the last scan of the Search page, handed over as Parquet
+if uploaded_file is None and SESSION_PARQUET_KEY in st.session_state:
+    uploaded_file = BytesIO(st.session_state[SESSION_PARQUET_KEY])
+    uploaded_file.name = "last_scan.parquet"
+    st.sidebar.write("Using the contributors of the last scan.")
 
 if uploaded_file is not None:
-    df = pd.read_excel(uploaded_file, sheet_name="Sheet1")
+    # Results are memoized by file content and parameters across reruns
+    analysis_cache = default_analysis_cache()
+    file_key = fingerprint(uploaded_file.getvalue())
 
-    # Exclude non-numeric columns (e.g., 'Contributor' and 'Name')
-    non_numeric_columns = ['Contributor', 'Name']
+    # Load only the contributor names and the numeric parameters
+    columns = ["Contributor"] + NUMERIC_COLUMNS
+    df = analysis_cache.get_or_compute(
+        ("frame", file_key, tuple(columns)), lambda: load_contributors(uploaded_file, columns=columns))
+
+    # Exclude non-numeric columns (e.g., 'Contributor')
+    non_numeric_columns = ['Contributor']
     df_numeric = df.drop(columns=non_numeric_columns)
 
     # Define custom colormaps for each parameter
@@ -85,69 +104,104 @@ if uploaded_file is not None:
         'Number of Organizations': 'bwr'
     }
 
-    # Store outlier information for each parameter
-    outlier_info = {}
-
-    # Iterate over the parameters and detect outliers
-    parameters = df_numeric.columns
+    joint_model = st.sidebar.checkbox(
+        "Score all parameters with one joint model", value=False,
+        help="One Isolation Forest over all parameters instead of one per parameter.")
+
+    # Models saved for the repository or organization score new contributors
+    # without refitting on the whole population
+    st.sidebar.title("Saved Model")
+    scope = st.sidebar.text_input(
+        "Repository or organization", value=st.session_state.get(SESSION_SCOPE_KEY, ""),
+        help="owner/repo or organization name the model is saved under")
+    # Names that cannot be turned into a model folder (e.g. "..") have no versions
+    saved_versions = []
+    valid_scope = bool(scope)
+    if scope:
+        try:
+            saved_versions = list_versions(scope)
+        except ModelError as error:
+            st.sidebar.error(str(error))
+            valid_scope = False
+    if st.sidebar.button("Refit and save model", disabled=not valid_scope or len(df) < MIN_CONTRIBUTORS):
+        version = save_model(fit_anomaly_model(df, scope, joint=joint_model))
+        st.sidebar.success(f"Saved model version {version} for {scope}.")
+        saved_versions = list_versions(scope)
+    use_saved_model = st.sidebar.checkbox(
+        "Score against the saved model", value=bool(saved_versions), disabled=not saved_versions,
+        help="Flag outliers with the models of the latest saved version instead of refitting.")
+
+    saved_model = None
+    if use_saved_model and saved_versions:
+        try:
+            saved_model = analysis_cache.get_or_compute(
+                ("model", scope, saved_versions[-1]), lambda: load_model(scope, saved_versions[-1]))
+        except ModelError as error:
+            st.sidebar.error(str(error))
+
+    if saved_model is not None:
+        # Parameters missing from the file are scored as 0 but not charted
+        parameters = [parameter for parameter in saved_model.parameters if parameter in df]
+        outlier_key = ("saved_outliers", file_key, scope, saved_model.version)
+        outliers = analysis_cache.get_or_compute(outlier_key, lambda: saved_model.score_outliers(df))
+
+        drift = analysis_cache.get_or_compute(
+            ("drift", file_key, scope, saved_model.version), lambda: saved_model.drift(df))
+        st.sidebar.caption(f"Model version {saved_model.version}, fitted on "
+                           f"{saved_model.reference['rows']} contributors.")
+        if drift.refit_due:
+            st.sidebar.warning("Refit due: " + "; ".join(drift.reasons))
+        with st.sidebar.expander("Drift since the fit"):
+            st.write(f"Far from every centroid: {drift.outlier_rate:.1%} "
+                     f"(at fit time {drift.reference_outlier_rate:.1%})")
+            st.dataframe(drift.features[["Parameter", "PSI", "Shift (std)"]], hide_index=True)
+    else:
+        # Score every parameter in one pass (per-column models are fitted in parallel)
+        parameters = list(df_numeric.columns)
+        outlier_key = ("outliers", file_key, tuple(parameters), joint_model)
+        outliers, _ = analysis_cache.get_or_compute(
+            outlier_key, lambda: score_outliers(df, parameters, n_jobs=-1, joint=joint_model))
+
+    max_labels = st.sidebar.slider(
+        "Labelled outliers per chart", min_value=0, max_value=200, value=MAX_ANNOTATIONS)
+
+    # Iterate over the parameters and display their outliers
+    # Charts are only drawn once their box is ticked, and never twice for the same inputs
     for parameter in parameters:
         st.subheader(f"Parameter: {parameter}")
         custom_cmap = custom_colormaps.get(
             parameter, 'coolwarm')  # Default to 'coolwarm'
-        # detect_outliers(df, parameter, custom_cmap=custom_cmap)
-        outlier_names = detect_outliers(df, parameter, custom_cmap=custom_cmap)
-        outlier_info[parameter] = [name for name in outlier_names if name]
+        parameter_count = int((outliers['Parameter'] == parameter).sum())
+        if st.checkbox(f"Show chart ({parameter_count} outliers)", key=f"chart-{parameter}",
+                       value=len(df) <= MAX_PLOTTED_INLIERS):
+            chart = analysis_cache.get_or_compute(
+                ("figure", outlier_key, parameter, custom_cmap, max_labels),
+                lambda: plot_outliers(df, parameter, outliers, custom_cmap=custom_cmap,
+                                      max_labels=max_labels))
+            st.image(chart)
 
     # Create a table showing parameters with their respective outliers
     st.subheader("Outlier Information by Parameter")
 
-    parameter_outliers = []
-
-    for parameter in outlier_info:
-        # Calculate the range and threshold for the parameter
-        # min_value = min(df[parameter])
-        # max_value = max(df[parameter])
-        # range_value = max_value - min_value
-        # threshold = range_value / 2
-
-        threshold = df[parameter].mean()
-
-        # Determine the type of outlier for each contributor
-        outlier_type = []
-
-        for outlier_name in outlier_info[parameter]:
-            # Get the numeric value of the outlier based on the parameter
-            outlier_value = df[df['Contributor'] ==
-                               outlier_name][parameter].values[0]
-            outlier_float = float(outlier_value)
-            outlier_type.append('Negative' if abs(
-                outlier_float) < threshold else 'Positive')
-
-        # Create a list of dictionaries for each parameter
-        parameter_outliers.extend(
-            [{"Parameter": parameter, "Outlier": contributor, "Type": outlier_type[i]}
-                for i, contributor in enumerate(outlier_info[parameter])]
-        )
-
     # Display the parameter names, their respective outliers, and their types (positive/negative)
-    st.table(parameter_outliers)
+    st.dataframe(outliers[["Parameter", "Outlier", "Type"]], hide_index=True)
 
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 
-    # Determine the most occurring outlier
-    all_outliers = [name for names in outlier_info.values() for name in names]
-    # most_common_outlier, count = Counter(all_outliers).most_common(1)[0]
-
     # Determine the most common count of outliers
-    outlier_counts = Counter(all_outliers)
-    max_count = max(outlier_counts.values())
-
-    # Find all outliers with the maximum count
-    most_common_outliers = [outlier for outlier,
-                            count in outlier_counts.items() if count == max_count]
+    outlier_counts = Counter(outliers['Outlier'])
 
     # Show the most occurring outliers
     st.subheader("Most Occurring Outliers")
-    st.write(
-        f"The most occurring outliers with a count of {max_count} are: {', '.join(most_common_outliers)}")
+    if outlier_counts:
+        max_count = max(outlier_counts.values())
+
+        # Find all outliers with the maximum count
+        most_common_outliers = [outlier for outlier,
+                                count in outlier_counts.items() if count == max_count]
+
+        st.write(
+            f"The most occurring outliers with a count of {max_count} are: {', '.join(most_common_outliers)}")
+    else:
+        st.write("No outliers were detected.")
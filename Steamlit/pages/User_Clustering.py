@@ -1,11 +1,12 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import silhouette_score
-from sklearn.decomposition import PCA
-import numpy as np
+from io import BytesIO
+from sentinel.exports import SESSION_PARQUET_KEY, SESSION_SCOPE_KEY, NUMERIC_COLUMNS, load_contributors
+from sentinel.anomaly_model import ModelError, fit_anomaly_model, list_versions, load_model, save_model
+from sentinel.analysis_cache import default_analysis_cache, fingerprint
+from sentinel.charts import MAX_ANNOTATIONS, MAX_PLOTTED_INLIERS, draw_inliers, figure_to_png, top_indices
+from sentinel.clustering import (DEFAULT_SILHOUETTE_SAMPLE, DEFAULT_TIME_BUDGET, MIN_CONTRIBUTORS,
+                                 SCALABLE_K_VALUES, cluster_contributors)
 
 
 st.set_page_config(
@@ -22,71 +23,45 @@ style = "<style>h2 {text-align:;}</style>"
 st.markdown(style, unsafe_allow_html=True)
 
 # Define a function for clustering and visualization
+# Returns the rendered chart (PNG bytes), the silhouette scores and the outlier
+# names, so the whole result can be memoized across reruns. With a saved
+# model, the contributors are assigned to its centroids instead of refitting.
 
 
-def cluster_and_visualize_data(data):
-    # Select only the numerical columns (exclude the first two columns)
-    numerical_data = data.iloc[:, 2:]
-
-    # Fill missing values with zeros
-    numerical_data.fillna(0, inplace=True)
-
-    # Standardize the numerical data
-    scaler = StandardScaler()
-    numerical_data_scaled = scaler.fit_transform(numerical_data)
-
-    # Choose the number of clusters (K) using the Silhouette Score
-    scores = []
-    k_values = range(2, 5)
-
-    for k in k_values:
-        kmeans = KMeans(n_clusters=k, random_state=0)
-        kmeans.fit(numerical_data_scaled)
-        scores.append(silhouette_score(numerical_data_scaled, kmeans.labels_))
-
-    # Find the optimal K based on the Silhouette Score
-    optimal_k = k_values[scores.index(max(scores))]
-
-    # Apply K-Means clustering with the optimal K
-    kmeans = KMeans(n_clusters=optimal_k, random_state=0)
-    data['cluster'] = kmeans.fit_predict(numerical_data_scaled)
-
-    # Apply PCA for dimensionality reduction
-    pca = PCA(n_components=2)
-    pca_result = pca.fit_transform(numerical_data_scaled)
-    data['PCA1'] = pca_result[:, 0]
-    data['PCA2'] = pca_result[:, 1]
-
-    # Find the centroids of each cluster
-    centroids = kmeans.cluster_centers_
-
-    # Calculate the Euclidean distance from each point to its cluster's centroid
-    distances = np.linalg.norm(
-        numerical_data_scaled - centroids[data['cluster']], axis=1)
-
-    # Define a threshold for identifying outliers (e.g., points with distances above a certain percentile)
-    outlier_threshold = np.percentile(distances, 90)
+def cluster_and_visualize_data(data, mode="exact", k_values=None, sample_size=DEFAULT_SILHOUETTE_SAMPLE,
+                               time_budget=None, saved_model=None):
+    if saved_model is not None:
+        result = saved_model.cluster(data)
+    else:
+        result = cluster_contributors(data, mode=mode, k_values=k_values,
+                                      sample_size=sample_size, time_budget=time_budget)
+    data = result.data
+    clustering = result.clustering
+    optimal_k = clustering.k
+    distances = result.distances
+    pca_result = data[['PCA1', 'PCA2']].to_numpy()
 
     # Mark outliers and label them with their names
-    outliers = data[distances > outlier_threshold]
+    is_outlier = result.is_outlier
+    outliers = data[is_outlier]
     outlier_names = outliers['Contributor']
 
     # Visualize the clusters in PCA space
+    # Large clusters are drawn as a density layer, outliers are always drawn
     fig, ax = plt.subplots(figsize=(10, 6))
+    colors = plt.get_cmap('tab10')
+    max_points = max(1, MAX_PLOTTED_INLIERS // optimal_k)
     for cluster_id in range(optimal_k):
-        cluster_points = pca_result[data['cluster'] == cluster_id]
-        ax.scatter(cluster_points[:, 0], cluster_points[:,
-                   1], label=f'Cluster {cluster_id}')
-
-    # Add annotations for cluster numbers
-    for cluster_id in range(optimal_k):
-        cluster_center = np.mean(
-            pca_result[data['cluster'] == cluster_id], axis=0)
+        cluster_points = pca_result[(data['cluster'] == cluster_id).to_numpy() & ~is_outlier]
+        draw_inliers(ax, cluster_points[:, 0], cluster_points[:, 1], colors(cluster_id % 10),
+                     f'Cluster {cluster_id}', max_points=max_points)
 
-    # Plot outliers
+    # Plot outliers, naming only the ones farthest from their centroid
     ax.scatter(outliers['PCA1'], outliers['PCA2'], c='red',
                marker='x', s=100, label='Outliers')
-    for name, x, y in zip(outlier_names, outliers['PCA1'], outliers['PCA2']):
+    labelled = top_indices(distances[is_outlier], MAX_ANNOTATIONS)
+    for name, x, y in zip(outlier_names.to_numpy()[labelled], outliers['PCA1'].to_numpy()[labelled],
+                          outliers['PCA2'].to_numpy()[labelled]):
         ax.annotate(name, (x, y), fontsize=8, color='red')
 
     ax.set_xlabel('PCA1')
@@ -94,10 +69,23 @@ def cluster_and_visualize_data(data):
     ax.set_title(f'Clustering (K={optimal_k}) in PCA Space with Outliers')
     ax.legend()
 
-    st.pyplot(fig)
+    return {
+        "chart": figure_to_png(fig),
+        "scores": clustering.scores,
+        "outlier_names": list(outlier_names),
+        "models": (result.scaler, clustering.model, result.pca),
+    }
+
+# Function to display a clustering result
+
+
+def show_clustering(result):
+    st.image(result["chart"])
+    st.caption("Silhouette score by K: " + ", ".join(
+        f"{k}: {score:.3f}" for k, score in result["scores"].items()))
     st.write("Outliers:")
     st.write({f'Outlier {i+1}': name for i,
-             name in enumerate(outlier_names)})
+             name in enumerate(result["outlier_names"])})
 
 
 # Create a Streamlit app
@@ -107,22 +95,94 @@ st.title("User Clustering")
 st.sidebar.title("Upload Data")
 
 uploaded_file = st.sidebar.file_uploader(
-    "Upload a data file (Excel format)", type=["xlsx"])
+    "Upload a data file (Excel or Parquet format)", type=["xlsx", "parquet"])
+
+# Fall back to the last scan of the Search page, handed over as Parquet
+if uploaded_file is None and SESSION_PARQUET_KEY in st.session_state:
+    uploaded_file = BytesIO(st.session_state[SESSION_PARQUET_KEY])
+    uploaded_file.name = "last_scan.parquet"
 
 if uploaded_file is not None:
-    data = pd.read_excel(uploaded_file)
+    # Results are memoized by file content and parameters across reruns
+    analysis_cache = default_analysis_cache()
+    file_key = fingerprint(uploaded_file.getvalue())
+
+    # Load only the contributor names and the numeric parameters
+    columns = ["Contributor"] + NUMERIC_COLUMNS
+    data = analysis_cache.get_or_compute(
+        ("frame", file_key, tuple(columns)), lambda: load_contributors(uploaded_file, columns=columns))
 
     # Check if the uploaded file is valid
     if data is not None:
         st.sidebar.write("Data file loaded successfully.")
     else:
-        st.sidebar.write("Please upload a valid Excel file.")
+        st.sidebar.write("Please upload a valid Excel or Parquet file.")
 
 # Display the data table in the main page
 if 'data' in locals():
     st.write("Data Table")
     st.dataframe(data.head())
 
+    # Scalable mode for large contributor sets
+    mode = st.sidebar.radio("Clustering mode", ["exact", "scalable"],
+                            format_func=lambda name: {"exact": "Exact (K-Means, K = 2..4)",
+                                                      "scalable": "Scalable (Mini-Batch K-Means)"}[name])
+    cluster_options = {}
+    if mode == "scalable":
+        max_k = st.sidebar.slider("Largest K to try", min_value=3, max_value=20,
+                                  value=SCALABLE_K_VALUES[-1])
+        cluster_options = {
+            "k_values": range(2, max_k + 1),
+            "sample_size": st.sidebar.number_input(
+                "Silhouette sample size", min_value=100, value=DEFAULT_SILHOUETTE_SAMPLE, step=1000),
+            "time_budget": st.sidebar.number_input(
+                "Time budget for choosing K (seconds)", min_value=1.0, value=DEFAULT_TIME_BUDGET),
+        }
+
+    # Models saved for the repository or organization (see the Vulnerable User
+    # Detection page) place new contributors without refitting
+    scope = st.sidebar.text_input(
+        "Repository or organization", value=st.session_state.get(SESSION_SCOPE_KEY, ""),
+        help="owner/repo or organization name the model is saved under")
+    # Choosing K needs more contributors than clusters; saved models only assign them
+    can_fit = len(data) >= MIN_CONTRIBUTORS
+    # Names that cannot be turned into a model folder (e.g. "..") have no versions
+    saved_versions = []
+    valid_scope = bool(scope)
+    if scope:
+        try:
+            saved_versions = list_versions(scope)
+        except ModelError as error:
+            st.sidebar.error(str(error))
+            valid_scope = False
+    if st.sidebar.button("Refit and save model", disabled=not valid_scope or not can_fit):
+        version = save_model(fit_anomaly_model(data, scope))
+        st.sidebar.success(f"Saved model version {version} for {scope}.")
+        saved_versions = list_versions(scope)
+    use_saved_model = st.sidebar.checkbox(
+        "Use the saved model's clusters", value=False, disabled=not saved_versions)
+    saved_model = None
+    if use_saved_model and saved_versions:
+        try:
+            saved_model = analysis_cache.get_or_compute(
+                ("model", scope, saved_versions[-1]), lambda: load_model(scope, saved_versions[-1]))
+        except ModelError as error:
+            st.sidebar.error(str(error))
+    if saved_model is not None:
+        cluster_options = {"saved_model": saved_model}
+        cluster_key = ("saved_clustering", file_key, scope, saved_model.version)
+        st.sidebar.caption(f"Model version {saved_model.version}; silhouette scores are from its fit.")
+    else:
+        cluster_key = ("clustering", file_key, mode, tuple(sorted(cluster_options.items())))
+
     # Add a button to perform clustering and visualization in the main page
     if st.button("Cluster and Visualize"):
-        cluster_and_visualize_data(data)
+        if saved_model is None and not can_fit:
+            st.warning(f"Clustering needs at least {MIN_CONTRIBUTORS} contributors.")
+        else:
+            st.session_state["cluster_key"] = cluster_key
+
+    # Keep showing the last clustering of this file and options on later reruns
+    if st.session_state.get("cluster_key") == cluster_key:
+        show_clustering(analysis_cache.get_or_compute(
+            cluster_key, lambda: cluster_and_visualize_data(data, mode=mode, **cluster_options)))
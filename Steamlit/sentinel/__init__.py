@@ -0,0 +1 @@
+# Shared building blocks for Repo Sentinel (API access, caching, analysis)
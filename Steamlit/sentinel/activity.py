@@ -0,0 +1,72 @@
+from sentinel.endpoints import API_URL
+from sentinel.pagination import FetchError, iter_items
+
+# Per-user activity loader. The public event feed of a user is fetched (and
+# paginated) once, then every event-derived metric is computed from it in a
+# single pass over the events.
+
+# GitHub serves at most 300 events per user
+MAX_EVENTS = 300
+
+# Registered event metrics: name -> (factory for the initial value, accumulator)
+EVENT_METRICS = {}
+
+# Decorator registering accumulator(value, event) -> value as an event metric
+
+
+def event_metric(name, initial=int):
+    def register(accumulate):
+        EVENT_METRICS[name] = (initial, accumulate)
+        return accumulate
+    return register
+
+
+@event_metric("commit_count")
+def count_commits(commit_count, event):
+    if event['type'] == 'PushEvent':
+        commit_count += len(event['payload'].get('commits', []))
+    return commit_count
+
+
+# Repositories touched by the user, once per event and in feed order
+@event_metric("touched_repos", initial=list)
+def collect_touched_repos(touched_repos, event):
+    touched_repos.append(event['repo'])
+    return touched_repos
+
+
+# Function to compute all registered metrics in one pass over the events
+
+
+def summarize_events(events):
+    metrics = {name: initial() for name, (initial, _) in EVENT_METRICS.items()}
+    for event in events:
+        for name, (_, accumulate) in EVENT_METRICS.items():
+            metrics[name] = accumulate(metrics[name], event)
+    return metrics
+
+
+class UserActivity:
+    def __init__(self, username, events):
+        self.username = username
+        self.events = events
+        self.metrics = summarize_events(events)
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+
+# Function to load the event feed of a user, returns None if the first page fails.
+# fetch_page(url) returns (json, headers), see sentinel.pagination.iter_items.
+
+
+def load_user_activity(username, fetch_page):
+    events_url = f"{API_URL}/users/{username}/events"
+    events = []
+    try:
+        for event in iter_items(fetch_page, events_url, max_items=MAX_EVENTS):
+            events.append(event)
+    except FetchError:
+        if not events:
+            return None
+    return UserActivity(username, events)
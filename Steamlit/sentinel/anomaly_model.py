@@ -0,0 +1,350 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from sentinel.clustering import (DEFAULT_TIME_BUDGET, OUTLIER_PERCENTILE, ClusteringResult, ContributorClusters,
+                                 cluster_contributors)
+from sentinel.exports import numeric_columns
+from sentinel.outliers import outlier_table, score_outliers
+from sentinel.storage import data_path
+
+# Saved anomaly models. The scaler, IsolationForests, cluster centroids and PCA
+# fitted on the contributors of a repository or organization (the scope) are
+# kept as numbered versions under <data folder>/models/<scope>/, so new or
+# refreshed contributors are scored against the established population
+# instead of refitting everything:
+#   python -m sentinel.anomaly_model refit results/owner__repo.parquet --scope owner/repo
+#   python -m sentinel.anomaly_model score new.parquet --scope owner/repo
+#   python -m sentinel.anomaly_model drift latest.parquet --scope owner/repo
+#   python -m sentinel.anomaly_model list --scope owner/repo
+# The model also keeps the distribution of every parameter at fit time; drift()
+# compares a current table against it and says when a refit is due.
+# Models are pickles: only load the ones this tool wrote to its data folder.
+
+# Layout version of the saved model; older files have to be refitted
+ARTIFACT_FORMAT = 1
+
+# Tables up to this size are clustered with exact K-Means, larger ones scalably
+EXACT_MAX_ROWS = 5000
+
+# Quantile bins per parameter for the population stability index (PSI)
+DRIFT_BINS = 10
+# A refit is due beyond this PSI (the usual "significant shift" threshold),
+# when the centroid distance outlier rate grows by this factor, or after this
+# many seconds
+PSI_REFIT = 0.25
+OUTLIER_RATE_FACTOR = 2.0
+MAX_MODEL_AGE = 90 * 24 * 60 * 60
+# PSI over fewer contributors than this is noise
+MIN_DRIFT_ROWS = 30
+
+
+class ModelError(Exception):
+    pass
+
+
+# Decision table of an IsolationForest fitted on a single parameter. Its trees
+# only compare the value with split thresholds, so the verdict is constant
+# between consecutive thresholds; tabulating it once makes scoring a binary
+# search instead of a pass through every tree.
+class OutlierTable:
+    def __init__(self, model):
+        thresholds = np.unique(np.concatenate([
+            tree.tree_.threshold[tree.tree_.children_left >= 0] for tree in model.estimators_]))
+        # The trees compare float32 values: value <= threshold goes left. One
+        # representative float32 value per interval (..., t0], (t0, t1], ..., (tn, ...)
+        representatives = thresholds.astype(np.float32)
+        above = representatives > thresholds
+        representatives[above] = np.nextafter(representatives[above], np.float32(-np.inf))
+        last = np.float32(thresholds[-1]) if len(thresholds) else np.float32(0)
+        if len(thresholds) and last <= thresholds[-1]:
+            last = np.nextafter(last, np.float32(np.inf))
+        representatives = np.append(representatives, last)
+        self.thresholds = thresholds
+        self.flags = model.predict(representatives.astype(np.float64)[:, None]) == -1
+
+    def predict(self, values):
+        values = np.asarray(values, dtype=np.float32).astype(np.float64)
+        return self.flags[np.searchsorted(self.thresholds, values, side="left")]
+
+
+# The fitted models of one scope and version, and the reference statistics
+# of the population they were fitted on
+class AnomalyModel:
+    def __init__(self, scope, parameters, outlier_models, joint, scaler, clustering, pca,
+                 outlier_threshold, reference):
+        self.format = ARTIFACT_FORMAT
+        self.scope = scope
+        self.version = None
+        self.created_at = time.time()
+        self.sklearn_version = sklearn.__version__
+        self.parameters = parameters
+        self.outlier_models = outlier_models
+        self.outlier_tables = {} if joint else {
+            parameter: OutlierTable(model) for parameter, model in outlier_models.items()}
+        self.joint = joint
+        self.scaler = scaler
+        self.clustering = clustering
+        self.pca = pca
+        self.outlier_threshold = outlier_threshold
+        self.reference = reference
+
+    # Parameter values of a table as floats, missing columns and values as 0
+    def values(self, df):
+        frame = pd.DataFrame({parameter: df[parameter].astype(float) if parameter in df else 0.0
+                              for parameter in self.parameters}, index=df.index)
+        return frame.fillna(0.0)
+
+    # The outlier table of score_outliers for the given contributors, flagged
+    # by the saved IsolationForests (Positive/Negative against the fit means)
+    def score_outliers(self, df):
+        values = self.values(df).to_numpy()
+        if self.joint:
+            flags = self.outlier_models["joint"].predict(values) == -1
+            flags = np.repeat(flags[:, None], len(self.parameters), axis=1)
+        else:
+            flags = np.column_stack([self.outlier_tables[parameter].predict(values[:, column])
+                                     for column, parameter in enumerate(self.parameters)])
+        return outlier_table(df, self.parameters, values, flags, self.reference["means"])
+
+    # The result of cluster_contributors for the given contributors, assigned
+    # to the saved centroids; outliers use the distance threshold of the fit
+    def cluster(self, df):
+        data = df.copy()
+        scaled = self.scaler.transform(self.values(df))
+        labels = self.clustering.model.predict(scaled)
+        data['cluster'] = labels
+        pca_result = self.pca.transform(scaled)
+        data['PCA1'] = pca_result[:, 0]
+        data['PCA2'] = pca_result[:, 1]
+        distances = np.linalg.norm(scaled - self.clustering.centers[labels], axis=1)
+        clustering = ClusteringResult(self.clustering.model, self.clustering.scores, labels=labels)
+        return ContributorClusters(data, clustering, self.scaler, self.pca, distances, self.outlier_threshold)
+
+    # One row per contributor: flagged parameters, cluster, centroid distance
+    # and outlier flag
+    def score(self, df):
+        outliers = self.score_outliers(df)
+        clusters = self.cluster(df)
+        flagged = np.bincount(outliers["Index"].to_numpy(dtype=int), minlength=len(df))
+        return pd.DataFrame({
+            "Contributor": df['Contributor'].to_numpy(),
+            "Outlier Parameters": flagged,
+            "Cluster": clusters.clustering.labels,
+            "Distance to Centroid": clusters.distances,
+            "Cluster Outlier": clusters.is_outlier,
+        })
+
+    # Compare a current contributor table with the population of the fit
+    def drift(self, df, now=None):
+        values = self.values(df).to_numpy()
+        reference = self.reference
+        features = []
+        for column, parameter in enumerate(self.parameters):
+            current = values[:, column]
+            psi = (population_stability(reference["bin_edges"][parameter], reference["bin_shares"][parameter],
+                                        current) if len(current) >= MIN_DRIFT_ROWS else np.nan)
+            std = reference["stds"][column] or 1.0
+            features.append({"Parameter": parameter, "PSI": psi,
+                             "Mean at fit": reference["means"][column],
+                             "Mean now": current.mean() if len(current) else np.nan,
+                             "Shift (std)": (current.mean() - reference["means"][column]) / std
+                             if len(current) else np.nan})
+        features = pd.DataFrame(features)
+
+        clusters = self.cluster(df)
+        outlier_rate = float(clusters.is_outlier.mean()) if len(df) else 0.0
+        reasons = []
+        worst = features["PSI"].max()
+        if worst > PSI_REFIT:
+            parameter = features.loc[features["PSI"].idxmax(), "Parameter"]
+            reasons.append(f"{parameter} shifted (PSI {worst:.2f} > {PSI_REFIT})")
+        if len(df) >= MIN_DRIFT_ROWS and outlier_rate > OUTLIER_RATE_FACTOR * reference["outlier_rate"]:
+            reasons.append(f"{outlier_rate:.0%} of the contributors are far from every centroid "
+                           f"({reference['outlier_rate']:.0%} at fit time)")
+        age = (now or time.time()) - self.created_at
+        if age > MAX_MODEL_AGE:
+            reasons.append(f"the model is {age / 86400:.0f} days old")
+        return DriftReport(features, outlier_rate, reference["outlier_rate"],
+                           float(clusters.distances.mean()) / reference["mean_distance"]
+                           if len(df) and reference["mean_distance"] else np.nan, reasons)
+
+
+class DriftReport:
+    def __init__(self, features, outlier_rate, reference_outlier_rate, distance_ratio, reasons):
+        self.features = features
+        self.outlier_rate = outlier_rate
+        self.reference_outlier_rate = reference_outlier_rate
+        self.distance_ratio = distance_ratio
+        self.reasons = reasons
+        self.refit_due = bool(reasons)
+
+# Function to compute the population stability index of values against the
+# bin shares of the reference population
+
+
+def population_stability(bin_edges, expected, values):
+    counts = np.bincount(np.searchsorted(bin_edges, values, side="right"), minlength=len(expected))
+    actual = counts / max(len(values), 1)
+    # Empty bins would make the logarithm infinite
+    expected = np.clip(expected, 1e-4, None)
+    actual = np.clip(actual, 1e-4, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+# Function to fit the models of a scope on a contributor table (not saved yet)
+
+
+def fit_anomaly_model(df, scope, contamination=0.05, joint=False, mode=None,
+                      outlier_percentile=OUTLIER_PERCENTILE, n_jobs=-1):
+    parameters = numeric_columns(df.drop(columns=["Contributor"], errors="ignore"))
+    if len(df) < 3 or not parameters:
+        raise ModelError("A model needs at least 3 contributors with numeric parameters.")
+
+    _, outlier_models = score_outliers(df, parameters, contamination=contamination, n_jobs=n_jobs, joint=joint)
+    if mode is None:
+        mode = "exact" if len(df) <= EXACT_MAX_ROWS else "scalable"
+    clusters = cluster_contributors(df[["Contributor"] + parameters], mode=mode,
+                                    time_budget=DEFAULT_TIME_BUDGET if mode == "scalable" else None,
+                                    outlier_percentile=outlier_percentile)
+
+    values = df[parameters].astype(float).fillna(0.0).to_numpy()
+    bin_edges = {}
+    bin_shares = {}
+    for column, parameter in enumerate(parameters):
+        edges = np.unique(np.quantile(values[:, column], np.linspace(0, 1, DRIFT_BINS + 1)[1:-1]))
+        bin_edges[parameter] = edges
+        bin_shares[parameter] = np.bincount(np.searchsorted(edges, values[:, column], side="right"),
+                                            minlength=len(edges) + 1) / len(values)
+    reference = {
+        "rows": len(df),
+        "means": values.mean(axis=0),
+        "stds": values.std(axis=0),
+        "bin_edges": bin_edges,
+        "bin_shares": bin_shares,
+        "outlier_rate": float(clusters.is_outlier.mean()),
+        "mean_distance": float(clusters.distances.mean()),
+    }
+    return AnomalyModel(scope, parameters, outlier_models, joint, clusters.scaler, clusters.clustering,
+                        clusters.pca, clusters.outlier_threshold, reference)
+
+# Function to get the folder of a scope's models ("owner/repo" -> owner__repo)
+
+
+def scope_folder(scope):
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", scope.strip().lower().replace("/", "__"))
+    if not name.strip("._"):
+        raise ModelError(f"Not a repository or organization: {scope!r}")
+    return os.path.dirname(data_path("models", name, "v"))
+
+# Function to list the saved versions of a scope, oldest first
+
+
+def list_versions(scope):
+    folder = scope_folder(scope)
+    versions = [int(match.group(1)) for match in map(re.compile(r"^v(\d+)\.joblib$").match, os.listdir(folder))
+                if match]
+    return sorted(versions)
+
+# Function to save a fitted model as the next version of its scope
+
+
+def save_model(model):
+    versions = list_versions(model.scope)
+    model.version = versions[-1] + 1 if versions else 1
+    path = os.path.join(scope_folder(model.scope), f"v{model.version}.joblib")
+    # Write under a temporary name so readers never see half a file
+    joblib.dump(model, path + ".tmp", compress=3)
+    os.replace(path + ".tmp", path)
+    return model.version
+
+# Function to load a saved version of a scope (the latest by default), or None
+# if the scope has no saved model
+
+
+def load_model(scope, version=None):
+    versions = list_versions(scope)
+    if not versions:
+        return None
+    version = versions[-1] if version is None else version
+    if version not in versions:
+        raise ModelError(f"{scope} has no model version {version}")
+    model = joblib.load(os.path.join(scope_folder(scope), f"v{version}.joblib"))
+    if getattr(model, "format", None) != ARTIFACT_FORMAT:
+        raise ModelError(f"Model version {version} of {scope} has an old layout, please refit it.")
+    return model
+
+# Function to read a contributor table from a Parquet or Excel file
+
+
+def read_table(path):
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_excel(path, sheet_name="Sheet1")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sentinel.anomaly_model",
+                                     description="Fit, apply and check saved contributor anomaly models.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    refit = commands.add_parser("refit", help="fit a new model version on a contributor table")
+    refit.add_argument("table", help="contributor table (.parquet or .xlsx)")
+    refit.add_argument("--contamination", type=float, default=0.05)
+    refit.add_argument("--joint", action="store_true", help="one IsolationForest over all parameters")
+    score = commands.add_parser("score", help="score contributors against the saved model")
+    score.add_argument("table", help="contributor table (.parquet or .xlsx)")
+    score.add_argument("--output", help="write the scores to this .parquet or .csv file")
+    drift = commands.add_parser("drift", help="compare a contributor table with the saved model "
+                                              "(exit code 1 when a refit is due)")
+    drift.add_argument("table", help="contributor table (.parquet or .xlsx)")
+    listing = commands.add_parser("list", help="list the saved versions")
+    for command in (refit, score, drift, listing):
+        command.add_argument("--scope", required=True, help="owner/repo or organization")
+    for command in (score, drift):
+        command.add_argument("--version", type=int, help="model version (default: the latest)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "list":
+            for version in list_versions(args.scope):
+                print(f"v{version}")
+            return 0
+        df = read_table(args.table)
+        if args.command == "refit":
+            model = fit_anomaly_model(df, args.scope, contamination=args.contamination, joint=args.joint)
+            print(f"Saved {args.scope} model version {save_model(model)} ({len(df)} contributors)")
+            return 0
+
+        model = load_model(args.scope, args.version)
+        if model is None:
+            raise ModelError(f"{args.scope} has no saved model, run refit first.")
+        if args.command == "score":
+            scores = model.score(df)
+            if args.output:
+                if args.output.lower().endswith(".parquet"):
+                    scores.to_parquet(args.output, index=False)
+                else:
+                    scores.to_csv(args.output, index=False)
+            else:
+                print(scores.to_string(index=False))
+            return 0
+
+        report = model.drift(df)
+        print(report.features.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+        print(f"Centroid distance outliers: {report.outlier_rate:.1%} "
+              f"(fit: {report.reference_outlier_rate:.1%}), mean distance x{report.distance_ratio:.2f}")
+        print("Refit due: " + "; ".join(report.reasons) if report.refit_due else "No refit needed.")
+        return 1 if report.refit_due else 0
+    except (OSError, ValueError, ModelError) as error:
+        print(error, file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sentinel.clones import CloneError, CloneManager
+from sentinel.endpoints import API_URL
+from sentinel.storage import data_path
+
+# Parallel, incremental Bandit scanning of a git checkout. Python files are
+# split into shards, each scanned by its own bandit process. Findings are cached
+# per file, keyed by the git blob SHA of the file plus the Bandit version and
+# arguments, so a re-scan after a few commits only analyses the changed files.
+# The merged report has the same JSON schema as `bandit -r <root> -f json`.
+
+DEFAULT_SHARD_SIZE = 40
+
+METRIC_KEYS = [
+    "CONFIDENCE.HIGH", "CONFIDENCE.LOW", "CONFIDENCE.MEDIUM", "CONFIDENCE.UNDEFINED",
+    "SEVERITY.HIGH", "SEVERITY.LOW", "SEVERITY.MEDIUM", "SEVERITY.UNDEFINED",
+    "loc", "nosec", "skipped_tests",
+]
+
+
+class BanditError(Exception):
+    pass
+
+# Function to read the installed Bandit version, e.g. "bandit 1.7.5"
+
+
+def bandit_version():
+    process = subprocess.run(["bandit", "--version"], capture_output=True, text=True)
+    if process.returncode != 0:
+        raise BanditError("bandit is not installed")
+    return process.stdout.splitlines()[0].strip()
+
+# Function to list the Python files of a checkout with their git blob SHAs
+
+
+def python_blobs(root):
+    process = subprocess.run(["git", "ls-files", "-s", "-z", "--", "*.py"],
+                             cwd=root, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise BanditError(process.stderr.strip() or "git ls-files failed")
+    blobs = {}
+    for entry in process.stdout.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        # Files outside a sparse checkout are listed but not on disk
+        if os.path.isfile(os.path.join(root, path)):
+            blobs[path] = info.split()[1]
+    return blobs
+
+# Function to scan one shard of files (paths relative to root) with bandit.
+# Returns {path: {"results": [...], "metrics": {...}, "errors": [...]}}.
+
+
+def scan_shard(root, paths, extra_args=()):
+    process = subprocess.run(["bandit", "-f", "json", "-q", *extra_args, "--", *paths],
+                             cwd=root, capture_output=True, text=True)
+    # bandit exits with 1 when it found issues
+    if process.returncode not in (0, 1):
+        raise BanditError(process.stderr.strip() or f"bandit exited with {process.returncode}")
+    report = json.loads(process.stdout)
+
+    findings = {path: {"results": [], "metrics": {}, "errors": []} for path in paths}
+    for name, metrics in report.get("metrics", {}).items():
+        if name != "_totals" and os.path.normpath(name) in findings:
+            findings[os.path.normpath(name)]["metrics"] = metrics
+    for result in report.get("results", []):
+        findings[os.path.normpath(result["filename"])]["results"].append(result)
+    for error in report.get("errors", []):
+        findings[os.path.normpath(error["filename"])]["errors"].append(error)
+    return findings
+
+# Per-file findings cache, keyed by (blob SHA, engine key)
+
+
+class BanditCache:
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or data_path("bandit_cache.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS findings ("
+            " blob TEXT, engine TEXT, findings TEXT, PRIMARY KEY (blob, engine))")
+        self._conn.commit()
+
+    def get_many(self, blobs, engine):
+        found = {}
+        with self._lock:
+            for blob in set(blobs):
+                row = self._conn.execute(
+                    "SELECT findings FROM findings WHERE blob = ? AND engine = ?",
+                    (blob, engine)).fetchone()
+                if row is not None:
+                    found[blob] = json.loads(row[0])
+        return found
+
+    def put_many(self, items, engine):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO findings VALUES (?, ?, ?)",
+                [(blob, engine, json.dumps(findings)) for blob, findings in items])
+            self._conn.commit()
+
+
+class BanditScanner:
+    def __init__(self, workers=None, shard_size=DEFAULT_SHARD_SIZE, extra_args=(), cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.extra_args = tuple(extra_args)
+        self.cache = cache if cache is not None else BanditCache()
+        self.engine = hashlib.sha256(
+            json.dumps([bandit_version(), self.extra_args]).encode()).hexdigest()
+        self.last_stats = {}
+
+    # Scan the checkout at root. label is the folder name used in the report's
+    # file names (defaults to root, like `bandit -r root`).
+    def scan(self, root, label=None):
+        label = root if label is None else label
+        blobs = python_blobs(root)
+        cached = self.cache.get_many(blobs.values(), self.engine)
+
+        # Files sharing a blob are scanned once
+        missing = {}
+        for path, blob in sorted(blobs.items()):
+            if blob not in cached:
+                missing.setdefault(blob, path)
+        paths = sorted(missing.values())
+        shards = [paths[start:start + self.shard_size]
+                  for start in range(0, len(paths), self.shard_size)]
+
+        scanned = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for findings in executor.map(lambda shard: scan_shard(root, shard, self.extra_args), shards):
+                scanned.update(findings)
+        fresh = [(blobs[path], findings) for path, findings in scanned.items()]
+        self.cache.put_many(fresh, self.engine)
+        cached.update(fresh)
+
+        self.last_stats = {"files": len(blobs), "cached": len(blobs) - len(paths),
+                           "scanned": len(paths), "shards": len(shards)}
+        return merge_findings({path: cached[blob] for path, blob in blobs.items()}, label)
+
+# Function to merge per-file findings into one Bandit JSON report
+
+
+def merge_findings(findings_by_path, label):
+    report = {"errors": [], "generated_at": datetime.datetime.now(datetime.timezone.utc)
+              .strftime("%Y-%m-%dT%H:%M:%SZ"), "metrics": {}, "results": []}
+    totals = dict.fromkeys(METRIC_KEYS, 0)
+
+    for path in sorted(findings_by_path):
+        findings = findings_by_path[path]
+        filename = os.path.join(label, path)
+        if findings["metrics"]:
+            report["metrics"][filename] = findings["metrics"]
+            for key, value in findings["metrics"].items():
+                totals[key] = totals.get(key, 0) + value
+        for result in findings["results"]:
+            report["results"].append(dict(result, filename=filename))
+        for error in findings["errors"]:
+            report["errors"].append(dict(error, filename=filename))
+
+    report["metrics"]["_totals"] = totals
+    report["results"].sort(key=lambda result: (result["filename"], result["line_number"],
+                                               result["test_id"]))
+    return report
+
+# Function to check out a GitHub repository into the session's working folder
+# and scan it. fetch_data(url) reads the repository information from the API;
+# on_progress(done, total, message) is told about each step. Returns the
+# report; scanner.last_stats has the cache statistics. Raises CloneError or
+# BanditError.
+
+
+def scan_github_repository(owner, repo_name, session_id, fetch_data, clone_manager=None,
+                           scanner=None, python_only=True, on_progress=None):
+    progress = on_progress or (lambda done, total, message: None)
+    progress(0, 3, "Fetching repository information")
+    repo_info = fetch_data(f"{API_URL}/repos/{owner}/{repo_name}")
+    if not repo_info:
+        raise CloneError("the repository information could not be fetched")
+
+    progress(1, 3, "Cloning the repository")
+    local_repo_folder = (clone_manager or CloneManager()).checkout(
+        repo_info['clone_url'], session_id, branch=repo_info.get('default_branch'),
+        sparse_patterns=["*.py"] if python_only else None)
+
+    progress(2, 3, "Running Bandit")
+    report = (scanner or BanditScanner()).scan(local_repo_folder)
+    progress(3, 3, "Bandit analysis completed")
+    return report
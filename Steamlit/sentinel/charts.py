@@ -0,0 +1,41 @@
+from io import BytesIO
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Rendering helpers for large contributor sets. Outliers are always drawn;
+# inliers beyond max_points are drawn as a density (hexbin) layer instead of
+# one marker each, and only the most extreme outliers get a name label.
+
+MAX_PLOTTED_INLIERS = 5000
+MAX_ANNOTATIONS = 30
+DENSITY_GRID_SIZE = 60
+
+# Function to render a matplotlib figure to PNG bytes and release it
+
+
+def figure_to_png(fig, dpi=100):
+    output = BytesIO()
+    fig.savefig(output, format="png", dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return output.getvalue()
+
+# Function to draw inlier points, as markers or as a density layer when there
+# are more than max_points of them
+
+
+def draw_inliers(ax, x, y, color, label, max_points=MAX_PLOTTED_INLIERS, **scatter_options):
+    if len(x) > max_points:
+        return ax.hexbin(x, y, gridsize=DENSITY_GRID_SIZE, mincnt=1, bins="log",
+                         cmap="Greys", label=f"{label} (density)")
+    return ax.scatter(x, y, color=color, label=label, **scatter_options)
+
+# Function to pick the positions of the points to label: the max_labels
+# largest scores
+
+
+def top_indices(scores, max_labels=MAX_ANNOTATIONS):
+    scores = np.asarray(scores)
+    if len(scores) <= max_labels:
+        return np.arange(len(scores))
+    return np.sort(np.argpartition(-scores, max_labels)[:max_labels])
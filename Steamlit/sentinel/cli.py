@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sentinel import contributors
+from sentinel.bandit_scan import BanditError, BanditScanner, scan_github_repository
+from sentinel.clones import CloneError, CloneManager
+from sentinel.clustering import MIN_CONTRIBUTORS, cluster_contributors
+from sentinel.exports import numeric_columns, to_parquet
+from sentinel.metrics import scan_metrics, to_json, to_prometheus, with_current_metrics
+from sentinel.outliers import score_outliers
+from sentinel.pagination import FetchError
+from sentinel.repo_health import repo_health
+from sentinel.scheduler import default_scheduler
+from sentinel.snapshots import DEFAULT_MAX_AGE, ContributorSnapshot
+from sentinel.transport import default_transport
+
+# Headless batch scans, e.g. nightly over a dependency list:
+#   python -m sentinel repos.txt --output results --outliers --clusters --bandit
+# repos.txt holds one GitHub URL (or owner/repo) per line. Repositories are
+# scanned concurrently and share one token pool and rate limit budget
+# (GITHUB_TOKENS). Every repository gets its own files in the output folder:
+#   owner__repo.jsonl          contributor rows, appended while the scan runs
+#   owner__repo.parquet        the finished contributor table
+#   owner__repo.outliers.jsonl IsolationForest outliers (--outliers)
+#   owner__repo.clusters.jsonl cluster label and outlier flag (--clusters)
+#   owner__repo.bandit.json    Bandit report (--bandit)
+# manifest.jsonl records every finished repository; running the same batch
+# again skips the ones already done, so an interrupted batch resumes.
+# metrics.json and metrics.prom hold the request metrics of the batch.
+
+MANIFEST_FILE = "manifest.jsonl"
+METRICS_JSON_FILE = "metrics.json"
+METRICS_PROMETHEUS_FILE = "metrics.prom"
+DEFAULT_REPO_CONCURRENCY = 4
+
+REPO_PATTERN = re.compile(r'^(?:https://github.com/)?([^/\s]+)/([^/\s]+?)(?:\.git)?/?$')
+
+# Function to read the repositories of a batch file as (owner, repo_name) pairs
+
+
+def read_repo_list(path):
+    repos = []
+    with open(path) as repo_list:
+        for number, line in enumerate(repo_list, start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            match = REPO_PATTERN.match(line)
+            if not match:
+                raise ValueError(f"{path}:{number}: not a GitHub repository: {line}")
+            repos.append((match.group(1), match.group(2)))
+    # Each repository once, in file order
+    return list(dict.fromkeys(repos))
+
+
+# Finished repositories of a batch, kept as JSON lines next to the results
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as manifest:
+                for line in manifest:
+                    if line.endswith("\n"):
+                        entry = json.loads(line)
+                        self.entries[entry["repo"]] = entry
+
+    def finished(self, repo):
+        entry = self.entries.get(repo)
+        return entry is not None and entry["status"] == "done"
+
+    def record(self, entry):
+        with self._lock:
+            self.entries[entry["repo"]] = entry
+            with open(self.path, "a") as manifest:
+                manifest.write(json.dumps(entry) + "\n")
+
+# Function to write a table as JSON lines
+
+
+def write_jsonl(df, path):
+    df.to_json(path, orient="records", lines=True)
+
+# Function to scan one repository and write its result files.
+# Returns the manifest entry; raises FetchError, CloneError or BanditError.
+
+
+def scan_repo(owner, repo_name, args, session_id, max_in_flight):
+    started = time.time()
+    base = os.path.join(args.output, f"{owner}__{repo_name}")
+    warnings = []
+
+    def warn(message):
+        warnings.append(message)
+        print(f"{owner}/{repo_name}: {message}", file=sys.stderr)
+
+    snapshot = None
+    if args.incremental:
+        snapshot = ContributorSnapshot(
+            owner, repo_name, variant=f"{args.backend}:{args.distinct_repos}", max_age=args.max_age)
+    try:
+        with open(base + ".jsonl", "w") as rows:
+            def write_row(contributor_info):
+                rows.write(json.dumps(contributor_info) + "\n")
+                rows.flush()
+
+            contributors_data = contributors.collect_contributors_data(
+                owner, repo_name, max_in_flight=max_in_flight, distinct_repos=args.distinct_repos,
+                max_items=args.max_contributors or None, backend=args.backend, snapshot=snapshot,
+                on_row=write_row, on_warning=warn)
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+    df = contributors_data.to_frame()
+    files = [base + ".jsonl", base + ".parquet"]
+    with open(base + ".parquet", "wb") as parquet:
+        parquet.write(to_parquet(df))
+
+    if args.outliers and len(df):
+        outliers, _ = score_outliers(df, numeric_columns(df), n_jobs=1)
+        write_jsonl(outliers, base + ".outliers.jsonl")
+        files.append(base + ".outliers.jsonl")
+
+    if args.clusters and len(df) >= MIN_CONTRIBUTORS:
+        result = cluster_contributors(df, mode=args.cluster_mode)
+        clusters = result.data[["Contributor", "cluster"]].assign(
+            distance=result.distances, outlier=result.is_outlier)
+        write_jsonl(clusters, base + ".clusters.jsonl")
+        files.append(base + ".clusters.jsonl")
+
+    if args.health:
+        try:
+            health = repo_health(owner, repo_name, contributors.fetch_page)
+        except FetchError:
+            warn("Warning: The pull requests could not be read.")
+        else:
+            with open(base + ".health.json", "w") as health_file:
+                json.dump(health, health_file, indent=2)
+            files.append(base + ".health.json")
+
+    if args.bandit:
+        scanner = BanditScanner()
+        report = scan_github_repository(owner, repo_name, session_id, contributors.fetch_data,
+                                        clone_manager=CloneManager(filter_blobs=True), scanner=scanner)
+        with open(base + ".bandit.json", "w") as bandit_file:
+            json.dump(report, bandit_file, indent=2)
+        files.append(base + ".bandit.json")
+
+    return {"repo": f"{owner}/{repo_name}", "status": "done", "rows": len(df),
+            "files": [os.path.basename(path) for path in files], "warnings": warnings,
+            "seconds": round(time.time() - started, 1), "finished_at": time.time()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sentinel", description="Scan many GitHub repositories without the web UI.")
+    parser.add_argument("repos", help="file with one GitHub repository URL (or owner/repo) per line")
+    parser.add_argument("--output", default="sentinel-results", help="folder for the result files")
+    parser.add_argument("--repo-concurrency", type=int, default=DEFAULT_REPO_CONCURRENCY,
+                        help="repositories scanned at the same time")
+    parser.add_argument("--max-in-flight", type=int, default=contributors.DEFAULT_MAX_IN_FLIGHT * 2,
+                        help="API requests in flight across all repositories")
+    parser.add_argument("--backend", choices=["rest", "graphql"], default="rest")
+    parser.add_argument("--max-contributors", type=int, default=0,
+                        help="scan only the first contributors of each repository (0 = all)")
+    parser.add_argument("--distinct-repos", action="store_true",
+                        help="add forks and stars of a repository once per contributor")
+    parser.add_argument("--no-incremental", dest="incremental", action="store_false",
+                        help="enrich every contributor again instead of reusing stored results")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE / 86400,
+                        help="days after which stored contributors are enriched again")
+    parser.add_argument("--no-cache", dest="use_response_cache", action="store_false",
+                        help="do not serve API responses from the on-disk cache")
+    parser.add_argument("--outliers", action="store_true", help="write IsolationForest outliers")
+    parser.add_argument("--clusters", action="store_true", help="write contributor clusters")
+    parser.add_argument("--cluster-mode", choices=["exact", "scalable"], default="scalable")
+    parser.add_argument("--health", action="store_true",
+                        help="write pull request health (merged ratio, time to merge, stale open PRs)")
+    parser.add_argument("--bandit", action="store_true", help="clone and scan the code with Bandit")
+    parser.add_argument("--restart", action="store_true",
+                        help="scan every repository again, ignoring the manifest")
+    args = parser.parse_args(argv)
+    args.max_age *= 86400
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        repos = read_repo_list(args.repos)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+
+    contributors.use_response_cache = args.use_response_cache
+    default_scheduler().configure(contributors.tokens)
+    os.makedirs(args.output, exist_ok=True)
+    manifest = Manifest(os.path.join(args.output, MANIFEST_FILE))
+
+    todo = [repo for repo in repos if args.restart or not manifest.finished("/".join(repo))]
+    if len(todo) < len(repos):
+        print(f"Skipping {len(repos) - len(todo)} repositories already done "
+              f"(use --restart to scan them again).", file=sys.stderr)
+    if not todo:
+        return 0
+
+    # The request budget is split between the repositories scanned at the same time
+    repo_concurrency = max(1, min(args.repo_concurrency, len(todo)))
+    max_in_flight = max(1, args.max_in_flight // repo_concurrency)
+    # All repositories share the connection pool of the transport
+    default_transport().ensure_pool_size(args.max_in_flight)
+    session_id = f"cli-{uuid.uuid4().hex}"
+    metrics = scan_metrics()
+    failed = 0
+
+    with metrics.recording(), ThreadPoolExecutor(max_workers=repo_concurrency) as executor:
+        scan = with_current_metrics(scan_repo)
+        futures = {executor.submit(scan, owner, repo_name, args, session_id, max_in_flight):
+                   f"{owner}/{repo_name}" for owner, repo_name in todo}
+        for future in as_completed(futures):
+            repo = futures[future]
+            try:
+                entry = future.result()
+            except FetchError:
+                entry = {"repo": repo, "status": "failed", "error": "Unable to fetch contributors data."}
+            except CloneError as error:
+                entry = {"repo": repo, "status": "failed", "error": f"Failed to clone the repository: {error}"}
+            except BanditError as error:
+                entry = {"repo": repo, "status": "failed", "error": f"Error during Bandit analysis: {error}"}
+            except Exception as error:
+                entry = {"repo": repo, "status": "failed", "error": f"{type(error).__name__}: {error}"}
+            manifest.record(entry)
+            if entry["status"] == "done":
+                print(f"{repo}: {entry['rows']} contributors in {entry['seconds']}s")
+            else:
+                failed += 1
+                print(f"{repo}: {entry['error']}", file=sys.stderr)
+
+    if args.bandit:
+        CloneManager().release(session_id)
+
+    # API cost of the whole batch, for tracking over time
+    batch_metrics = metrics.snapshot()
+    labels = {"batch": os.path.basename(args.repos)}
+    with open(os.path.join(args.output, METRICS_JSON_FILE), "w") as metrics_file:
+        metrics_file.write(to_json(batch_metrics, labels))
+    with open(os.path.join(args.output, METRICS_PROMETHEUS_FILE), "w") as metrics_file:
+        metrics_file.write(to_prometheus(batch_metrics, labels))
+    return 1 if failed else 0
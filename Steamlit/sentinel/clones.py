@@ -0,0 +1,193 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from sentinel.storage import data_path
+
+# Clone manager for Code_Analysis. Repositories are cloned shallow and single
+# branch into a bare mirror cache keyed by repository and HEAD commit, so an
+# unchanged commit is never downloaded twice. Every session works in its own
+# worktree of the mirror, and mirrors are evicted least recently used first
+# once the cache grows past its disk quota.
+
+DEFAULT_QUOTA_BYTES = 5 * 1024 * 1024 * 1024
+
+# Session worktrees untouched for this long are removed
+SESSION_MAX_AGE = 24 * 60 * 60
+
+# Mirrors used this recently are never evicted: another session may have just
+# got one from mirror() and not yet added its worktree
+MIRROR_GRACE_PERIOD = 10 * 60
+
+LAST_USED_FILE = "last_used"
+
+
+class CloneError(Exception):
+    pass
+
+# Helper function to run git and return its output
+
+
+def run_git(*args, cwd=None):
+    process = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise CloneError(process.stderr.strip() or f"git {args[0]} failed")
+    return process.stdout.strip()
+
+# Function to turn a clone URL into a folder name, e.g. "owner__repo"
+
+
+def repo_key(clone_url):
+    path = re.sub(r"\.git$", "", clone_url.rstrip("/"))
+    return "__".join(re.sub(r"[^A-Za-z0-9_.-]", "_", part) for part in path.split("/")[-2:])
+
+# Function to resolve the commit a branch (default: HEAD) points to
+
+
+def resolve_head(clone_url, branch=None):
+    ref = f"refs/heads/{branch}" if branch else "HEAD"
+    output = run_git("ls-remote", clone_url, ref)
+    if not output:
+        raise CloneError(f"{clone_url} has no {ref}")
+    return output.split()[0]
+
+# Function to measure the size of a folder on disk
+
+
+def folder_size(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(folder, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class CloneManager:
+    def __init__(self, root=None, quota_bytes=DEFAULT_QUOTA_BYTES, filter_blobs=False):
+        self.root = root or os.path.dirname(data_path("clones", "mirrors"))
+        self.mirrors = os.path.join(self.root, "mirrors")
+        self.sessions = os.path.join(self.root, "sessions")
+        self.quota_bytes = quota_bytes
+        self.filter_blobs = filter_blobs
+        os.makedirs(self.mirrors, exist_ok=True)
+        os.makedirs(self.sessions, exist_ok=True)
+
+    # Return the cached mirror of the commit, cloning it if needed.
+    # Returns (mirror path, commit sha).
+    def mirror(self, clone_url, branch=None):
+        sha = resolve_head(clone_url, branch)
+        path = os.path.join(self.mirrors, repo_key(clone_url), sha)
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                staging = tempfile.mkdtemp(prefix=".clone-", dir=os.path.dirname(path))
+            except OSError as error:
+                raise CloneError(f"Cannot create the mirror folder: {error}") from error
+            args = ["clone", "--bare", "--depth", "1", "--single-branch"]
+            if branch:
+                args += ["--branch", branch]
+            if self.filter_blobs:
+                args += ["--filter=blob:none"]
+            try:
+                run_git(*args, clone_url, staging)
+                # The branch may have moved since ls-remote; key by what was cloned
+                sha = run_git("rev-parse", "HEAD", cwd=staging)
+                path = os.path.join(self.mirrors, repo_key(clone_url), sha)
+                os.rename(staging, path)
+            except CloneError:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            except OSError as error:
+                shutil.rmtree(staging, ignore_errors=True)
+                # Only losing the race to another session that cloned the same
+                # commit first is expected; the error differs by platform
+                if not os.path.isdir(path):
+                    raise CloneError(f"Cannot store the mirror of {clone_url}: {error}") from error
+        self._touch(path)
+        return path, sha
+
+    # Check out the repository into a working folder of its own for the session.
+    # With sparse_patterns (e.g. ["*.py"]) only matching files are checked out,
+    # which together with filter_blobs downloads only the blobs that are needed.
+    def checkout(self, clone_url, session_id, branch=None, sparse_patterns=None):
+        mirror, sha = self.mirror(clone_url, branch)
+        workdir = os.path.join(self.sessions, session_id, repo_key(clone_url))
+        self.release(session_id, clone_url)
+        os.makedirs(os.path.dirname(workdir), exist_ok=True)
+
+        run_git("worktree", "add", "--detach", "--no-checkout", workdir, sha, cwd=mirror)
+        if sparse_patterns:
+            run_git("sparse-checkout", "set", "--no-cone", *sparse_patterns, cwd=workdir)
+        run_git("checkout", "--detach", sha, cwd=workdir)
+
+        self.cleanup()
+        return workdir
+
+    # Remove the working folders of a session (only the given repository's if set)
+    def release(self, session_id, clone_url=None):
+        session = os.path.join(self.sessions, session_id)
+        names = [repo_key(clone_url)] if clone_url else (
+            os.listdir(session) if os.path.isdir(session) else [])
+        for name in names:
+            workdir = os.path.join(session, name)
+            if os.path.exists(workdir):
+                shutil.rmtree(workdir, ignore_errors=True)
+        self._prune_worktrees()
+
+    # Drop stale sessions, then evict least recently used mirrors over the quota
+    # (except those in use or used within MIRROR_GRACE_PERIOD)
+    def cleanup(self, now=None):
+        now = now or time.time()
+        for session_id in os.listdir(self.sessions):
+            session = os.path.join(self.sessions, session_id)
+            if now - os.path.getmtime(session) > SESSION_MAX_AGE:
+                shutil.rmtree(session, ignore_errors=True)
+        self._prune_worktrees()
+
+        mirrors = []
+        for repo in os.listdir(self.mirrors):
+            for sha in os.listdir(os.path.join(self.mirrors, repo)):
+                if sha.startswith(".clone-"):
+                    continue
+                path = os.path.join(self.mirrors, repo, sha)
+                mirrors.append((self._last_used(path), path, folder_size(path)))
+        total = sum(size for _, _, size in mirrors)
+        for last_used, path, size in sorted(mirrors):
+            if total <= self.quota_bytes:
+                break
+            # Mirrors with a live session worktree stay, and so do mirrors
+            # handed out so recently that their worktree may still be coming
+            if self._has_worktrees(path) or now - last_used < MIRROR_GRACE_PERIOD:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def _has_worktrees(self, path):
+        worktrees = os.path.join(path, "worktrees")
+        return os.path.isdir(worktrees) and bool(os.listdir(worktrees))
+
+    def _prune_worktrees(self):
+        for repo in os.listdir(self.mirrors):
+            for sha in os.listdir(os.path.join(self.mirrors, repo)):
+                path = os.path.join(self.mirrors, repo, sha)
+                if not sha.startswith(".clone-") and self._has_worktrees(path):
+                    try:
+                        run_git("worktree", "prune", cwd=path)
+                    except CloneError:
+                        pass
+
+    def _touch(self, path):
+        with open(os.path.join(path, LAST_USED_FILE), "w") as marker:
+            marker.write(str(time.time()))
+
+    def _last_used(self, path):
+        try:
+            return os.path.getmtime(os.path.join(path, LAST_USED_FILE))
+        except OSError:
+            return 0.0
@@ -0,0 +1,116 @@
+import time
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from sentinel.exports import numeric_columns
+
+# K selection for the contributor clustering. The fit of the chosen k is kept
+# and returned instead of being fitted again.
+#   exact:    KMeans for k in 2..4, exact silhouette score (O(n^2))
+#   scalable: MiniBatchKMeans over a wider k range within a time budget,
+#             silhouette score computed on a random sample
+
+EXACT_K_VALUES = range(2, 5)
+SCALABLE_K_VALUES = range(2, 11)
+DEFAULT_SILHOUETTE_SAMPLE = 10000
+DEFAULT_TIME_BUDGET = 30.0
+
+# Silhouette scores need more contributors than clusters (K starts at 2)
+MIN_CONTRIBUTORS = 3
+
+# Contributors farther from their centroid than this percentile are outliers
+OUTLIER_PERCENTILE = 90
+
+
+# A fitted K-Means model with the silhouette score of every k tried. labels
+# are the clusters of the fitted points unless given (e.g. for new points).
+class ClusteringResult:
+    def __init__(self, model, scores, labels=None):
+        self.model = model
+        self.scores = scores
+        self.k = model.n_clusters
+        self.labels = model.labels_ if labels is None else labels
+        self.centers = model.cluster_centers_
+
+# Function to pick the number of clusters by silhouette score and return the
+# winning fit. With a time_budget (seconds), k values are tried in order until
+# the budget is used up; at least the first k is always tried.
+
+
+def select_clusters(scaled, mode="exact", k_values=None, sample_size=DEFAULT_SILHOUETTE_SAMPLE,
+                    time_budget=None, random_state=0):
+    scalable = mode == "scalable"
+    if k_values is None:
+        k_values = SCALABLE_K_VALUES if scalable else EXACT_K_VALUES
+    # Silhouette needs at least one more point than clusters
+    k_values = [k for k in k_values if k < len(scaled)]
+
+    started = time.monotonic()
+    scores = {}
+    best = None
+    for k in k_values:
+        if scalable:
+            model = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3)
+        else:
+            model = KMeans(n_clusters=k, random_state=random_state)
+        model.fit(scaled)
+
+        sample = sample_size if scalable and len(scaled) > sample_size else None
+        scores[k] = silhouette_score(scaled, model.labels_, sample_size=sample,
+                                     random_state=random_state)
+        if best is None or scores[k] > scores[best.n_clusters]:
+            best = model
+
+        if time_budget is not None and time.monotonic() - started >= time_budget:
+            break
+
+    return ClusteringResult(best, scores)
+
+
+class ContributorClusters:
+    def __init__(self, data, clustering, scaler, pca, distances, outlier_threshold):
+        self.data = data
+        self.clustering = clustering
+        self.scaler = scaler
+        self.pca = pca
+        self.distances = distances
+        self.outlier_threshold = outlier_threshold
+        self.is_outlier = distances > outlier_threshold
+
+# Function to cluster a contributor table on its numeric columns.
+# The returned data is a copy of the input with the 'cluster', 'PCA1' and
+# 'PCA2' columns added.
+
+
+def cluster_contributors(data, mode="exact", k_values=None, sample_size=DEFAULT_SILHOUETTE_SAMPLE,
+                         time_budget=None, outlier_percentile=OUTLIER_PERCENTILE):
+    # Work on a copy, the input frame may be shared through the analysis cache
+    data = data.copy()
+
+    # Select only the numerical columns and fill missing values with zeros
+    numerical_data = data[numeric_columns(data)].fillna(0)
+
+    # Standardize the numerical data
+    scaler = StandardScaler()
+    numerical_data_scaled = scaler.fit_transform(numerical_data)
+
+    # Choose the number of clusters (K) using the Silhouette Score and keep the winning fit
+    clustering = select_clusters(numerical_data_scaled, mode=mode, k_values=k_values,
+                                 sample_size=sample_size, time_budget=time_budget)
+    data['cluster'] = clustering.labels
+
+    # Apply PCA for dimensionality reduction
+    pca = PCA(n_components=2)
+    pca_result = pca.fit_transform(numerical_data_scaled)
+    data['PCA1'] = pca_result[:, 0]
+    data['PCA2'] = pca_result[:, 1]
+
+    # Euclidean distance from each point to its cluster's centroid
+    distances = np.linalg.norm(
+        numerical_data_scaled - clustering.centers[clustering.labels], axis=1)
+    outlier_threshold = np.percentile(distances, outlier_percentile)
+    return ContributorClusters(data, clustering, scaler, pca, distances, outlier_threshold)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from sentinel.exports import CONTRIBUTOR_DTYPES
+
+# Columnar in-memory store for contributor rows. Rows are appended one by one
+# as they are enriched (from a single thread), but kept per column:
+#   - the counts of CONTRIBUTOR_DTYPES in int32/int64 arrays with a missing mask
+#   - the text columns (logins, names, repositories) as UTF-8 bytes plus
+#     offsets, the Arrow string layout, so no Python string is kept per row
+#   - anything else in a plain list
+# to_frame() wraps the arrays in pandas' nullable integer and Arrow string
+# arrays without copying the counts (the text bytes are copied once), and
+# dictionary-encodes logins and repository names into categoricals. The
+# table, the exporters and the analysis code then share one copy of the data
+# instead of a dict per row.
+
+INITIAL_CAPACITY = 1024
+
+NUMPY_DTYPES = {"Int32": np.int32, "Int64": np.int64}
+TEXT_DTYPES = ("string", "category")
+
+
+class ContributorStore:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._capacity = max(1, capacity)
+        self._length = 0
+        # Column name -> "numeric", "text" or "object", in order of appearance
+        self._kinds = {}
+        self._values = {}
+        self._missing = {}
+        self._offsets = {}
+        self._text = {}
+        self._objects = {}
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self):
+        return list(self._kinds)
+
+    def _add_column(self, column):
+        dtype = CONTRIBUTOR_DTYPES.get(column)
+        if dtype in NUMPY_DTYPES:
+            self._kinds[column] = "numeric"
+            self._values[column] = np.zeros(self._capacity, dtype=NUMPY_DTYPES[dtype])
+        elif dtype in TEXT_DTYPES:
+            self._kinds[column] = "text"
+            # Value i is text[offsets[i]:offsets[i + 1]]; rows before the column appeared are empty
+            self._offsets[column] = np.zeros(self._capacity + 1, dtype=np.int64)
+            self._text[column] = bytearray()
+        else:
+            self._kinds[column] = "object"
+            self._objects[column] = [None] * self._length
+            return
+        self._missing[column] = np.ones(self._capacity, dtype=bool)
+
+    # Double the capacity of every array; unused slots stay missing
+    def _grow(self):
+        extra = self._capacity
+        for column, values in self._values.items():
+            self._values[column] = np.concatenate([values, np.zeros(extra, values.dtype)])
+        for column, offsets in self._offsets.items():
+            self._offsets[column] = np.concatenate([offsets, np.zeros(extra, offsets.dtype)])
+        for column, missing in self._missing.items():
+            self._missing[column] = np.concatenate([missing, np.ones(extra, dtype=bool)])
+        self._capacity += extra
+
+    def append(self, row):
+        if self._length == self._capacity:
+            self._grow()
+        index = self._length
+        for column, value in row.items():
+            if column not in self._kinds:
+                self._add_column(column)
+            if value is None:
+                continue
+            kind = self._kinds[column]
+            if kind == "numeric":
+                self._values[column][index] = value
+                self._missing[column][index] = False
+            elif kind == "text":
+                self._text[column] += value.encode()
+                self._missing[column][index] = False
+        for column, offsets in self._offsets.items():
+            offsets[index + 1] = len(self._text[column])
+        for column, values in self._objects.items():
+            values.append(row.get(column))
+        self._length += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    # The rows as a DataFrame with the dtypes of CONTRIBUTOR_DTYPES. The count
+    # columns are views of the store's arrays; rows appended later do not show
+    # up in frames made before.
+    def to_frame(self):
+        import pyarrow as pa
+
+        length = self._length
+        data = {}
+        for column, kind in self._kinds.items():
+            if kind == "numeric":
+                data[column] = pd.arrays.IntegerArray(
+                    self._values[column][:length], self._missing[column][:length])
+            elif kind == "text":
+                valid = np.packbits(~self._missing[column][:length], bitorder="little")
+                text = pa.LargeStringArray.from_buffers(
+                    length, pa.py_buffer(self._offsets[column][:length + 1]),
+                    pa.py_buffer(bytes(self._text[column])), pa.py_buffer(valid))
+                if CONTRIBUTOR_DTYPES[column] == "category":
+                    # Codes and categories straight from Arrow, without Python strings
+                    encoded = text.dictionary_encode()
+                    data[column] = pd.Categorical.from_codes(
+                        encoded.indices.fill_null(-1).to_numpy(),
+                        categories=pd.array(encoded.dictionary, dtype="str"), validate=False)
+                else:
+                    data[column] = pd.array(text, dtype=CONTRIBUTOR_DTYPES[column])
+            else:
+                data[column] = self._objects[column]
+        return pd.DataFrame(data, copy=False)
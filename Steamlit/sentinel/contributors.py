@@ -0,0 +1,397 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+import requests
+
+from sentinel.activity import load_user_activity
+from sentinel.contributor_store import ContributorStore
+from sentinel.endpoints import API_URL, endpoint_class
+from sentinel.graphql_backend import GRAPHQL_BATCH_SIZE, GRAPHQL_URL, enrich_contributors_graphql
+from sentinel.metrics import current_metrics, with_current_metrics
+from sentinel.pagination import FetchError, iter_items
+from sentinel.repo_health import repo_health
+from sentinel.repo_index import RepoIndex
+from sentinel.response_cache import credential_key, default_cache
+from sentinel.scheduler import (MAX_RATE_LIMIT_RETRIES, REQUEST_PRIORITIES, default_scheduler, rate_limit_resource,
+                                request_priority)
+from sentinel.transport import default_transport
+
+# Contributor data collection, shared by the Streamlit app, the scan workers
+# and the command line. Nothing in here depends on Streamlit; problems are
+# reported through callbacks and exceptions.
+
+logger = logging.getLogger(__name__)
+
+# Set your Personal Access Tokens here (or comma separated in GITHUB_TOKENS).
+# Requests are spread across all of them.
+tokens = [token for token in os.environ.get("GITHUB_TOKENS", "").split(",") if token]
+
+# Default number of GitHub API requests allowed in flight during a scan
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Serve and revalidate API responses from the on-disk cache
+use_response_cache = True
+
+# Helper function to fetch one page of data together with its response headers
+# Requests wait in the scheduler for a credential of the token pool; answers
+# rejected for rate limiting are queued again until the limit resets. Requests
+# that fail at the network level (after the transport's own retries) count as
+# no answer.
+
+
+def fetch_page(url):
+    metrics = current_metrics()
+    endpoint = endpoint_class(url)
+    scheduler = default_scheduler()
+    cache = default_cache() if use_response_cache else None
+    # Only answers to the same tokens are served from the cache
+    cache_key = credential_key(scheduler.tokens())
+    cached = cache.get(url, cache_key) if cache else None
+    if cached is not None and cache.is_fresh(url, cached):
+        metrics.record_cache(endpoint, "hit")
+        return cached.json(), cached.headers
+
+    priority = request_priority(url)
+    resource = rate_limit_resource(url)
+    for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+        waited = time.time()
+        credential = scheduler.acquire(priority, resource)
+        metrics.record_wait(endpoint, time.time() - waited)
+        headers = credential.headers()
+        if cached is not None:
+            headers.update(cached.validators())
+        started = time.time()
+        try:
+            response = default_transport().get(url, headers=headers)
+        except requests.RequestException as error:
+            logger.warning("Request to %s failed: %s", url, error)
+            response = None
+        elapsed = time.time() - started
+        if response is None:
+            metrics.record_request(endpoint, "error", elapsed, 0)
+        else:
+            metrics.record_request(endpoint, response.status_code, elapsed, len(response.content))
+        if not scheduler.release(credential, response, elapsed, resource):
+            break
+        metrics.record_retry(endpoint)
+
+    if response is None:
+        return None, {}
+    if response.status_code == 304 and cached is not None:
+        metrics.record_cache(endpoint, "revalidated")
+        cache.revalidate(url, response.headers, cache_key)
+        return cached.json(), cached.headers
+    if response.status_code == 200:
+        if cache:
+            metrics.record_cache(endpoint, "miss")
+            cache.store(url, response.content, response.headers, cache_key)
+        return response.json(), response.headers
+    return None, response.headers
+
+# Helper function to fetch data
+
+
+def fetch_data(url):
+    return fetch_page(url)[0]
+
+# Helper function to send a GraphQL query through the same token pool. The
+# queries count against GitHub's GraphQL limit, not the core REST budget.
+
+
+def post_graphql(query):
+    metrics = current_metrics()
+    scheduler = default_scheduler()
+    for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+        waited = time.time()
+        credential = scheduler.acquire(REQUEST_PRIORITIES["user"], "graphql")
+        metrics.record_wait("graphql", time.time() - waited)
+        started = time.time()
+        try:
+            response = default_transport().post(GRAPHQL_URL, json={"query": query}, headers=credential.headers())
+        except requests.RequestException as error:
+            logger.warning("GraphQL request failed: %s", error)
+            response = None
+        elapsed = time.time() - started
+        if response is None:
+            metrics.record_request("graphql", "error", elapsed, 0)
+        else:
+            metrics.record_request("graphql", response.status_code, elapsed, len(response.content))
+        if not scheduler.release(credential, response, elapsed, "graphql"):
+            break
+        metrics.record_retry("graphql")
+
+    if response is not None and response.status_code == 200:
+        return response.json()
+    return None
+
+# Function to calculate the percentage of pull requests that were ultimately merged
+# (among the closed ones), see sentinel.repo_health
+
+
+def calculate_merged_pr_percentage(owner, repo_name):
+    try:
+        health = repo_health(owner, repo_name, fetch_page, counts_only=True)
+    except FetchError:
+        return None
+    if health['merged_ratio'] is None:
+        return None
+    return health['merged_ratio'] * 100
+
+# Function to calculate the frequency of commits in all repos by the user
+
+
+def calculate_commit_frequency(username, activity=None):
+    if activity is None:
+        activity = load_user_activity(username, fetch_page)
+    if not activity or not activity.events:
+        return None
+
+    return activity['commit_count']
+
+# Function to calculate the sum of forks and stars of the repos the user has contributed to
+# Repository metadata comes from the scan-wide repo_index, so each repo is fetched
+# once per scan. By default every event counts its repo again (the original
+# metric); with distinct_repos=True each repo counts once per user.
+
+
+def calculate_forks_and_stars(username, repo_index=None, distinct_repos=False, activity=None):
+    if activity is None:
+        activity = load_user_activity(username, fetch_page)
+    if not activity or not activity.events:
+        return None
+
+    if repo_index is None:
+        repo_index = RepoIndex(fetch_data)
+
+    repos = activity['touched_repos']
+    if distinct_repos:
+        repos = list({repo['name']: repo for repo in repos}.values())
+
+    forks_count = 0
+    stars_count = 0
+
+    for repo in repos:
+        repo_data = repo_index.get(repo['name'], repo['url'])
+        if repo_data:
+            forks_count += repo_data['forks']
+            stars_count += repo_data['stargazers_count']
+
+    return forks_count, stars_count
+
+# Function to calculate the number of organizations the user is part of
+
+
+def calculate_organization_count(username):
+    orgs_url = f"{API_URL}/users/{username}/orgs"
+    orgs_data = fetch_data(orgs_url)
+    if orgs_data:
+        return len(orgs_data)
+    return 0
+
+# Function to enrich a single contributor with profile and activity data
+
+
+def enrich_contributor(contributor, repo_index=None, distinct_repos=False):
+    contributor_login = contributor['login']
+    contributor_url = f"{API_URL}/users/{contributor_login}"
+    metrics = current_metrics()
+    with metrics.stage("profile"):
+        contributor_data = fetch_data(contributor_url)
+    if not contributor_data:
+        return None
+
+    contributor_info = {
+        "Contributor": contributor_data['login'],
+        "Name": contributor_data['name'],
+        "Followers": contributor_data['followers'],
+        "Following": contributor_data['following'],
+        "Public Repositories": contributor_data['public_repos'],
+        "Contributions to Repository": contributor['contributions']
+    }
+
+    # The event feed is downloaded once and shared by all event-based metrics
+    with metrics.stage("activity"):
+        activity = load_user_activity(contributor_login, fetch_page)
+
+    commit_frequency = calculate_commit_frequency(
+        contributor_login, activity=activity)
+    if commit_frequency is not None:
+        contributor_info["Commit Frequency (All Repos)"] = commit_frequency
+
+    with metrics.stage("forks_and_stars"):
+        forks_and_stars = calculate_forks_and_stars(
+            contributor_login, repo_index=repo_index, distinct_repos=distinct_repos, activity=activity)
+    if forks_and_stars is not None:
+        forks_count, stars_count = forks_and_stars
+        contributor_info["Total Forks of Repos Contributed To"] = forks_count
+        contributor_info["Total Stars of Repos Contributed To"] = stars_count
+
+    with metrics.stage("organizations"):
+        organization_count = calculate_organization_count(contributor_login)
+    if organization_count is not None:
+        contributor_info["Number of Organizations"] = organization_count
+
+    return contributor_info
+
+# Function to enrich a batch of contributors with the selected backend
+# The REST backend works one contributor at a time; the GraphQL backend sends
+# one aliased query per batch.
+
+
+def enrich_batch(batch, backend, repo_index, distinct_repos):
+    if backend == "graphql":
+        with current_metrics().stage("graphql_batch"):
+            return enrich_contributors_graphql(batch, post_graphql)
+    return [enrich_contributor(contributor, repo_index, distinct_repos) for contributor in batch]
+
+# Helper function to forward the outcome of a future to a placeholder future
+
+
+def forward_result(placeholder, future):
+    if future.exception() is not None:
+        placeholder.set_exception(future.exception())
+    else:
+        placeholder.set_result(future.result())
+
+# Generator enriching contributors ({'login', 'contributions'} dicts) as they
+# arrive from an iterable, e.g. a paged contributor list. They are handed to a
+# bounded worker pool; each worker issues its API calls one after another, so
+# max_in_flight caps the number of requests in flight. All workers share one
+# RepoIndex, so a repo touched by many contributors is only looked up once.
+# With a ContributorSnapshot, contributors that did not change since the last
+# scan are served from it and only the others are enriched (and stored); with
+# complete=True the iterable is the whole list and the snapshot forgets
+# everybody else.
+# Yields (contributor, contributor_info) in input order; contributor_info is
+# None when the profile could not be fetched. on_progress(done, total) is
+# called before every yield, where total is the number of contributors read
+# so far. Exceptions of the iterable (e.g. FetchError) are passed on.
+
+
+def iter_enriched_contributors(contributors_iter, max_in_flight=DEFAULT_MAX_IN_FLIGHT, distinct_repos=False,
+                               on_progress=None, backend="rest", snapshot=None, complete=True):
+    repo_index = RepoIndex(fetch_data)
+    batch_size = GRAPHQL_BATCH_SIZE if backend == "graphql" else 1
+    seen_logins = []
+    done = 0
+
+    # One pooled connection per request in flight, so none is opened and
+    # closed again for a single request
+    default_transport().ensure_pool_size(max_in_flight)
+    # The pool's threads record into the metrics of the scan iterating
+    enrich = with_current_metrics(enrich_batch)
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        # Entries are (contributors, future of their rows, enriched in this scan)
+        pending = deque()
+        batch = []
+        batch_slot = None
+
+        def submit_batch():
+            nonlocal batch, batch_slot
+            future = executor.submit(
+                enrich, batch, backend, repo_index, distinct_repos)
+            future.add_done_callback(partial(forward_result, batch_slot))
+            batch, batch_slot = [], None
+
+        def finish_next():
+            nonlocal done
+            contributors, future, enriched = pending.popleft()
+            for contributor, contributor_info in zip(contributors, future.result()):
+                if enriched and snapshot is not None:
+                    if contributor_info:
+                        snapshot.save(contributor, contributor_info)
+                    else:
+                        contributor_info = snapshot.get(contributor['login'])
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, len(seen_logins))
+                yield contributor, contributor_info
+
+        for contributor in contributors_iter:
+            seen_logins.append(contributor['login'])
+            if snapshot is not None and not snapshot.needs_refresh(contributor):
+                stored = Future()
+                stored.set_result([snapshot.get(contributor['login'])])
+                pending.append(([contributor], stored, False))
+            else:
+                # The open batch keeps its place in the queue while it fills up
+                if batch_slot is None:
+                    batch_slot = Future()
+                    pending.append((batch, batch_slot, True))
+                batch.append(contributor)
+                if len(batch) >= batch_size:
+                    submit_batch()
+            # Hand out rows that are already finished while paging continues
+            while pending and pending[0][1].done():
+                yield from finish_next()
+
+        if batch:
+            submit_batch()
+        while pending:
+            yield from finish_next()
+
+    if snapshot is not None:
+        if complete:
+            snapshot.retain(seen_logins)
+        snapshot.commit()
+
+# Generator streaming the enriched contributors of a repository
+# Contributors are paged in with per_page=100 (at most max_items of them) and
+# enriched while paging continues (see iter_enriched_contributors). Yields
+# (contributor, contributor_info) in the order GitHub lists the contributors.
+# The total passed to on_progress(done, total) is the contributor count
+# estimated from the first page (its rel="last" link) until the list is read.
+# Raises FetchError if the contributor list cannot be read.
+
+
+def iter_contributors_data(owner, repo_name, max_in_flight=DEFAULT_MAX_IN_FLIGHT, distinct_repos=False,
+                           max_items=None, on_progress=None, backend="rest", snapshot=None):
+    contributors_url = f"{API_URL}/repos/{owner}/{repo_name}/contributors"
+    listed = {"total": 0}
+
+    def set_total(total):
+        listed["total"] = total
+
+    def report(done, found):
+        on_progress(done, max(found, listed["total"]))
+
+    return iter_enriched_contributors(
+        iter_items(fetch_page, contributors_url, max_items=max_items, on_total=set_total),
+        max_in_flight=max_in_flight, distinct_repos=distinct_repos,
+        on_progress=report if on_progress is not None else None, backend=backend, snapshot=snapshot,
+        complete=max_items is None)
+
+# Function to collect contributor data into a ContributorStore
+# Rows are also handed to on_row(contributor_info) as soon as they are ready.
+# Contributors that could not be enriched and an incomplete contributor list
+# are reported to on_warning(message) (logged by default). Raises FetchError
+# when the contributor list cannot be read at all.
+
+
+def collect_contributors_data(owner, repo_name, max_in_flight=DEFAULT_MAX_IN_FLIGHT, on_progress=None,
+                              distinct_repos=False, max_items=None, backend="rest", snapshot=None,
+                              on_row=None, on_warning=None):
+    warn = on_warning or logger.warning
+    contributors_data = ContributorStore()
+    read_any = False
+    try:
+        for contributor, contributor_info in iter_contributors_data(
+                owner, repo_name, max_in_flight=max_in_flight, distinct_repos=distinct_repos,
+                max_items=max_items, on_progress=on_progress, backend=backend, snapshot=snapshot):
+            read_any = True
+            if contributor_info:
+                contributors_data.append(contributor_info)
+                if on_row is not None:
+                    on_row(contributor_info)
+            else:
+                warn(f"Error: Unable to fetch data for contributor {contributor['login']}")
+    except FetchError:
+        if not read_any:
+            raise
+        warn("Warning: The contributor list could not be read completely.")
+
+    return contributors_data
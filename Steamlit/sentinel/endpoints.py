@@ -0,0 +1,34 @@
+import os
+import re
+from urllib.parse import urlsplit
+
+# Root of the GitHub REST API (GITHUB_API_URL points it at GitHub Enterprise or
+# at the local stand-in server of the benchmarks)
+API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+
+# Path prefix of the API root, e.g. "/api/v3" on GitHub Enterprise
+API_PATH = urlsplit(API_URL).path
+
+# GitHub REST endpoint classes, matched against the URL path in order
+ENDPOINT_PATTERNS = [
+    ("contributors", re.compile(r"^/repos/[^/]+/[^/]+/contributors/?$")),
+    ("org_repos", re.compile(r"^/orgs/[^/]+/repos/?$")),
+    ("pulls", re.compile(r"^/repos/[^/]+/[^/]+/pulls/?$")),
+    ("search", re.compile(r"^/search/issues/?$")),
+    ("repo", re.compile(r"^/repos/[^/]+/[^/]+/?$")),
+    ("events", re.compile(r"^/users/[^/]+/events/?$")),
+    ("orgs", re.compile(r"^/users/[^/]+/orgs/?$")),
+    ("user", re.compile(r"^/users/[^/]+/?$")),
+]
+
+# Function to classify a GitHub API URL, e.g. ".../users/octocat/orgs" -> "orgs"
+
+
+def endpoint_class(url):
+    path = urlsplit(url).path
+    if API_PATH and path.startswith(API_PATH + "/"):
+        path = path[len(API_PATH):]
+    for name, pattern in ENDPOINT_PATTERNS:
+        if pattern.match(path):
+            return name
+    return "other"
@@ -0,0 +1,83 @@
+from io import BytesIO
+
+import pandas as pd
+
+# Column schema of the contributor table. Counts use nullable integer dtypes
+# because an enrichment metric can be missing for a contributor; logins and
+# repository names are categorical (see sentinel.contributor_store).
+CONTRIBUTOR_DTYPES = {
+    "Repository": "category",
+    "Contributor": "category",
+    "Name": "string",
+    "Followers": "Int32",
+    "Following": "Int32",
+    "Public Repositories": "Int32",
+    "Contributions to Repository": "Int32",
+    "Commit Frequency (All Repos)": "Int32",
+    "Total Forks of Repos Contributed To": "Int64",
+    "Total Stars of Repos Contributed To": "Int64",
+    "Number of Organizations": "Int32",
+    # Organization scans (sentinel.org_scan)
+    "Contributions to Organization": "Int32",
+    "Repositories Contributed To": "Int32",
+}
+
+NON_NUMERIC_COLUMNS = ["Repository", "Contributor", "Name"]
+NUMERIC_COLUMNS = [column for column in CONTRIBUTOR_DTYPES if column not in NON_NUMERIC_COLUMNS]
+
+# Session key under which the Search page hands the last scan to the analysis pages
+SESSION_PARQUET_KEY = "contributors_parquet"
+# ... and the repository ("owner/repo") or organization it belongs to
+SESSION_SCOPE_KEY = "contributors_scope"
+
+# Function to cast a contributor table to the explicit column dtypes
+
+
+def apply_contributor_dtypes(df):
+    dtypes = {column: dtype for column, dtype in CONTRIBUTOR_DTYPES.items() if column in df}
+    return df.astype(dtypes)
+
+# Function to write a contributor table as Parquet (Arrow) bytes
+
+
+def to_parquet(df):
+    output = BytesIO()
+    apply_contributor_dtypes(df).to_parquet(output, index=False)
+    return output.getvalue()
+
+# Function to list the columns stored in an uploaded Excel or Parquet file
+
+
+def file_columns(uploaded_file, is_parquet):
+    if is_parquet:
+        import pyarrow.parquet as pq
+        columns = pq.ParquetFile(uploaded_file).schema_arrow.names
+    else:
+        columns = list(pd.read_excel(uploaded_file, sheet_name="Sheet1", nrows=0).columns)
+    uploaded_file.seek(0)
+    return columns
+
+# Function to load a contributor table from an uploaded .xlsx or .parquet file.
+# Only the requested columns that exist in the file are read; Parquet files are
+# read column by column without touching the rest.
+
+
+def load_contributors(uploaded_file, columns=None):
+    name = getattr(uploaded_file, "name", "")
+    is_parquet = name.lower().endswith(".parquet")
+    if columns is not None:
+        available = file_columns(uploaded_file, is_parquet)
+        columns = [column for column in columns if column in available]
+
+    if is_parquet:
+        return pd.read_parquet(uploaded_file, columns=columns)
+    return pd.read_excel(uploaded_file, sheet_name="Sheet1", usecols=columns)
+
+# Function to pick the numeric contributor columns present in a frame
+
+
+def numeric_columns(df):
+    known = [column for column in NUMERIC_COLUMNS if column in df]
+    extra = [column for column in df.columns
+             if column not in CONTRIBUTOR_DTYPES and pd.api.types.is_numeric_dtype(df[column])]
+    return known + extra
@@ -0,0 +1,78 @@
+import datetime
+import json
+import os
+
+from sentinel.endpoints import API_URL
+
+# Batched GraphQL enrichment. One aliased query fetches the profile, follower
+# and following counts, public repository and organization counts and the top
+# contributed repositories of a whole batch of logins, where the REST path needs
+# at least four requests per contributor.
+
+GRAPHQL_URL = os.environ.get("GITHUB_GRAPHQL_URL", f"{API_URL}/graphql")
+
+# Logins per query and contributed repositories summed per login
+GRAPHQL_BATCH_SIZE = 50
+TOP_REPOSITORIES = 20
+
+# Same window as the REST event feed (GitHub keeps 90 days of events)
+ACTIVITY_DAYS = 90
+
+USER_FIELDS = """
+    login
+    name
+    followers { totalCount }
+    following { totalCount }
+    repositories(privacy: PUBLIC, ownerAffiliations: OWNER) { totalCount }
+    organizations { totalCount }
+    contributionsCollection(from: "%(since)s") { totalCommitContributions }
+    repositoriesContributedTo(first: %(top)d, includeUserRepositories: true,
+                              orderBy: {field: STARGAZERS, direction: DESC}) {
+      nodes { nameWithOwner forkCount stargazerCount }
+    }
+"""
+
+# Function to build one aliased query for a batch of logins
+
+
+def build_users_query(logins, top_repositories=TOP_REPOSITORIES, now=None):
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    since = (now - datetime.timedelta(days=ACTIVITY_DAYS)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    fields = USER_FIELDS % {"since": since, "top": top_repositories}
+    aliases = [f"  u{index}: user(login: {json.dumps(login)}) {{{fields}  }}"
+               for index, login in enumerate(logins)]
+    return "query {\n" + "\n".join(aliases) + "\n}"
+
+# Function to turn a GraphQL user node into a row with the REST column schema
+
+
+def user_node_to_row(node, contributions):
+    repositories = node['repositoriesContributedTo']['nodes']
+    return {
+        "Contributor": node['login'],
+        "Name": node['name'],
+        "Followers": node['followers']['totalCount'],
+        "Following": node['following']['totalCount'],
+        "Public Repositories": node['repositories']['totalCount'],
+        "Contributions to Repository": contributions,
+        "Commit Frequency (All Repos)": node['contributionsCollection']['totalCommitContributions'],
+        "Total Forks of Repos Contributed To": sum(repo['forkCount'] for repo in repositories),
+        "Total Stars of Repos Contributed To": sum(repo['stargazerCount'] for repo in repositories),
+        "Number of Organizations": node['organizations']['totalCount'],
+    }
+
+# Function to enrich a batch of contributors (items of the /contributors list)
+# with a single query. post(query) returns the decoded response or None.
+# Returns one row per contributor, None where the user could not be resolved.
+
+
+def enrich_contributors_graphql(contributors, post):
+    logins = [contributor['login'] for contributor in contributors]
+    response = post(build_users_query(logins))
+    data = (response or {}).get('data') or {}
+
+    rows = []
+    for index, contributor in enumerate(contributors):
+        node = data.get(f"u{index}")
+        rows.append(user_node_to_row(node, contributor['contributions']) if node else None)
+    return rows
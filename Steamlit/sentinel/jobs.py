@@ -0,0 +1,324 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from sentinel.scheduler import MAX_CONCURRENT_REQUESTS, MAX_IN_FLIGHT
+from sentinel.storage import data_path
+
+# Local job queue for long scans. The pages only submit jobs and poll their
+# status; the work runs in a pool of worker processes started next to the
+# Streamlit server (python -m sentinel.jobs), so a browser refresh or a widget
+# change does not lose a scan and one user's scan does not block another's.
+# Jobs, their progress and warnings live in SQLite; result files are written
+# to a folder per job.
+
+# Every worker runs one job at a time, so a job may set process wide settings
+# (its tokens, the response cache) for its whole run. The workers share the
+# tokens but each has its own scheduler, so the pool is capped to keep their
+# requests in flight together under GitHub's limit per token.
+MAX_WORKERS = MAX_CONCURRENT_REQUESTS // MAX_IN_FLIGHT
+DEFAULT_WORKERS = MAX_WORKERS
+
+# Seconds between polls of an idle worker and of the pages
+POLL_SECONDS = 1.0
+
+# Seconds between progress writes of a running job
+PROGRESS_INTERVAL = 0.5
+
+FINISHED_STATES = ("done", "failed")
+
+# Seconds a job may wait in the queue; unclaimed jobs then fail and their
+# secrets are deleted, even if no worker pool ever runs
+QUEUED_MAX_AGE = 60 * 60
+
+# Registered job kinds: kind -> handler(context, **params) returning the result
+JOB_HANDLERS = {}
+
+# Decorator registering a handler for a job kind
+
+
+def job_handler(kind):
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+# Raised by handlers for failures that should be shown to the user as is
+class JobError(Exception):
+    pass
+
+# Function to get the folder holding the result files of a job
+
+
+def job_folder(job_id):
+    return os.path.dirname(data_path("jobs", job_id, "results"))
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or data_path("jobs.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # Queued jobs hold API tokens: keep the file private to the user and
+        # overwrite deleted secrets instead of leaving them in free pages
+        os.chmod(self.path, 0o600)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA secure_delete=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT, params TEXT, secrets TEXT,"
+            " status TEXT, done INTEGER, total INTEGER, message TEXT, warnings TEXT,"
+            " result TEXT, error TEXT, worker INTEGER,"
+            " created_at REAL, started_at REAL, finished_at REAL)")
+        self._conn.commit()
+
+    # Queue a job and return its id. secrets (e.g. API tokens) are handed to
+    # the worker that claims the job and are deleted when it is claimed, fails
+    # or expires in the queue.
+    def submit(self, kind, params, secrets=None):
+        self.expire_queued()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, secrets, status, done, total, message,"
+                " warnings, created_at) VALUES (?, ?, ?, ?, 'queued', 0, 0, '', '[]', ?)",
+                (job_id, kind, json.dumps(params), json.dumps(secrets or {}), time.time()))
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT id, kind, params, status, done, total, message, warnings, result,"
+                " error, created_at, started_at, finished_at FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+            # Jobs queued before this one
+            job["position"] = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?",
+                (job["created_at"],)).fetchone()[0]
+        for key in ("params", "warnings", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    # Take the oldest queued job for the worker, or None if the queue is empty
+    def claim(self, worker):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT id, kind, params, secrets FROM jobs WHERE status = 'queued'"
+                " ORDER BY created_at LIMIT 1").fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?,"
+                    " secrets = NULL WHERE id = ?", (worker, time.time(), row[0]))
+            self._conn.commit()
+        if row is None:
+            return None
+        job_id, kind, params, secrets = row
+        return {"id": job_id, "kind": kind, "params": json.loads(params),
+                "secrets": json.loads(secrets) if secrets else {}}
+
+    def progress(self, job_id, done, total, message=""):
+        self._execute("UPDATE jobs SET done = ?, total = ?, message = ? WHERE id = ?",
+                      (done, total, message, job_id))
+
+    def warn(self, job_id, message):
+        self._execute("UPDATE jobs SET warnings = json_insert(warnings, '$[#]', ?) WHERE id = ?",
+                      (message, job_id))
+
+    def finish(self, job_id, result):
+        self._execute("UPDATE jobs SET status = 'done', result = ?, finished_at = ? WHERE id = ?",
+                      (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, secrets = NULL"
+                      " WHERE id = ?", (error, time.time(), job_id))
+
+    # Fail the jobs that waited in the queue for longer than max_age
+    def expire_queued(self, max_age=QUEUED_MAX_AGE):
+        now = time.time()
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, secrets = NULL"
+                      " WHERE status = 'queued' AND created_at < ?",
+                      ("No worker picked up the scan in time. Please start it again.", now, now - max_age))
+
+    # Fail the running jobs of a worker process that died (or of all workers)
+    def fail_running(self, error, worker=None):
+        query = ("UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, secrets = NULL"
+                 " WHERE status = 'running'")
+        params = (error, time.time())
+        if worker is not None:
+            query += " AND worker = ?"
+            params += (worker,)
+        self._execute(query, params)
+
+    def _execute(self, query, params):
+        with self._lock:
+            self._conn.execute(query, params)
+            self._conn.commit()
+
+
+# Handle given to a job handler for reporting progress and writing results
+class JobContext:
+    def __init__(self, store, job):
+        self.store = store
+        self.job_id = job["id"]
+        self.secrets = job["secrets"]
+        self.folder = job_folder(self.job_id)
+        self._last_progress = 0.0
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    # Progress writes are throttled; the last one (done == total) always goes through
+    def progress(self, done, total, message=""):
+        now = time.monotonic()
+        if done < total and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.store.progress(self.job_id, done, total, message)
+
+    def warn(self, message):
+        self.store.warn(self.job_id, message)
+
+# Function to run one claimed job and record its outcome
+
+
+def run_job(store, job):
+    context = JobContext(store, job)
+    try:
+        result = JOB_HANDLERS[job["kind"]](context, **job["params"])
+    except JobError as error:
+        store.fail(job["id"], str(error))
+    except Exception as error:
+        traceback.print_exc()
+        store.fail(job["id"], f"{type(error).__name__}: {error}")
+    else:
+        store.finish(job["id"], result)
+
+# Worker process loop: claim a job, run it, repeat
+
+
+def work(store_path=None, poll=POLL_SECONDS):
+    # Registers the job kinds
+    import sentinel.scan_jobs  # noqa: F401
+    store = JobStore(store_path)
+    while True:
+        job = store.claim(os.getpid())
+        if job is None:
+            time.sleep(poll)
+            continue
+        run_job(store, job)
+
+# Helper function to take an exclusive, non-blocking lock on an open file
+
+
+def try_lock(handle):
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+# Function to run the worker pool. Only one pool runs per data folder; a dead
+# worker fails its job and is replaced.
+
+
+def run_workers(count=DEFAULT_WORKERS, store_path=None, lock_fd=None):
+    count = min(count, MAX_WORKERS)
+    if lock_fd is not None:
+        # Already locked by ensure_workers, which handed the lock over
+        lock = os.fdopen(lock_fd, "a")
+    else:
+        lock = open(data_path("jobs", "workers.lock"), "a")
+        if not try_lock(lock):
+            print("A worker pool is already running.", file=sys.stderr)
+            return
+    store = JobStore(store_path)
+    # Jobs left running by a previous pool were interrupted
+    store.fail_running("The scan was interrupted. Please start it again.")
+
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    while True:
+        for worker in [worker for worker in workers if not worker.is_alive()]:
+            workers.remove(worker)
+            store.fail_running(f"The worker process exited with code {worker.exitcode}.",
+                               worker=worker.pid)
+        store.expire_queued()
+        while len(workers) < count:
+            worker = context.Process(target=work, args=(store_path,), daemon=True)
+            worker.start()
+            workers.append(worker)
+        time.sleep(POLL_SECONDS)
+
+# Function to start the worker pool in the background unless one is running.
+# The lock taken here is inherited by the pool process, so it is never free
+# between the check and the start of the pool and two pages cannot both start
+# one. (Windows cannot hand over the lock; the pool takes it again there.)
+
+
+def ensure_workers(count=DEFAULT_WORKERS):
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-m", "sentinel.jobs", "--workers", str(count)]
+    with open(data_path("jobs", "workers.lock"), "a") as lock, \
+            open(data_path("jobs", "workers.log"), "a") as log:
+        if not try_lock(lock):
+            return False
+        options = {}
+        if os.name == "nt":
+            lock.close()
+        else:
+            command += ["--lock-fd", str(lock.fileno())]
+            options["pass_fds"] = (lock.fileno(),)
+        subprocess.Popen(command, cwd=package_root, stdout=log, stderr=log, stdin=subprocess.DEVNULL,
+                         start_new_session=True, **options)
+    return True
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+# Function to get the process wide job store (survives Streamlit reruns)
+
+
+def default_job_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = JobStore()
+        return _default_store
+
+
+# Entry point of python -m sentinel.jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Repo Sentinel scan workers.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"number of worker processes (at most {MAX_WORKERS})")
+    parser.add_argument("--lock-fd", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    run_workers(args.workers, lock_fd=args.lock_fd)
+
+
+if __name__ == "__main__":
+    # Go through the imported module so workers and handlers share one registry
+    from sentinel import jobs
+    jobs.main()
@@ -0,0 +1,252 @@
+import contextlib
+import contextvars
+import copy
+import json
+import threading
+import time
+
+# Request-level instrumentation of the fetch path. Per endpoint class (see
+# sentinel.endpoints) it counts requests, status codes, bytes and a latency
+# histogram, cache outcomes, rate limit retries and the time spent waiting in
+# the scheduler; per pipeline stage it sums the time spent (over all worker
+# threads). Every scan records into metrics of its own (see recording and
+# current_metrics), which pass everything on to the process wide metrics, so
+# scans running side by side in one process do not count each other's
+# requests.
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# hit: served from the cache without a request, revalidated: 304 answer,
+# miss: downloaded again
+CACHE_OUTCOMES = ("hit", "revalidated", "miss")
+
+
+class FetchMetrics:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._data = {"requests": {}, "cache": {}, "retries": {}, "waits": {}, "stages": {}}
+
+    def record_request(self, endpoint, status, elapsed, size):
+        with self._lock:
+            requests = self._data["requests"].setdefault(endpoint, {
+                "count": 0, "bytes": 0, "seconds": 0.0, "statuses": {},
+                "buckets": [0] * (len(LATENCY_BUCKETS) + 1)})
+            requests["count"] += 1
+            requests["bytes"] += size
+            requests["seconds"] += elapsed
+            status = str(status)
+            requests["statuses"][status] = requests["statuses"].get(status, 0) + 1
+            bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS) if elapsed <= bound),
+                          len(LATENCY_BUCKETS))
+            requests["buckets"][bucket] += 1
+        if self.parent is not None:
+            self.parent.record_request(endpoint, status, elapsed, size)
+
+    def record_cache(self, endpoint, outcome):
+        with self._lock:
+            cache = self._data["cache"].setdefault(endpoint, dict.fromkeys(CACHE_OUTCOMES, 0))
+            cache[outcome] += 1
+        if self.parent is not None:
+            self.parent.record_cache(endpoint, outcome)
+
+    def record_retry(self, endpoint):
+        with self._lock:
+            self._data["retries"][endpoint] = self._data["retries"].get(endpoint, 0) + 1
+        if self.parent is not None:
+            self.parent.record_retry(endpoint)
+
+    def record_wait(self, endpoint, seconds):
+        with self._lock:
+            self._data["waits"][endpoint] = self._data["waits"].get(endpoint, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.record_wait(endpoint, seconds)
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            stage = self._data["stages"].setdefault(name, {"count": 0, "seconds": 0.0})
+            stage["count"] += 1
+            stage["seconds"] += seconds
+        if self.parent is not None:
+            self.parent.record_stage(name, seconds)
+
+    # Time the body of a with block as one run of the stage
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - started)
+
+    # Make these the current metrics (see current_metrics) in the with block
+    @contextlib.contextmanager
+    def recording(self):
+        token = _current_metrics.set(self)
+        try:
+            yield self
+        finally:
+            _current_metrics.reset(token)
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+# Function to estimate a latency quantile (seconds) from histogram buckets
+
+
+def bucket_quantile(buckets, quantile):
+    total = sum(buckets)
+    if not total:
+        return None
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if seen >= quantile * total:
+            return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float("inf")
+
+# Function to derive the per endpoint table, stage table and totals of a snapshot
+
+
+def summarize(snapshot):
+    endpoints = sorted(set(snapshot["requests"]) | set(snapshot["cache"]))
+    rows = []
+    for endpoint in endpoints:
+        requests = snapshot["requests"].get(endpoint, {})
+        cache = snapshot["cache"].get(endpoint, {})
+        count = requests.get("count", 0)
+        lookups = sum(cache.values())
+        rows.append({
+            "endpoint": endpoint,
+            "requests": count,
+            "statuses": requests.get("statuses", {}),
+            "megabytes": requests.get("bytes", 0) / 1e6,
+            "mean_ms": 1000 * requests["seconds"] / count if count else None,
+            "p95_ms": 1000 * bucket_quantile(requests["buckets"], 0.95) if count else None,
+            "retries": snapshot["retries"].get(endpoint, 0),
+            "wait_seconds": snapshot["waits"].get(endpoint, 0.0),
+            "cache_hit_ratio": (cache.get("hit", 0) + cache.get("revalidated", 0)) / lookups
+            if lookups else None,
+        })
+    stages = [{"stage": name, "runs": stage["count"], "seconds": stage["seconds"]}
+              for name, stage in sorted(snapshot["stages"].items())]
+
+    lookups = sum(sum(cache.values()) for cache in snapshot["cache"].values())
+    served = sum(cache.get("hit", 0) + cache.get("revalidated", 0) for cache in snapshot["cache"].values())
+    totals = {
+        "requests": sum(row["requests"] for row in rows),
+        "megabytes": sum(row["megabytes"] for row in rows),
+        "network_seconds": sum(requests["seconds"] for requests in snapshot["requests"].values()),
+        "retries": sum(snapshot["retries"].values()),
+        "wait_seconds": sum(snapshot["waits"].values()),
+        "cache_hit_ratio": served / lookups if lookups else None,
+    }
+    return {"totals": totals, "endpoints": rows, "stages": stages}
+
+# Function to export a snapshot as JSON, with extra labels such as the repository
+
+
+def to_json(snapshot, labels=None):
+    return json.dumps({"labels": labels or {}, "generated_at": time.time(),
+                       "summary": summarize(snapshot), "raw": snapshot}, indent=2)
+
+# Function to export a snapshot in the Prometheus text format (for the node
+# exporter's textfile collector)
+
+
+def to_prometheus(snapshot, labels=None):
+    labels = labels or {}
+    lines = []
+
+    def label_text(extra):
+        merged = dict(labels, **extra)
+        if not merged:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                   for value in merged.values())
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(merged, escaped)) + "}"
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, extra, value in samples:
+            lines.append(f"{name}{suffix}{label_text(extra)} {value}")
+
+    requests = snapshot["requests"]
+    family("sentinel_http_requests_total", "counter", "GitHub API requests by endpoint and status.",
+           [("", {"endpoint": endpoint, "status": status}, count)
+            for endpoint, entry in sorted(requests.items())
+            for status, count in sorted(entry["statuses"].items())])
+    family("sentinel_http_response_bytes_total", "counter", "Response bytes received.",
+           [("", {"endpoint": endpoint}, entry["bytes"]) for endpoint, entry in sorted(requests.items())])
+
+    histogram = []
+    for endpoint, entry in sorted(requests.items()):
+        cumulative = 0
+        for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], entry["buckets"]):
+            cumulative += count
+            histogram.append(("_bucket", {"endpoint": endpoint, "le": bound}, cumulative))
+        histogram.append(("_sum", {"endpoint": endpoint}, entry["seconds"]))
+        histogram.append(("_count", {"endpoint": endpoint}, entry["count"]))
+    family("sentinel_http_request_duration_seconds", "histogram", "GitHub API request latency.", histogram)
+
+    family("sentinel_cache_lookups_total", "counter", "Response cache lookups by outcome.",
+           [("", {"endpoint": endpoint, "outcome": outcome}, count)
+            for endpoint, cache in sorted(snapshot["cache"].items())
+            for outcome, count in cache.items()])
+    family("sentinel_rate_limit_retries_total", "counter", "Requests sent again after a rate limit answer.",
+           [("", {"endpoint": endpoint}, count) for endpoint, count in sorted(snapshot["retries"].items())])
+    family("sentinel_scheduler_wait_seconds_total", "counter", "Time requests waited for a token.",
+           [("", {"endpoint": endpoint}, seconds) for endpoint, seconds in sorted(snapshot["waits"].items())])
+    family("sentinel_stage_seconds_total", "counter", "Time spent per pipeline stage, over all threads.",
+           [("", {"stage": name}, stage["seconds"]) for name, stage in sorted(snapshot["stages"].items())])
+    family("sentinel_stage_runs_total", "counter", "Runs per pipeline stage.",
+           [("", {"stage": name}, stage["count"]) for name, stage in sorted(snapshot["stages"].items())])
+    return "\n".join(lines) + "\n"
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+# Metrics of the scan running in this thread, None outside of scans
+_current_metrics = contextvars.ContextVar("current_metrics", default=None)
+
+# Function to get the process wide metrics (shared by all scans of the process)
+
+
+def default_metrics():
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = FetchMetrics()
+        return _default_metrics
+
+# Function to get the metrics to record into: the running scan's, otherwise
+# the process wide ones
+
+
+def current_metrics():
+    return _current_metrics.get() or default_metrics()
+
+# Function to get new metrics for one scan, passed on to the process wide ones
+
+
+def scan_metrics():
+    return FetchMetrics(parent=default_metrics())
+
+# Function to wrap fn so that it records into the current metrics of the
+# caller, for running it on the threads of a pool (which do not inherit them)
+
+
+def with_current_metrics(fn):
+    metrics = current_metrics()
+
+    def run(*args, **kwargs):
+        with metrics.recording():
+            return fn(*args, **kwargs)
+    return run
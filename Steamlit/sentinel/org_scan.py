@@ -0,0 +1,163 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sentinel.contributor_store import ContributorStore
+from sentinel.contributors import DEFAULT_MAX_IN_FLIGHT, fetch_page, iter_enriched_contributors
+from sentinel.endpoints import API_URL
+from sentinel.metrics import with_current_metrics
+from sentinel.pagination import FetchError, iter_items
+
+# Organization-wide contributor scan. The organization's repositories are
+# listed, their contributor lists are read into one shared index, and every
+# login is enriched exactly once no matter how many repositories it appears
+# in. The API cost is one page per 100 repositories, one page per 100
+# contributors of every repository, and the enrichment of the unique
+# contributors only.
+
+logger = logging.getLogger(__name__)
+
+# Snapshot key (repository name) under which an organization's enriched
+# contributors are stored, see sentinel.snapshots
+ORG_SNAPSHOT_REPO = "*"
+
+# Columns of the organization table that replace the per-repository count
+ORG_CONTRIBUTIONS_COLUMN = "Contributions to Organization"
+ORG_REPOSITORIES_COLUMN = "Repositories Contributed To"
+
+# Function to list the repositories of an organization as full names ("org/repo").
+# Forks and archived repositories are skipped unless asked for.
+
+
+def list_org_repositories(org, max_repos=None, include_forks=False, include_archived=False):
+    repos = []
+    for repo in iter_items(fetch_page, f"{API_URL}/orgs/{org}/repos"):
+        if repo.get("fork") and not include_forks:
+            continue
+        if repo.get("archived") and not include_archived:
+            continue
+        repos.append(repo["full_name"])
+        if max_repos is not None and len(repos) >= max_repos:
+            break
+    return repos
+
+
+# Which contributors appear in which repositories, with their per-repository
+# contribution counts. Filled concurrently while the contributor lists load.
+class OrgContributorIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.links = {}
+        self.totals = {}
+
+    def add(self, repo, contributors):
+        with self._lock:
+            counts = self.links.setdefault(repo, {})
+            for contributor in contributors:
+                login = contributor['login']
+                counts[login] = counts.get(login, 0) + contributor['contributions']
+                self.totals[login] = self.totals.get(login, 0) + contributor['contributions']
+
+    # Unique contributors, most contributions first, in the form the
+    # enrichment expects (contributions summed over the organization)
+    def contributors(self):
+        return [{"login": login, "contributions": total}
+                for login, total in sorted(self.totals.items(), key=lambda item: (-item[1], item[0]))]
+
+    def repository_count(self, login):
+        return sum(1 for counts in self.links.values() if login in counts)
+
+    def link_count(self):
+        return sum(len(counts) for counts in self.links.values())
+
+    # Turn an enriched row into its organization table form
+    def organization_row(self, login, row):
+        row = {column: value for column, value in row.items() if column != "Contributions to Repository"}
+        row[ORG_CONTRIBUTIONS_COLUMN] = self.totals.get(login, 0)
+        row[ORG_REPOSITORIES_COLUMN] = self.repository_count(login)
+        return row
+
+
+# Result of an organization scan: the repositories that were read, the
+# contributor index and the enriched row of every unique login. The tables
+# are built as ContributorStores.
+class OrgScan:
+    def __init__(self, org, repositories, index, rows):
+        self.org = org
+        self.repositories = repositories
+        self.index = index
+        self.rows = rows
+
+    # One row per unique contributor, with organization-wide counts
+    def organization_table(self):
+        return ContributorStore().extend(
+            self.index.organization_row(contributor['login'], self.rows[contributor['login']])
+            for contributor in self.index.contributors() if contributor['login'] in self.rows)
+
+    # One row per (repository, contributor) with the per-repository count;
+    # the table of a single repository is the rows with its "Repository"
+    def repository_table(self, repo=None):
+        table = ContributorStore()
+        for name in [repo] if repo is not None else self.repositories:
+            for login, contributions in self.index.links.get(name, {}).items():
+                row = self.rows.get(login)
+                if row is not None:
+                    table.append({"Repository": name, **row, "Contributions to Repository": contributions})
+        return table
+
+# Function to scan every repository of an organization with one shared
+# contributor index. Contributor lists that cannot be read are reported to
+# on_warning(message) and skipped; FetchError is raised when the repository
+# list cannot be read or no contributor list could. on_progress(done, total,
+# message) follows both phases; on_row(row) gets the organization table row of
+# every contributor as soon as it is enriched.
+
+
+def scan_organization(org, max_in_flight=DEFAULT_MAX_IN_FLIGHT, distinct_repos=False, max_repos=None,
+                      include_forks=False, include_archived=False, backend="rest", snapshot=None,
+                      on_progress=None, on_row=None, on_warning=None):
+    warn = on_warning or logger.warning
+    repositories = list_org_repositories(org, max_repos=max_repos, include_forks=include_forks,
+                                         include_archived=include_archived)
+    index = OrgContributorIndex()
+    listed = []
+
+    def list_contributors(repo):
+        try:
+            index.add(repo, list(iter_items(fetch_page, f"{API_URL}/repos/{repo}/contributors")))
+            return True
+        except FetchError:
+            return False
+
+    # The contributor lists are small (a page per 100 contributors) and load side by side
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        for done, (repo, ok) in enumerate(zip(repositories, executor.map(with_current_metrics(list_contributors), repositories)), 1):
+            if ok:
+                listed.append(repo)
+            else:
+                # Empty repositories have no contributor list either
+                warn(f"Warning: The contributors of {repo} could not be read.")
+            if on_progress is not None:
+                on_progress(done, len(repositories),
+                            f"Read the contributors of {done} of {len(repositories)} repositories")
+    if repositories and not listed:
+        raise FetchError(f"{API_URL}/orgs/{org}/repos")
+
+    unique = index.contributors()
+
+    def report(done, total):
+        if on_progress is not None:
+            on_progress(done, len(unique), f"Enriched {done} of {len(unique)} unique contributors "
+                                           f"({index.link_count()} repository memberships)")
+
+    rows = {}
+    for contributor, contributor_info in iter_enriched_contributors(
+            iter(unique), max_in_flight=max_in_flight, distinct_repos=distinct_repos, on_progress=report,
+            backend=backend, snapshot=snapshot, complete=max_repos is None and listed == repositories):
+        if contributor_info:
+            rows[contributor['login']] = contributor_info
+            if on_row is not None:
+                on_row(index.organization_row(contributor['login'], contributor_info))
+        else:
+            warn(f"Error: Unable to fetch data for contributor {contributor['login']}")
+    return OrgScan(org, listed, index, rows)
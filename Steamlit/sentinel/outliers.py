@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import IsolationForest
+
+# Outlier engine for the contributor parameters. Every parameter is scored in
+# one call: either one IsolationForest per column, fitted in parallel, or one
+# joint model over all columns. Outlier types are assigned with array
+# operations against the column means instead of a lookup per outlier.
+
+OUTLIER_COLUMNS = ["Parameter", "Outlier", "Index", "Value", "Type"]
+
+# Function to fit one IsolationForest and flag the outliers of its input
+
+
+def fit_isolation_forest(values, contamination, random_state):
+    model = IsolationForest(contamination=contamination, random_state=random_state)
+    flags = model.fit_predict(values) == -1
+    return model, flags
+
+# Function to score all parameters of a contributor table.
+# Returns (outliers, models): a tidy frame with one row per (parameter,
+# outlier) in column and row order, and the fitted models keyed by parameter
+# (or by "joint" for the joint model).
+
+
+def score_outliers(df, parameters, contamination=0.05, n_jobs=-1, joint=False, random_state=0):
+    parameters = list(parameters)
+    raw = df[parameters].astype(float).to_numpy()
+    values = np.nan_to_num(raw, nan=0.0)
+
+    if joint:
+        model, flags = fit_isolation_forest(values, contamination, random_state)
+        models = {"joint": model}
+        flags = np.repeat(flags[:, None], len(parameters), axis=1)
+    else:
+        fitted = Parallel(n_jobs=n_jobs)(
+            delayed(fit_isolation_forest)(values[:, [column]], contamination, random_state)
+            for column in range(len(parameters)))
+        models = {parameter: model for parameter, (model, _) in zip(parameters, fitted)}
+        flags = np.column_stack([column_flags for _, column_flags in fitted]) if fitted \
+            else np.zeros((len(df), 0), dtype=bool)
+
+    means = np.nanmean(raw, axis=0) if len(raw) else np.zeros(len(parameters))
+    return outlier_table(df, parameters, values, flags, means), models
+
+# Function to build the tidy outlier frame from a (rows x parameters) flag
+# matrix. Values below the given column means are negative outliers, the
+# rest positive.
+
+
+def outlier_table(df, parameters, values, flags, means):
+    negative = np.abs(values) < means
+    columns, rows = np.nonzero(flags.T)
+    return pd.DataFrame({
+        "Parameter": np.asarray(parameters, dtype=object)[columns],
+        "Outlier": df['Contributor'].to_numpy()[rows],
+        "Index": rows,
+        "Value": values[rows, columns],
+        "Type": np.where(negative[rows, columns], "Negative", "Positive"),
+    }, columns=OUTLIER_COLUMNS)
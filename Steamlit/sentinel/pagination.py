@@ -0,0 +1,73 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Largest page size the GitHub REST API accepts
+MAX_PER_PAGE = 100
+
+LINK_NEXT = re.compile(r'<([^>]+)>\s*;\s*rel="next"')
+LINK_LAST = re.compile(r'<([^>]+)>\s*;\s*rel="last"')
+
+
+class FetchError(Exception):
+    def __init__(self, url):
+        super().__init__(f"Unable to fetch {url}")
+        self.url = url
+
+# Function to add or replace query parameters of a URL
+
+
+def with_query(url, **params):
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+# Function to read the rel="next" URL out of a Link header
+
+
+def next_page_url(link_header):
+    if not link_header:
+        return None
+    match = LINK_NEXT.search(link_header)
+    return match.group(1) if match else None
+
+# Function to estimate the item count of a listing from its first page: the
+# pages up to rel="last" counted as full (the last one may hold fewer)
+
+
+def estimate_total(link_header, first_page_items, per_page):
+    match = LINK_LAST.search(link_header or "")
+    page = dict(parse_qsl(urlsplit(match.group(1)).query)).get("page", "") if match else ""
+    if not page.isdigit():
+        return first_page_items
+    return max(first_page_items, int(page) * per_page)
+
+# Generator following Link: rel="next" headers and yielding items as pages arrive.
+# fetch_page(url) must return (json, headers) and json None on failure, in which
+# case FetchError is raised. Stops after max_items items when given.
+# on_total(total) is called with the estimated item count once the first page
+# arrived (see estimate_total) and with the exact count after the last page.
+
+
+def iter_items(fetch_page, url, per_page=MAX_PER_PAGE, max_items=None, on_total=None):
+    if max_items is not None:
+        per_page = max(1, min(per_page, max_items))
+    page_url = with_query(url, per_page=per_page)
+    yielded = 0
+    while page_url:
+        items, headers = fetch_page(page_url)
+        if items is None:
+            raise FetchError(page_url)
+        if on_total is not None and yielded == 0:
+            total = estimate_total(headers.get("Link"), len(items), per_page)
+            on_total(total if max_items is None else min(total, max_items))
+        for item in items:
+            if max_items is not None and yielded >= max_items:
+                break
+            yield item
+            yielded += 1
+        if max_items is not None and yielded >= max_items:
+            break
+        page_url = next_page_url(headers.get("Link"))
+    if on_total is not None:
+        on_total(yielded)
@@ -0,0 +1,160 @@
+import sqlite3
+import statistics
+import time
+from datetime import datetime
+
+from sentinel.endpoints import API_URL
+from sentinel.pagination import FetchError, iter_items, with_query
+from sentinel.storage import data_path
+
+# Repository health from its pull requests in every state:
+#   - merged ratio: merged pull requests among the closed ones (open ones are
+#     still undecided)
+#   - median time from opening to merge
+#   - stale open ratio: open pull requests without an update for STALE_AFTER
+# The pull requests are kept in SQLite together with the newest updated_at
+# seen per repository (the high-water mark). A refresh lists the pull requests
+# most recently updated first and stops at the mark, so only those changed
+# since the previous run are fetched. When only the ratios are needed and the
+# repository was never listed, four search counts replace the full listing.
+
+# Open pull requests without an update for this long count as stale
+STALE_AFTER = 30 * 24 * 60 * 60
+
+SEARCH_URL = f"{API_URL}/search/issues"
+
+# Search qualifiers of the counts, on top of "repo:owner/name is:pr"
+SEARCH_COUNTS = {
+    "open": "is:open",
+    "closed": "is:closed",
+    "merged": "is:merged",
+}
+
+# Function to read a GitHub timestamp ("2024-05-01T12:00:00Z") as Unix time
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+# Stored pull requests of one repository and its high-water mark
+
+
+class PullRequestStore:
+    def __init__(self, owner, repo_name, path=None):
+        self.repo = f"{owner}/{repo_name}".lower()
+        # Several scans (workers, command line threads) may write at the same time
+        self._conn = sqlite3.connect(path or data_path("repo_health.sqlite"), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pulls ("
+            " repo TEXT, number INTEGER, state TEXT, created_at TEXT, updated_at TEXT,"
+            " merged_at TEXT, PRIMARY KEY (repo, number))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS marks (repo TEXT PRIMARY KEY, updated_at TEXT, refreshed_at REAL)")
+
+    # Newest updated_at of the stored pull requests, None before the first refresh
+    @property
+    def high_water_mark(self):
+        row = self._conn.execute("SELECT updated_at FROM marks WHERE repo = ?", (self.repo,)).fetchone()
+        return row[0] if row else None
+
+    # Store changed pull requests and move the mark in one transaction, so an
+    # interrupted refresh starts over from the previous mark
+    def save(self, pulls, high_water_mark):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pulls VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.repo, pull['number'], pull['state'], pull['created_at'], pull['updated_at'],
+                  pull.get('merged_at')) for pull in pulls])
+            self._conn.execute("INSERT OR REPLACE INTO marks VALUES (?, ?, ?)",
+                               (self.repo, high_water_mark, time.time()))
+
+    def pulls(self):
+        return [{"state": state, "created_at": created_at, "updated_at": updated_at, "merged_at": merged_at}
+                for state, created_at, updated_at, merged_at in self._conn.execute(
+                    "SELECT state, created_at, updated_at, merged_at FROM pulls WHERE repo = ?", (self.repo,))]
+
+    def close(self):
+        self._conn.close()
+
+# Function to fetch the pull requests changed since the store's mark, returns
+# how many changed. The listing is sorted by updated_at, newest first, and
+# stops at the first pull request older than the mark (ones updated in the
+# same second as the mark are fetched again but not counted).
+
+
+def refresh_pull_requests(store, owner, repo_name, fetch_page):
+    mark = store.high_water_mark
+    pulls_url = with_query(f"{API_URL}/repos/{owner}/{repo_name}/pulls",
+                           state="all", sort="updated", direction="desc")
+    changed = []
+    for pull in iter_items(fetch_page, pulls_url):
+        if mark is not None and pull['updated_at'] < mark:
+            break
+        changed.append(pull)
+    if changed or mark is None:
+        store.save(changed, max([pull['updated_at'] for pull in changed] + [mark or ""]))
+    return sum(1 for pull in changed if mark is None or pull['updated_at'] > mark)
+
+# Function to compute the health metrics from stored pull requests
+
+
+def health_metrics(pulls, now=None):
+    now = now or time.time()
+    open_pulls = [pull for pull in pulls if pull['state'] == "open"]
+    closed = len(pulls) - len(open_pulls)
+    merge_hours = [(parse_time(pull['merged_at']) - parse_time(pull['created_at'])) / 3600
+                   for pull in pulls if pull['merged_at']]
+    stale = sum(1 for pull in open_pulls if now - parse_time(pull['updated_at']) > STALE_AFTER)
+    return {
+        "source": "pulls",
+        "pull_requests": len(pulls),
+        "open": len(open_pulls),
+        "closed": closed,
+        "merged": len(merge_hours),
+        "stale_open": stale,
+        "merged_ratio": len(merge_hours) / closed if closed else None,
+        "median_hours_to_merge": statistics.median(merge_hours) if merge_hours else None,
+        "stale_open_ratio": stale / len(open_pulls) if open_pulls else None,
+    }
+
+# Function to compute the ratios from search counts alone (no time to merge)
+
+
+def search_health(owner, repo_name, fetch_page, now=None):
+    now = now or time.time()
+    qualifiers = dict(SEARCH_COUNTS)
+    qualifiers["stale_open"] = "is:open updated:<" + time.strftime("%Y-%m-%d", time.gmtime(now - STALE_AFTER))
+    counts = {}
+    for name, qualifier in qualifiers.items():
+        search_url = with_query(SEARCH_URL, q=f"repo:{owner}/{repo_name} is:pr {qualifier}", per_page=1)
+        payload, _ = fetch_page(search_url)
+        if payload is None:
+            raise FetchError(search_url)
+        counts[name] = payload['total_count']
+    return {
+        "source": "search",
+        "pull_requests": counts["open"] + counts["closed"],
+        **counts,
+        "merged_ratio": counts["merged"] / counts["closed"] if counts["closed"] else None,
+        "median_hours_to_merge": None,
+        "stale_open_ratio": counts["stale_open"] / counts["open"] if counts["open"] else None,
+    }
+
+# Function to refresh and compute the health of a repository. With
+# counts_only, a repository that was never listed is measured with search
+# counts instead. Raises FetchError when GitHub cannot be read.
+
+
+def repo_health(owner, repo_name, fetch_page, counts_only=False, store=None, now=None):
+    own_store = store is None
+    if own_store:
+        store = PullRequestStore(owner, repo_name)
+    try:
+        if counts_only and store.high_water_mark is None:
+            return search_health(owner, repo_name, fetch_page, now=now)
+        fetched = refresh_pull_requests(store, owner, repo_name, fetch_page)
+        return {**health_metrics(store.pulls(), now=now), "fetched": fetched}
+    finally:
+        if own_store:
+            store.close()
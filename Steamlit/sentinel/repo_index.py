@@ -0,0 +1,37 @@
+import threading
+from concurrent.futures import Future
+
+from sentinel.endpoints import API_URL
+
+# Scan-wide index of repository metadata keyed by full name ("owner/repo").
+# Each repository is fetched at most once per scan; when several workers ask
+# for the same repository at the same time, one of them fetches it and the
+# others wait for that single in-flight request.
+
+
+class RepoIndex:
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, full_name, url=None):
+        with self._lock:
+            future = self._entries.get(full_name)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._entries[full_name] = future
+
+        if is_owner:
+            try:
+                future.set_result(self._fetch(
+                    url or f"{API_URL}/repos/{full_name}"))
+            except BaseException as exc:
+                future.set_exception(exc)
+                raise
+        return future.result()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from sentinel.endpoints import endpoint_class
+from sentinel.storage import data_path
+
+# Seconds a cached response is served without asking GitHub, per endpoint class.
+# Past that age the response is revalidated with If-None-Match/If-Modified-Since;
+# a 304 answer does not count against the rate limit.
+DEFAULT_TTLS = {
+    "contributors": 15 * 60,
+    "pulls": 15 * 60,
+    "search": 15 * 60,
+    "repo": 6 * 60 * 60,
+    "events": 30 * 60,
+    "orgs": 24 * 60 * 60,
+    "user": 24 * 60 * 60,
+    "other": 60 * 60,
+}
+
+# Size cap of the cache file contents; least recently used entries go first
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Response headers kept next to the body
+STORED_HEADERS = ("ETag", "Last-Modified", "Link")
+
+# Function to get the cache key of a token pool. Answers may hold private
+# data, so they are only served again to requests sent with the same tokens;
+# the key is a hash and never the tokens themselves. Anonymous requests share
+# the empty key.
+
+
+def credential_key(tokens):
+    tokens = sorted(token for token in tokens if token)
+    if not tokens:
+        return ""
+    return hashlib.sha256("\n".join(tokens).encode()).hexdigest()
+
+
+class CachedResponse:
+    def __init__(self, body, headers, stored_at):
+        self.body = body
+        self.headers = headers
+        self.stored_at = stored_at
+
+    def json(self):
+        return json.loads(self.body)
+
+    # Conditional request headers for revalidating this response
+    def validators(self):
+        validators = {}
+        if self.headers.get("ETag"):
+            validators["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+
+# SQLite backed store of GitHub API responses, keyed by the credential key
+# (see credential_key) and URL. Safe to share
+# between the worker threads of a scan and between processes (the app and
+# the job workers use the same file), so the size is always read from the
+# database rather than counted in memory.
+class ResponseCache:
+    def __init__(self, path=None, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or data_path("responses.sqlite")
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Responses cached by URL only could be served to any token; drop them
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(responses)")]
+        if columns and "credential" not in columns:
+            self._conn.execute("DROP TABLE responses")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " credential TEXT, url TEXT, body BLOB, headers TEXT,"
+            " size INTEGER, stored_at REAL, accessed_at REAL, PRIMARY KEY (credential, url))")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    def get(self, url, credential=""):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, headers, stored_at FROM responses WHERE credential = ? AND url = ?",
+                (credential, url)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE credential = ? AND url = ?",
+                (time.time(), credential, url))
+            self._conn.commit()
+        return CachedResponse(row[0], json.loads(row[1]), row[2])
+
+    def is_fresh(self, url, cached):
+        ttl = self.ttls.get(endpoint_class(url), self.ttls["other"])
+        return time.time() - cached.stored_at < ttl
+
+    def store(self, url, body, headers, credential=""):
+        kept = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        now = time.time()
+        with self._lock:
+            # The insert takes the write lock, so the size read by _evict
+            # includes what other processes committed before
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (credential, url, body, json.dumps(kept), len(body), now, now))
+            self._evict()
+            self._conn.commit()
+
+    # Mark a response as fresh again after GitHub answered 304 Not Modified
+    def revalidate(self, url, headers, credential=""):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT headers FROM responses WHERE credential = ? AND url = ?", (credential, url)).fetchone()
+            if row is None:
+                return
+            kept = json.loads(row[0])
+            kept.update({name: headers[name] for name in STORED_HEADERS if name in headers})
+            now = time.time()
+            self._conn.execute(
+                "UPDATE responses SET headers = ?, stored_at = ?, accessed_at = ?"
+                " WHERE credential = ? AND url = ?", (json.dumps(kept), now, now, credential, url))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": total_bytes}
+
+    # Drop least recently used entries until the cache fits max_bytes. Runs
+    # inside the write transaction of store().
+    def _evict(self):
+        total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT rowid, size FROM responses ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                return
+            for rowid, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE rowid = ?", (rowid,))
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    return
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+# Function to get the process wide cache (survives Streamlit reruns)
+
+
+def default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
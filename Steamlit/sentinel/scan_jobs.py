@@ -0,0 +1,189 @@
+import json
+
+from sentinel import contributors
+from sentinel.bandit_scan import BanditError, BanditScanner, scan_github_repository
+from sentinel.clones import CloneError, CloneManager
+from sentinel.contributors import DEFAULT_MAX_IN_FLIGHT
+from sentinel.exports import to_parquet
+from sentinel.jobs import JobError, job_handler
+from sentinel.metrics import scan_metrics, summarize, to_json, to_prometheus
+from sentinel.org_scan import ORG_SNAPSHOT_REPO, scan_organization
+from sentinel.pagination import FetchError
+from sentinel.repo_health import repo_health
+from sentinel.scheduler import MAX_IN_FLIGHT, default_scheduler
+from sentinel.snapshots import DEFAULT_MAX_AGE, ContributorSnapshot
+
+# Job kinds run by the worker pool (see sentinel.jobs):
+#   contributors: the contributor scan of the Search page
+#   organization: the organization-wide scan of the Search page
+#   bandit:       clone and Bandit scan of the Code Analysis page
+# A worker runs one job at a time (see sentinel.jobs), so the handlers set the
+# job's tokens and response cache choice on the process wide scheduler and
+# contributors module. Each worker's scheduler follows the budget GitHub
+# reports for the tokens in every answer, which all workers draw from; the
+# pool size and MAX_IN_FLIGHT keep their concurrent requests under the limit.
+
+CONTRIBUTORS_ROWS_FILE = "contributors.jsonl"
+CONTRIBUTORS_PARQUET_FILE = "contributors.parquet"
+REPOSITORIES_PARQUET_FILE = "repositories.parquet"
+METRICS_JSON_FILE = "metrics.json"
+METRICS_PROMETHEUS_FILE = "metrics.prom"
+BANDIT_RESULTS_FILE = "bandit_results.json"
+
+# Function to read the rows a running contributor scan has written so far
+
+
+def read_streamed_rows(path):
+    try:
+        with open(path) as rows:
+            # A line without its newline is still being written
+            return [json.loads(line) for line in rows if line.endswith("\n")]
+    except FileNotFoundError:
+        return []
+
+# Contributor scan. Rows are appended to a JSON lines file as they are
+# enriched, so the page can show the table while the scan runs; the finished
+# table is written as Parquet. The pull request health of the repository
+# (see sentinel.repo_health) is refreshed at the end and returned with it.
+
+
+@job_handler("contributors")
+def scan_contributors(context, owner, repo_name, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                      distinct_repos=False, max_items=None, backend="rest", incremental=True,
+                      max_age=DEFAULT_MAX_AGE, use_response_cache=True):
+    max_in_flight = min(max_in_flight, MAX_IN_FLIGHT)
+    contributors.use_response_cache = use_response_cache
+    scheduler = default_scheduler()
+    scheduler.configure(context.secrets.get("tokens") or contributors.tokens)
+    requests_before = scheduler.requests_sent
+    metrics = scan_metrics()
+
+    # The time estimate extrapolates the requests spent per contributor so far
+    # to the contributor count estimated from the first page of the list
+    def update_progress(done, total):
+        per_contributor = (scheduler.requests_sent - requests_before) / done
+        eta = scheduler.estimate_seconds(
+            per_contributor * (total - done), max_in_flight=max_in_flight)
+        context.progress(
+            done, total, f"Enriched {done} of about {total} contributors (about {eta:.0f}s left)")
+
+    snapshot = None
+    if incremental:
+        snapshot = ContributorSnapshot(
+            owner, repo_name, variant=f"{backend}:{distinct_repos}", max_age=max_age)
+
+    try:
+        with open(context.path(CONTRIBUTORS_ROWS_FILE), "w") as rows:
+            def write_row(contributor_info):
+                rows.write(json.dumps(contributor_info) + "\n")
+                rows.flush()
+
+            with metrics.recording(), metrics.stage("scan"):
+                contributors_data = contributors.collect_contributors_data(
+                    owner, repo_name, max_in_flight=max_in_flight, on_progress=update_progress,
+                    distinct_repos=distinct_repos, max_items=max_items, backend=backend,
+                    snapshot=snapshot, on_row=write_row, on_warning=context.warn)
+    except FetchError:
+        raise JobError("Error: Unable to fetch contributors data.")
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+    with metrics.stage("write_results"), open(context.path(CONTRIBUTORS_PARQUET_FILE), "wb") as parquet:
+        parquet.write(to_parquet(contributors_data.to_frame()))
+
+    health = None
+    try:
+        with metrics.recording(), metrics.stage("health"):
+            health = repo_health(owner, repo_name, contributors.fetch_page)
+    except FetchError:
+        context.warn(f"Warning: The pull requests of {owner}/{repo_name} could not be read.")
+
+    recorded = write_metrics(context, metrics, {"repo": f"{owner}/{repo_name}", "backend": backend})
+    return {"rows": len(contributors_data), "parquet": CONTRIBUTORS_PARQUET_FILE,
+            "health": health, "metrics": summarize(recorded)}
+
+# Organization scan. Every unique contributor is enriched once; the rows file
+# and contributors.parquet hold the organization table (one row per login),
+# repositories.parquet the per-repository tables (one row per repository and
+# contributor, with a "Repository" column).
+
+
+@job_handler("organization")
+def scan_org(context, org, max_in_flight=DEFAULT_MAX_IN_FLIGHT, distinct_repos=False, max_repos=None,
+             include_forks=False, include_archived=False, backend="rest", incremental=True,
+             max_age=DEFAULT_MAX_AGE, use_response_cache=True):
+    max_in_flight = min(max_in_flight, MAX_IN_FLIGHT)
+    contributors.use_response_cache = use_response_cache
+    default_scheduler().configure(context.secrets.get("tokens") or contributors.tokens)
+    metrics = scan_metrics()
+
+    snapshot = None
+    if incremental:
+        snapshot = ContributorSnapshot(
+            org, ORG_SNAPSHOT_REPO, variant=f"{backend}:{distinct_repos}", max_age=max_age)
+
+    try:
+        with open(context.path(CONTRIBUTORS_ROWS_FILE), "w") as rows:
+            def write_row(row):
+                rows.write(json.dumps(row) + "\n")
+                rows.flush()
+
+            with metrics.recording(), metrics.stage("scan"):
+                org_scan = scan_organization(
+                    org, max_in_flight=max_in_flight, distinct_repos=distinct_repos, max_repos=max_repos,
+                    include_forks=include_forks, include_archived=include_archived, backend=backend,
+                    snapshot=snapshot, on_progress=context.progress, on_row=write_row,
+                    on_warning=context.warn)
+    except FetchError:
+        raise JobError(f"Error: Unable to fetch the repositories of {org}.")
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+    organization_table = org_scan.organization_table()
+    with metrics.stage("write_results"):
+        with open(context.path(CONTRIBUTORS_PARQUET_FILE), "wb") as parquet:
+            parquet.write(to_parquet(organization_table.to_frame()))
+        with open(context.path(REPOSITORIES_PARQUET_FILE), "wb") as parquet:
+            parquet.write(to_parquet(org_scan.repository_table().to_frame()))
+
+    recorded = write_metrics(context, metrics, {"org": org, "backend": backend})
+    return {"rows": len(organization_table), "parquet": CONTRIBUTORS_PARQUET_FILE,
+            "repositories_parquet": REPOSITORIES_PARQUET_FILE, "repositories": org_scan.repositories,
+            "memberships": org_scan.index.link_count(), "metrics": summarize(recorded)}
+
+# Function to write the metrics of the scan next to its results
+
+
+def write_metrics(context, metrics, labels):
+    snapshot = metrics.snapshot()
+    with open(context.path(METRICS_JSON_FILE), "w") as metrics_file:
+        metrics_file.write(to_json(snapshot, labels))
+    with open(context.path(METRICS_PROMETHEUS_FILE), "w") as metrics_file:
+        metrics_file.write(to_prometheus(snapshot, labels))
+    return snapshot
+
+# Clone the repository into the session's working folder and scan it with Bandit
+
+
+@job_handler("bandit")
+def scan_repository(context, username, repo_name, session_id, filter_blobs=True, python_only=True,
+                    use_response_cache=True):
+    # Workers run jobs of different users; never reuse the previous job's tokens
+    contributors.use_response_cache = use_response_cache
+    default_scheduler().configure(context.secrets.get("tokens") or contributors.tokens)
+    scanner = BanditScanner()
+    try:
+        bandit_results = scan_github_repository(
+            username, repo_name, session_id, contributors.fetch_data,
+            clone_manager=CloneManager(filter_blobs=filter_blobs), scanner=scanner,
+            python_only=python_only, on_progress=context.progress)
+    except CloneError as error:
+        raise JobError(f"Failed to clone the repository: {error}")
+    except BanditError as error:
+        raise JobError(f"Error during Bandit analysis: {error}")
+
+    with open(context.path(BANDIT_RESULTS_FILE), "w") as file:
+        json.dump(bandit_results, file, indent=2)
+    return {"results_file": BANDIT_RESULTS_FILE, "stats": scanner.last_stats}
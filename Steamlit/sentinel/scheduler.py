@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from sentinel.endpoints import endpoint_class
+
+# Lower value = served first. Repository level calls go ahead of per-user calls,
+# and the per-event repository lookups (the bulk of a scan) go last.
+REQUEST_PRIORITIES = {
+    "contributors": 0,
+    "org_repos": 0,
+    "pulls": 0,
+    "search": 1,
+    "user": 1,
+    "events": 1,
+    "orgs": 1,
+    "other": 1,
+    "repo": 2,
+}
+
+# GitHub core REST limits per hour
+AUTHENTICATED_LIMIT = 5000
+ANONYMOUS_LIMIT = 60
+RATE_LIMIT_WINDOW = 60 * 60
+
+# Search API limit window (30 requests a minute per token)
+SEARCH_WINDOW = 60
+
+# Rate limits GitHub keeps apart (X-RateLimit-Resource). Search and GraphQL
+# (5000 points an hour) do not count against the core REST budget.
+RATE_LIMIT_RESOURCES = ("core", "search", "graphql")
+
+# How long a rate limited search or GraphQL answer without reset headers
+# holds back further requests of its resource
+RESOURCE_WINDOWS = {"search": SEARCH_WINDOW, "graphql": RATE_LIMIT_WINDOW}
+
+# GitHub's secondary rate limit: requests in flight at the same time per
+# token, counted across every process sending with it
+MAX_CONCURRENT_REQUESTS = 100
+
+# Most requests one scan keeps in flight (max_in_flight)
+MAX_IN_FLIGHT = 32
+
+# Give up on a request after this many rate limited answers in a row
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Function to get the scheduling priority of a GitHub API URL
+
+
+def request_priority(url):
+    return REQUEST_PRIORITIES.get(endpoint_class(url), REQUEST_PRIORITIES["other"])
+
+# Function to get the rate limit a GitHub REST API URL counts against:
+# "search" for the search API, which has its own limit, "core" for everything
+# else (GraphQL requests are sent with "graphql", see post_graphql)
+
+
+def rate_limit_resource(url):
+    return "search" if endpoint_class(url) == "search" else "core"
+
+# Token bucket of one credential. The bucket holds the core requests GitHub
+# still allows until reset_at and refills to the full limit once that time
+# passes. Requests are taken out optimistically and the count is corrected
+# from the X-RateLimit-* headers of every answer. Search and GraphQL requests
+# do not touch the bucket; a rate limited or exhausted answer of theirs only
+# holds back further requests of the same resource (resource_blocked_until).
+
+
+class Credential:
+    def __init__(self, token):
+        self.token = token
+        self.limit = AUTHENTICATED_LIMIT if token else ANONYMOUS_LIMIT
+        self.remaining = self.limit
+        self.reset_at = time.time() + RATE_LIMIT_WINDOW
+        self.blocked_until = 0.0
+        self.resource_blocked_until = {resource: 0.0 for resource in RESOURCE_WINDOWS}
+
+    def refill(self, now):
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + RATE_LIMIT_WINDOW
+
+    # Seconds until this credential may send the next request of the resource
+    def wait_time(self, now, resource="core"):
+        self.refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if resource != "core":
+            return max(wait, self.resource_blocked_until[resource] - now)
+        if self.remaining <= 0:
+            wait = max(wait, self.reset_at - now)
+        return wait
+
+    def headers(self):
+        return {"Authorization": f"token {self.token}"} if self.token else {}
+
+
+# Hands out credentials from a token pool to concurrent workers. Workers wait
+# in a priority queue instead of failing when every credential is exhausted;
+# each rate limit resource has its own queue, so a blocked search or GraphQL
+# request never holds up core requests.
+
+
+class RequestScheduler:
+    def __init__(self, tokens=()):
+        self._condition = threading.Condition()
+        self._waiting = {resource: [] for resource in RATE_LIMIT_RESOURCES}
+        self._sequence = itertools.count()
+        self._latency = None
+        self.requests_sent = 0
+        self.configure(tokens)
+
+    def configure(self, tokens):
+        tokens = [token for token in dict.fromkeys(tokens) if token]
+        with self._condition:
+            # Keep the bucket state when the pool did not change
+            if hasattr(self, "credentials") and tokens == self.tokens():
+                return
+            self.credentials = [Credential(token) for token in tokens] or [Credential("")]
+            self._condition.notify_all()
+
+    def tokens(self):
+        return [credential.token for credential in self.credentials if credential.token]
+
+    # Block until a credential is free for a request of the given priority
+    def acquire(self, priority, resource="core"):
+        ticket = (priority, next(self._sequence))
+        waiting = self._waiting[resource]
+        with self._condition:
+            heapq.heappush(waiting, ticket)
+            while True:
+                now = time.time()
+                if waiting[0] == ticket:
+                    credential = min(self.credentials,
+                                     key=lambda item: (item.wait_time(now, resource), -item.remaining))
+                    wait = credential.wait_time(now, resource)
+                    if wait <= 0:
+                        heapq.heappop(waiting)
+                        if resource == "core":
+                            credential.remaining -= 1
+                        self.requests_sent += 1
+                        self._condition.notify_all()
+                        return credential
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait(1.0)
+
+    # Record the answer to a request sent with the credential. Returns True when
+    # GitHub rejected it for rate limiting and the request should be retried.
+    def release(self, credential, response, elapsed=None, resource="core"):
+        if response is None:
+            return False
+        headers = response.headers
+        now = time.time()
+        # GitHub names the limit an answer counted against
+        if headers.get("X-RateLimit-Resource") in RATE_LIMIT_RESOURCES:
+            resource = headers["X-RateLimit-Resource"]
+        with self._condition:
+            if elapsed is not None:
+                self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+            rate_limited = response.status_code in (403, 429) and (
+                "Retry-After" in headers or headers.get("X-RateLimit-Remaining") == "0")
+
+            # Search and GraphQL have their own limits; their headers say
+            # nothing about the core budget
+            if resource != "core":
+                if rate_limited or headers.get("X-RateLimit-Remaining") == "0":
+                    if "Retry-After" in headers:
+                        blocked_until = now + float(headers["Retry-After"])
+                    elif "X-RateLimit-Reset" in headers:
+                        blocked_until = float(headers["X-RateLimit-Reset"])
+                    else:
+                        blocked_until = now + RESOURCE_WINDOWS[resource]
+                    credential.resource_blocked_until[resource] = max(
+                        credential.resource_blocked_until[resource], blocked_until)
+                self._condition.notify_all()
+                return rate_limited
+
+            if "X-RateLimit-Limit" in headers:
+                credential.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                credential.remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset" in headers:
+                credential.reset_at = float(headers["X-RateLimit-Reset"])
+            if rate_limited:
+                if "Retry-After" in headers:
+                    credential.blocked_until = now + float(headers["Retry-After"])
+                else:
+                    credential.remaining = 0
+            self._condition.notify_all()
+        return rate_limited
+
+    # Estimated seconds to send the given number of requests with max_in_flight
+    # concurrent workers, including waits for rate limit resets
+    def estimate_seconds(self, requests, max_in_flight=1):
+        now = time.time()
+        with self._condition:
+            for credential in self.credentials:
+                credential.refill(now)
+            budget = sum(max(0, credential.remaining) for credential in self.credentials)
+            hourly = sum(credential.limit for credential in self.credentials)
+            first_reset = min(credential.reset_at for credential in self.credentials)
+            latency = self._latency or 0.5
+
+        network = requests * latency / max(1, max_in_flight)
+        if requests <= budget:
+            return network
+        windows = math.ceil((requests - budget) / max(1, hourly))
+        waiting = max(0.0, first_reset - now) + (windows - 1) * RATE_LIMIT_WINDOW
+        return max(network, waiting)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+# Function to get the process wide scheduler shared by every scan
+
+
+def default_scheduler():
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
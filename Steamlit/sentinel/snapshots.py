@@ -0,0 +1,73 @@
+import json
+import sqlite3
+import time
+
+from sentinel.storage import data_path
+
+# Contributors older than this are enriched again on a re-scan
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+# Stored scan results of one repository, keyed by login. A re-scan only
+# enriches contributors that are new, whose contribution count changed, whose
+# data is older than max_age, or that were enriched with other scan options
+# (variant). Everybody else is served from the snapshot without API calls.
+
+
+class ContributorSnapshot:
+    def __init__(self, owner, repo_name, variant="", max_age=DEFAULT_MAX_AGE, path=None):
+        self.repo = f"{owner}/{repo_name}".lower()
+        self.variant = variant
+        self.max_age = max_age
+        # Several scans (workers, command line threads) may write at the same time
+        self._conn = sqlite3.connect(path or data_path("snapshots.sqlite"), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS contributors ("
+            " repo TEXT, login TEXT, contributions INTEGER, variant TEXT,"
+            " row TEXT, fetched_at REAL, PRIMARY KEY (repo, login))")
+        self.entries = {
+            login: {"contributions": contributions, "variant": variant,
+                    "row": json.loads(row), "fetched_at": fetched_at}
+            for login, contributions, variant, row, fetched_at in self._conn.execute(
+                "SELECT login, contributions, variant, row, fetched_at"
+                " FROM contributors WHERE repo = ?", (self.repo,))}
+
+    def needs_refresh(self, contributor, now=None):
+        entry = self.entries.get(contributor['login'])
+        if entry is None:
+            return True
+        now = now or time.time()
+        return (entry["contributions"] != contributor['contributions']
+                or entry["variant"] != self.variant
+                or now - entry["fetched_at"] > self.max_age)
+
+    def get(self, login):
+        entry = self.entries.get(login)
+        return entry["row"] if entry else None
+
+    def save(self, contributor, row):
+        entry = {"contributions": contributor['contributions'], "variant": self.variant,
+                 "row": row, "fetched_at": time.time()}
+        self.entries[contributor['login']] = entry
+        self._conn.execute(
+            "INSERT OR REPLACE INTO contributors VALUES (?, ?, ?, ?, ?, ?)",
+            (self.repo, contributor['login'], entry["contributions"], self.variant,
+             json.dumps(row), entry["fetched_at"]))
+        # Do not hold the write lock for the whole scan
+        self._conn.commit()
+
+    # Drop contributors that no longer appear in the contributor list
+    def retain(self, logins):
+        gone = set(self.entries) - set(logins)
+        for login in gone:
+            del self.entries[login]
+        self._conn.executemany(
+            "DELETE FROM contributors WHERE repo = ? AND login = ?",
+            [(self.repo, login) for login in gone])
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
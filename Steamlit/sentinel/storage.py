@@ -0,0 +1,14 @@
+import os
+
+# Root folder for everything Repo Sentinel keeps on disk (caches, snapshots, ...)
+# Override with the REPO_SENTINEL_HOME environment variable.
+DEFAULT_HOME = os.path.join(os.path.expanduser("~"), ".repo_sentinel")
+
+# Function to build a path inside the data folder, creating parent folders
+
+
+def data_path(*parts):
+    home = os.environ.get("REPO_SENTINEL_HOME", DEFAULT_HOME)
+    path = os.path.join(home, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
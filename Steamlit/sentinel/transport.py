@@ -0,0 +1,96 @@
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP transport for the GitHub API. Connections are pooled and kept
+# alive between requests (one HTTPAdapter, i.e. one urllib3 pool, shared by
+# all threads; every thread gets its own Session on top of it, since Sessions
+# are not thread safe). Requests ask for gzip, time out instead of hanging,
+# and transient failures of idempotent requests are retried with jittered
+# exponential backoff. Rate limit answers (403/429) are left to the scheduler.
+
+# Seconds to establish a connection and to wait for the next bytes of an answer
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+DEFAULT_POOL_SIZE = 16
+
+RETRIES = 3
+RETRY_STATUSES = (500, 502, 503, 504)
+RETRY_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+
+DEFAULT_HEADERS = {"Accept-Encoding": "gzip, deflate", "Accept": "application/vnd.github+json"}
+
+
+# urllib3 retry policy adding a random jitter to every backoff, so workers
+# that failed together do not retry in lockstep
+class JitteredRetry(Retry):
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, BACKOFF_JITTER) if backoff else backoff
+
+
+class Transport:
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, retries=RETRIES,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+        self.ensure_pool_size(pool_size)
+
+    # Grow the connection pool to at least the given number of connections per
+    # host (e.g. the number of requests a scan keeps in flight)
+    def ensure_pool_size(self, pool_size):
+        with self._lock:
+            if pool_size <= self.pool_size:
+                return
+            retry = JitteredRetry(
+                total=self.retries, status_forcelist=RETRY_STATUSES, allowed_methods=RETRY_METHODS,
+                backoff_factor=BACKOFF_FACTOR, raise_on_status=False, respect_retry_after_header=False)
+            self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size,
+                                        max_retries=retry, pool_block=False)
+            self.pool_size = pool_size
+            self._generation += 1
+
+    # The calling thread's Session, mounted on the shared adapter
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None or self._local.generation != self._generation:
+            with self._lock:
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                session.mount("https://", self._adapter)
+                session.mount("http://", self._adapter)
+                self._local.session = session
+                self._local.generation = self._generation
+        return session
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session().get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session().post(url, **kwargs)
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+# Function to get the process wide transport (shared by all scans of the process)
+
+
+def default_transport():
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
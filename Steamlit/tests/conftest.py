@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The sentinel package is imported from the app folder, like the pages do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
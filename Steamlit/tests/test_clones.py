@@ -0,0 +1,79 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from sentinel import clones
+from sentinel.clones import LAST_USED_FILE, MIRROR_GRACE_PERIOD, CloneError, CloneManager
+
+
+@pytest.fixture
+def origin(tmp_path):
+    repo = tmp_path / "origin"
+    repo.mkdir()
+    (repo / "app.py").write_text("print('hello')\n")
+    for args in (["init", "-q"], ["add", "app.py"],
+                 ["-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "init"]):
+        subprocess.run(["git", *args], cwd=repo, check=True)
+    return str(repo)
+
+
+def test_mirror_is_reused_when_another_session_stored_it_first(tmp_path, origin, monkeypatch):
+    manager = CloneManager(root=str(tmp_path / "clones"))
+    path, sha = manager.mirror(origin)
+
+    # The next call does not see the mirror yet, clones again and loses the rename race
+    checks = []
+    isdir = os.path.isdir
+
+    def racing_isdir(folder):
+        if folder == path and not checks:
+            checks.append(folder)
+            return False
+        return isdir(folder)
+
+    monkeypatch.setattr(clones.os.path, "isdir", racing_isdir)
+    assert manager.mirror(origin) == (path, sha)
+    assert checks
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.startswith(".clone-")]
+
+
+def test_mirror_setup_failure_is_a_clone_error(tmp_path, origin, monkeypatch):
+    manager = CloneManager(root=str(tmp_path / "clones"))
+
+    def no_space(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(clones.tempfile, "mkdtemp", no_space)
+    with pytest.raises(CloneError, match="No space left on device"):
+        manager.mirror(origin)
+
+
+def test_failed_rename_is_a_clone_error(tmp_path, origin, monkeypatch):
+    manager = CloneManager(root=str(tmp_path / "clones"))
+
+    def denied(source, target):
+        raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr(clones.os, "rename", denied)
+    with pytest.raises(CloneError, match="Permission denied"):
+        manager.mirror(origin)
+
+
+def test_cleanup_keeps_mirrors_handed_out_within_the_grace_period(tmp_path, origin):
+    manager = CloneManager(root=str(tmp_path / "clones"), quota_bytes=0)
+    old_path, _ = manager.mirror(origin)
+    old_used = time.time() - 2 * MIRROR_GRACE_PERIOD
+    os.utime(os.path.join(old_path, LAST_USED_FILE), (old_used, old_used))
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com",
+                    "commit", "-q", "--allow-empty", "-m", "next"], cwd=origin, check=True)
+    # Another session just got this mirror and has not added its worktree yet
+    new_path, _ = manager.mirror(origin)
+
+    manager.cleanup()
+    assert not os.path.exists(old_path)
+    assert os.path.isdir(new_path)
+
+    manager.cleanup(now=time.time() + MIRROR_GRACE_PERIOD)
+    assert not os.path.exists(new_path)
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.mock_github import load_users, start_mock_server
+from sentinel import contributors
+from sentinel.graphql_backend import enrich_contributors_graphql
+from sentinel.scheduler import AUTHENTICATED_LIMIT, RequestScheduler
+
+GRAPHQL_LIMIT = 2
+
+
+@pytest.fixture
+def server():
+    server = start_mock_server(load_users(), graphql_rate_limit=GRAPHQL_LIMIT)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def scheduler(server, monkeypatch):
+    scheduler = RequestScheduler(["token"])
+    monkeypatch.setattr(contributors, "default_scheduler", lambda: scheduler)
+    monkeypatch.setattr(contributors, "GRAPHQL_URL", f"{server.base_url}/graphql")
+    monkeypatch.setattr(contributors, "use_response_cache", False)
+    return scheduler
+
+
+def test_graphql_batches_do_not_use_the_core_budget(server, scheduler):
+    login = next(iter(load_users()))
+    rows = enrich_contributors_graphql([{"login": login, "contributions": 1}], contributors.post_graphql)
+
+    assert rows[0]["Contributor"] == login
+    credential = scheduler.credentials[0]
+    assert (credential.limit, credential.remaining) == (AUTHENTICATED_LIMIT, AUTHENTICATED_LIMIT)
+
+
+def test_exhausted_graphql_limit_does_not_block_rest_requests(server, scheduler):
+    login = next(iter(load_users()))
+    for _ in range(GRAPHQL_LIMIT):
+        assert contributors.post_graphql(f'u0: user(login: "{login}") {{ login }}') is not None
+
+    credential = scheduler.credentials[0]
+    # The GraphQL budget is used up until its reset, an hour from now
+    assert credential.wait_time(time.time(), "graphql") > 3000
+
+    answers = []
+    rest = threading.Thread(target=lambda: answers.append(
+        contributors.fetch_data(f"{server.base_url}/users/{login}")), daemon=True)
+    rest.start()
+    rest.join(5)
+    assert answers and answers[0]["login"] == login
+    assert credential.remaining == server.rate_limits["core"] - 1
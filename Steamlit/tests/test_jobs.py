@@ -0,0 +1,75 @@
+import os
+import signal
+import stat
+import sys
+import time
+
+import pytest
+
+from sentinel import jobs
+from sentinel.jobs import JobStore
+
+
+def stored_secrets(store, job_id):
+    return store._conn.execute("SELECT secrets FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def test_secrets_are_deleted_when_claimed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job_id = store.submit("contributors", {}, secrets={"tokens": ["secret"]})
+
+    assert store.claim("worker")["secrets"] == {"tokens": ["secret"]}
+    assert stored_secrets(store, job_id) is None
+
+
+def test_secrets_are_deleted_when_the_job_fails(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job_id = store.submit("contributors", {}, secrets={"tokens": ["secret"]})
+    store.fail(job_id, "Cancelled")
+
+    assert stored_secrets(store, job_id) is None
+    assert store.claim("worker") is None
+
+
+def test_unclaimed_jobs_expire_with_their_secrets(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job_id = store.submit("contributors", {}, secrets={"tokens": ["secret"]})
+    store._conn.execute("UPDATE jobs SET created_at = ? WHERE id = ?", (time.time() - 2 * 60 * 60, job_id))
+    store._conn.commit()
+
+    # Any later submit purges the queue, with or without a worker pool
+    store.submit("contributors", {})
+    assert store.get(job_id)["status"] == "failed"
+    assert stored_secrets(store, job_id) is None
+
+
+def test_job_file_is_private(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="counts open files in /proc")
+def test_worker_pool_is_started_once_and_keeps_the_lock(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPO_SENTINEL_HOME", str(tmp_path))
+    started = []
+    real_popen = jobs.subprocess.Popen
+
+    def popen(*args, **kwargs):
+        started.append(real_popen(*args, **kwargs))
+        return started[-1]
+
+    monkeypatch.setattr(jobs.subprocess, "Popen", popen)
+    open_files = len(os.listdir("/proc/self/fd"))
+    try:
+        assert jobs.ensure_workers(count=1)
+        assert not jobs.ensure_workers(count=1)
+        # The lock went to the pool process with no gap; this process keeps no files open
+        with open(jobs.data_path("jobs", "workers.lock"), "a") as lock:
+            assert not jobs.try_lock(lock)
+        assert len(os.listdir("/proc/self/fd")) == open_files
+        assert len(started) == 1
+    finally:
+        for process in started:
+            # Lets the pool stop its worker processes on the way out
+            process.send_signal(signal.SIGINT)
+            process.wait(30)
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from benchmarks.mock_github import load_users, start_mock_server
+from sentinel import activity, contributors, repo_index
+from sentinel.metrics import default_metrics, scan_metrics, summarize
+from sentinel.scheduler import RequestScheduler
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = start_mock_server(load_users())
+    for module in (contributors, activity, repo_index):
+        monkeypatch.setattr(module, "API_URL", server.base_url)
+    scheduler = RequestScheduler(["token"])
+    monkeypatch.setattr(contributors, "default_scheduler", lambda: scheduler)
+    monkeypatch.setattr(contributors, "use_response_cache", False)
+    yield server
+    server.shutdown()
+
+
+def test_concurrent_scans_only_count_their_own_requests(server):
+    logins = list(load_users())[:3]
+    process_before = summarize(default_metrics().snapshot())["totals"]["requests"]
+    enriching, fetching = scan_metrics(), scan_metrics()
+    started = threading.Barrier(2)
+
+    # An enrichment with a pool of its own threads, next to a single request
+    def enrich():
+        with enriching.recording():
+            started.wait()
+            rows = list(contributors.iter_enriched_contributors(
+                [{"login": login, "contributions": 1} for login in logins], max_in_flight=4))
+            assert all(info is not None for _, info in rows)
+
+    def fetch():
+        with fetching.recording():
+            started.wait()
+            assert contributors.fetch_data(f"{server.base_url}/users/{logins[0]}") is not None
+
+    threads = [threading.Thread(target=enrich), threading.Thread(target=fetch)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    enriched = summarize(enriching.snapshot())["totals"]["requests"]
+    fetched = summarize(fetching.snapshot())["totals"]["requests"]
+    assert fetched == 1
+    assert enriched == server.total_requests() - 1
+    # The process wide metrics still count every request
+    assert summarize(default_metrics().snapshot())["totals"]["requests"] - process_before == enriched + 1
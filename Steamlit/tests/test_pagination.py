@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.mock_github import start_mock_server
+from sentinel import contributors
+from sentinel.pagination import estimate_total, iter_items
+from sentinel.scheduler import RequestScheduler
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = start_mock_server()
+    scheduler = RequestScheduler(["token"])
+    monkeypatch.setattr(contributors, "default_scheduler", lambda: scheduler)
+    monkeypatch.setattr(contributors, "use_response_cache", False)
+    yield server
+    server.shutdown()
+
+
+def test_total_is_estimated_from_the_first_page(server):
+    totals = []
+    url = f"{server.base_url}/repos/o/repo-250/contributors"
+    items = iter_items(contributors.fetch_page, url, on_total=totals.append)
+
+    next(items)
+    # Three pages of 100, before the second page was read
+    assert totals == [300]
+    assert len(list(items)) == 249
+    assert totals == [300, 250]
+
+
+def test_total_is_capped_by_max_items(server):
+    totals = []
+    url = f"{server.base_url}/repos/o/repo-250/contributors"
+    assert len(list(iter_items(contributors.fetch_page, url, max_items=120, on_total=totals.append))) == 120
+    assert totals == [120, 120]
+
+
+def test_single_page_total_is_its_size():
+    assert estimate_total(None, 42, 100) == 42
+    assert estimate_total('<https://api.github.com/x?page=2>; rel="next"', 100, 100) == 100
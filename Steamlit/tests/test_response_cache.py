@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.mock_github import load_users, start_mock_server
+from sentinel import contributors
+from sentinel.response_cache import ResponseCache, credential_key
+from sentinel.scheduler import RequestScheduler
+
+
+def test_size_is_shared_between_cache_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    # Two processes on the same file, e.g. the app and a job worker
+    app = ResponseCache(path=path, max_bytes=300)
+    worker = ResponseCache(path=path, max_bytes=300)
+
+    worker.store("https://api.github.com/users/a", b"x" * 100, {})
+    worker.store("https://api.github.com/users/b", b"x" * 100, {})
+    app.clear()
+    worker.store("https://api.github.com/users/c", b"x" * 100, {})
+    worker.store("https://api.github.com/users/d", b"x" * 100, {})
+
+    # Nothing fresh was evicted on the worker's stale idea of the size
+    assert worker.get("https://api.github.com/users/c") is not None
+    assert worker.get("https://api.github.com/users/d") is not None
+    assert app.stats() == {"entries": 2, "bytes": 200}
+
+
+def test_least_recently_used_entries_are_evicted_across_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    first = ResponseCache(path=path, max_bytes=250)
+    second = ResponseCache(path=path, max_bytes=250)
+
+    first.store("https://api.github.com/users/a", b"x" * 100, {})
+    second.store("https://api.github.com/users/b", b"x" * 100, {})
+    first.store("https://api.github.com/users/c", b"x" * 100, {})
+
+    assert second.stats()["bytes"] <= 250
+    assert second.get("https://api.github.com/users/a") is None
+    assert second.get("https://api.github.com/users/c") is not None
+
+
+def test_responses_are_only_served_to_the_same_tokens(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    url = "https://api.github.com/user/repos"
+    cache.store(url, b"private", {"ETag": "a"}, credential_key(["first"]))
+
+    assert cache.get(url, credential_key(["second"])) is None
+    assert cache.get(url) is None
+    assert cache.get(url, credential_key(["first"])).body == b"private"
+    # The key hashes the tokens; it does not depend on their order
+    assert credential_key(["first", "second"]) == credential_key(["second", "first"])
+    assert "first" not in credential_key(["first"])
+
+
+def test_responses_cached_by_url_only_are_dropped(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE responses (url TEXT PRIMARY KEY, body BLOB, headers TEXT,"
+                     " size INTEGER, stored_at REAL, accessed_at REAL)")
+        conn.execute("INSERT INTO responses VALUES ('https://api.github.com/user', x'00', '{}', 1, 0, 0)")
+
+    cache = ResponseCache(path=path)
+    assert cache.stats() == {"entries": 0, "bytes": 0}
+    assert cache.get("https://api.github.com/user") is None
+
+
+@pytest.fixture
+def server():
+    server = start_mock_server(load_users())
+    yield server
+    server.shutdown()
+
+
+def test_fetch_page_does_not_serve_another_tokens_response(server, tmp_path, monkeypatch):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    scheduler = RequestScheduler(["first"])
+    monkeypatch.setattr(contributors, "default_cache", lambda: cache)
+    monkeypatch.setattr(contributors, "default_scheduler", lambda: scheduler)
+    monkeypatch.setattr(contributors, "use_response_cache", True)
+    url = f"{server.base_url}/users/{next(iter(load_users()))}"
+
+    assert contributors.fetch_data(url) is not None
+    assert contributors.fetch_data(url) is not None
+    assert server.total_requests() == 1
+
+    # A job of another user, with other tokens, asks GitHub itself
+    scheduler.configure(["second"])
+    assert contributors.fetch_data(url) is not None
+    assert server.total_requests() == 2
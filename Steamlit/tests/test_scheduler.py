@@ -0,0 +1,72 @@
+import threading
+import time
+
+from sentinel.scheduler import RequestScheduler, rate_limit_resource
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+def search_rate_limited(reset_in=3000):
+    return FakeResponse(403, {"X-RateLimit-Resource": "search", "X-RateLimit-Limit": "30",
+                              "X-RateLimit-Remaining": "0",
+                              "X-RateLimit-Reset": str(time.time() + reset_in)})
+
+
+def acquire_within(scheduler, seconds, resource="core"):
+    acquired = []
+    worker = threading.Thread(target=lambda: acquired.append(scheduler.acquire(1, resource)), daemon=True)
+    worker.start()
+    worker.join(seconds)
+    return bool(acquired)
+
+
+def test_search_urls_use_the_search_limit():
+    assert rate_limit_resource("https://api.github.com/search/issues?q=repo:o/r") == "search"
+    assert rate_limit_resource("https://api.github.com/repos/o/r/pulls") == "core"
+
+
+def test_search_rate_limit_does_not_block_core_requests():
+    scheduler = RequestScheduler(["token"])
+    credential = scheduler.acquire(1, "search")
+    assert scheduler.release(credential, search_rate_limited(), resource="search")
+
+    assert credential.remaining == credential.limit
+    assert acquire_within(scheduler, 1.0)
+
+
+def test_search_rate_limit_blocks_further_searches():
+    scheduler = RequestScheduler(["token"])
+    credential = scheduler.acquire(1, "search")
+    scheduler.release(credential, search_rate_limited(), resource="search")
+
+    assert credential.wait_time(time.time(), "search") > 2900
+    assert not acquire_within(scheduler, 0.2, "search")
+    # A core request queued behind the blocked search still goes through
+    assert acquire_within(scheduler, 1.0)
+
+
+def test_search_headers_are_recognized_without_the_resource_argument():
+    scheduler = RequestScheduler(["token"])
+    credential = scheduler.acquire(1)
+    scheduler.release(credential, search_rate_limited())
+
+    assert credential.remaining > 0
+    assert acquire_within(scheduler, 1.0)
+
+
+def test_graphql_headers_do_not_touch_the_core_budget():
+    scheduler = RequestScheduler(["token"])
+    credential = scheduler.acquire(1, "graphql")
+    exhausted = FakeResponse(200, {"X-RateLimit-Resource": "graphql", "X-RateLimit-Limit": "5000",
+                                   "X-RateLimit-Remaining": "0",
+                                   "X-RateLimit-Reset": str(time.time() + 3000)})
+    assert not scheduler.release(credential, exhausted)
+
+    assert credential.remaining == credential.limit
+    assert credential.wait_time(time.time(), "graphql") > 2900
+    assert not acquire_within(scheduler, 0.2, "graphql")
+    assert acquire_within(scheduler, 1.0)